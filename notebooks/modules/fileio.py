@@ -1,7 +1,15 @@
 import numpy as n
 import csv
+import glob
+import hashlib
+import os
 
-def read_areas_from_file(path, dt, t_orbit=None, headers=['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']):
+# Parsed area files are cached here as .npy files, see read_areas_from_file
+cache_dir = os.environ.get('POWER_SIMS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'power_sims'))
+# Least recently used cache entries are deleted once the cache gets bigger than this
+cache_max_bytes = 256 * 1024 * 1024
+
+def read_areas_from_file(path, dt, t_orbit=None, headers=['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ'], cache=True):
     """
     Reads in the projected sun-facing areas of each face of the satellite over time from a csv file.
     The csv file can be generated through STK. It has N*(M+1) + 2 rows, where N is the number of time points and M is the number of faces.
@@ -16,13 +24,89 @@ def read_areas_from_file(path, dt, t_orbit=None, headers=['plusX', 'plusY', 'neg
     Keyword Arguments:
         t_orbit {integer} -- The length of the orbit in seconds. If this is greater than the number of rows, the output is padded with 0-rows until this length is met (default: {None})
         headers {list} -- The names of the headers for each face (default: {['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']})
+        cache {bool} -- Save the parsed areas to cache_dir the first time, and memory-map them on later calls. The cache is keyed by the contents of the file, so editing it invalidates the old entry (default: {True})
     
     Returns:
         [np.array] -- Structured numpy array with a field for each header, and N elements under each header.
     """
 
+    if not cache:
+        return _parse_areas(path, dt, t_orbit, headers)
+
+    with open(path, 'rb') as f:
+        file_hash = hashlib.sha1(f.read()).hexdigest()
+    # entries of the same file read with the same arguments share a prefix, so that old versions can be found
+    args_hash = hashlib.sha1(repr((os.path.abspath(path), float(dt), t_orbit, list(headers))).encode()).hexdigest()
+    prefix = os.path.join(cache_dir, 'areas-' + args_hash[:16])
+    cache_path = prefix + '-' + file_hash[:16] + '.npy'
+
+    try:
+        # copy-on-write, so the caller can modify the areas without changing the cache
+        areas = n.load(cache_path, mmap_mode='c')
+        # touch the entry to mark it as recently used
+        os.utime(cache_path, None)
+        return areas
+    except OSError:
+        # not cached yet (or evicted by another process)
+        pass
+
+    areas = _parse_areas(path, dt, t_orbit, headers)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # the file changed since it was last cached: drop the stale entries
+        for stale in glob.glob(prefix + '-*.npy'):
+            if stale != cache_path:
+                os.remove(stale)
+        tmp_path = cache_path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            n.save(f, areas)
+        os.replace(tmp_path, cache_path)
+        evict_cache()
+    except OSError as e:
+        print("Could not cache %s: %s" % (path, e))
+    return areas
+
+
+def evict_cache(max_bytes=None):
+    """
+    Delete the least recently used entries of the area cache until it is smaller than max_bytes.
+
+    Keyword Arguments:
+        max_bytes {int} -- size bound of the cache in bytes (default: {cache_max_bytes})
+    """
+
+    max_bytes = cache_max_bytes if max_bytes is None else max_bytes
+    entries = [(os.path.getmtime(p), os.path.getsize(p), p) for p in glob.glob(os.path.join(cache_dir, 'areas-*.npy'))]
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(p)
+        total -= size
+
+
+def clear_cache():
+    """
+    Delete every entry of the area cache.
+    """
+
+    evict_cache(0)
 
 
+def _parse_areas(path, dt, t_orbit, headers):
+    """
+    Parse an STK area file, without the cache (see read_areas_from_file for the format of the file).
+
+    Arguments:
+        path {string} -- Absolute path to source csv file
+        dt {float} -- Time step of the simulation seconds
+        t_orbit {integer} -- The length of the orbit in seconds
+        headers {list} -- The names of the headers for each face
+
+    Returns:
+        [np.array] -- Structured numpy array with a field for each header, and t_orbit/dt elements under each header.
+    """
+
     # if t_orbit > len(file)*dt, it will be padded with 0s
     areas_dict = {}
     with open(path) as area_csv_file:
@@ -49,3 +133,111 @@ def read_areas_from_file(path, dt, t_orbit=None, headers=['plusX', 'plusY', 'neg
             areas_dict[h]['area'])*0.01
     times = n.array([i*dt for i in range(int(t_orbit/dt))], n.float32)
     return areas
+
+
+def index_sections(path, headers=['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']):
+    """
+    Find where the section of each face starts in an STK csv file, without parsing the values.
+    Reads the file once, line by line, so it works on files that do not fit in memory.
+
+    Arguments:
+        path {string} -- Absolute path to source csv file
+
+    Keyword Arguments:
+        headers {list} -- The names of the headers for each face (default: {['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']})
+
+    Returns:
+        dict -- header -> (byte offset of the first row of the section, number of rows in the section)
+    """
+
+    sections = {}
+    current_header = None
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            offset += len(line)
+            first = line.split(b',', 1)[0].decode('utf-8-sig').strip()
+            if first in headers:
+                current_header = first
+                sections[first] = [offset, 0]
+            elif first == '':
+                # title row (its first cell is empty) or the null row that ends the last section
+                if current_header is not None:
+                    break
+            elif current_header is not None:
+                sections[current_header][1] += 1
+    missing = [h for h in headers if h not in sections]
+    assert not missing, "Faces %s are not in %s" % (missing, path)
+    return {h: tuple(v) for h, v in sections.items()}
+
+
+def stream_areas(path, block_size=3600, headers=['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ'], column=3, scale=0.01):
+    """
+    Read an STK csv file (heron_area.csv, heron_solar_energy.csv, ...) in blocks of block_size time points.
+    Every face is its own section of the file, so one file handle is kept per face, each reading its own section.
+    Only one block is in memory at a time, e.g.
+
+        for block in fileio.stream_areas(path):
+            for i in range(len(block)):
+                total_area = sum(block[h][i] for h in headers)
+                ...
+
+    Arguments:
+        path {string} -- Absolute path to source csv file
+
+    Keyword Arguments:
+        block_size {int} -- number of time points in each block, the last one can be shorter (default: {3600})
+        headers {list} -- The names of the headers for each face (default: {['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']})
+        column {int} -- column of the value to read: 3 for the area or power, 4 for the solar intensity (default: {3})
+        scale {float} -- factor applied to the values, the same as read_areas_from_file for areas (default: {0.01})
+
+    Yields:
+        [np.array] -- Structured numpy array with a field for each header, and up to block_size elements under each header.
+        Faces with fewer rows than the longest one are padded with zeros.
+    """
+
+    sections = index_sections(path, headers)
+    n_rows = max(rows for _, rows in sections.values())
+    files = {h: open(path, 'rb') for h in headers}
+    try:
+        for h in headers:
+            files[h].seek(sections[h][0])
+        for start in range(0, n_rows, block_size):
+            size = min(block_size, n_rows - start)
+            block = n.zeros(size, [(h, n.float32) for h in headers])
+            for h in headers:
+                count = max(0, min(size, sections[h][1] - start))
+                values = [float(files[h].readline().split(b',')[column]) for _ in range(count)]
+                block[h][:count] = n.array(values, n.float32) * scale
+            yield block
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def read_times_from_file(path, header='plusX', headers=['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']):
+    """
+    Read the time column of one face of an STK csv file, in seconds since its first row.
+    STK writes the time as minutes:seconds, so the hours are recovered by assuming consecutive rows are less than an hour apart.
+
+    Arguments:
+        path {string} -- Absolute path to source csv file
+
+    Keyword Arguments:
+        header {string} -- face whose section is read (default: {'plusX'})
+        headers {list} -- The names of the headers for each face (default: {['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']})
+
+    Returns:
+        np.array -- time of every row of the section (seconds)
+    """
+
+    offset, rows = index_sections(path, headers)[header]
+    clock = n.zeros(rows)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for i in range(rows):
+            minutes, seconds = f.readline().split(b',')[2].split(b':')
+            clock[i] = 60 * float(minutes) + float(seconds)
+    steps = n.diff(clock)
+    steps[steps < 0] += 3600
+    return n.concatenate([[0.0], n.cumsum(steps)])
@@ -0,0 +1,239 @@
+import numpy as n
+from modules import schedule, thermal
+# dt is always in seconds
+
+# Numba is optional: without it, fused_steps runs as plain Python on lists, which is slower but gives the same results
+try:
+    from numba import njit
+    has_numba = True
+except ImportError:
+    has_numba = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+# constants of the thermal model, as globals so that the kernel can be compiled
+boltzman = thermal.boltzman
+solar_flux = float(thermal.solar_flux)
+batt_heater_power = thermal.batt_heater_power
+pay_heater_power = thermal.pay_heater_power
+
+# order of the loads in the kernel
+EXP, BUS, BEACON, PASSOVER, BATT_HEATER, PAY_HEATER = range(6)
+# layout of the params array
+params_layout = ['battery_capacity_mAh', 'converter_efficiency', 'sp_battery', 'sp_payload_stasis', 'sp_payload_exp',
+                 'area_t', 'r_batt', 'R_str_pay', 'R_str_batt', 'c_str', 'c_batt', 'c_pay', 'e', 'a', 'dt']
+# layout of the state array
+state_layout = ['charge', 'T_str', 'T_pay', 'T_batt', 'batt_current_in', 'batt_current_out', 'batt_current_net',
+                'solar_shunts', 'exp', 'max_solar_current_in_mA', 'Q_str', 'Q_pay', 'Q_batt']
+# columns written by fused_steps for every step
+step_layout = ['batt_heater', 'pay_heater', 'charge', 'T_batt', 'T_str', 'T_pay', 'Q_batt', 'Q_str', 'Q_pay',
+               'current_in', 'current_out', 'solar_shunts']
+# columns of the trackers besides the loads
+output_layout = ['time', 'solar_shunts', 'temperatures/battery', 'temperatures/structure', 'temperatures/payload',
+                 'qdots/battery', 'qdots/structure', 'qdots/payload', 'batt_current_net', 'batt_current_in',
+                 'batt_current_out', 'batt_v', 'batt_charge', 'power_in', 'power_out', 'power_net',
+                 'max_solar_current_in_mA']
+
+
+@njit(cache=True)
+def fused_steps(beacon, passover, exp, solar_str, solar_pay, max_solar, params, load_power, load_i, order, state,
+                out):
+    # The driver loop of Power_Sims.py (set_state, draw_powers, update_thermal with Euler steps,
+    # charge_from_solar_panel) for every step, on plain floats. Only what depends on the step before is done here:
+    # the solar terms are computed with numpy before, and the columns that follow from out (step_layout), like
+    # the battery voltage and the powers, after (see run_fused).
+    # The operations are in the same order as in Satellite and thermal, so the results match the Satellite loop.
+    # Returns the number of steps where the battery died.
+    cap = params[0]
+    eff = params[1]
+    area_t = params[5]
+    r_batt = params[6]
+    R_pay = 1 / params[7]
+    R_batt = 1 / params[8]
+    c_str = params[9]
+    c_batt = params[10]
+    c_pay = params[11]
+    e = params[12]
+    dt = params[14]
+
+    charge = state[0]
+    T_str = state[1]
+    T_pay = state[2]
+    T_batt = state[3]
+    current_in = state[4]
+    current_out = state[5]
+    current_net = state[6]
+    shunts = state[7]
+    exp_on = state[8]
+    Q_str = state[10]
+    Q_pay = state[11]
+    Q_batt = state[12]
+
+    died = 0
+    for k in range(len(exp)):
+        # set_state: heaters first, with the experiment state of the last step
+        pay_setpoint = params[4] if exp_on > 0 else params[3]
+        heat_batt = 1.0 if T_batt < params[2] else 0.0
+        heat_pay = 1.0 if T_pay < pay_setpoint else 0.0
+        exp_on = exp[k]
+        # states of the loads, in the order EXP, BUS, BEACON, PASSOVER, BATT_HEATER, PAY_HEATER
+        states = (exp_on, 1.0, beacon[k], passover[k], heat_batt, heat_pay)
+
+        # draw_powers
+        current_out = 0.0
+        for j in range(6):
+            load = order[j]
+            if states[load] > 0:
+                batt_v = 2.5 + (charge / cap) * 1.5
+                new_charge = charge - (load_power[load] / batt_v) * (dt / 3600.0) * (1 / eff)
+                if new_charge < 0:
+                    died += 1
+                    charge = 0.0
+                else:
+                    charge = new_charge
+                current_out += load_i[load]
+        current_net = current_out - current_in
+
+        # update_thermal
+        I_t = current_net * (dt / 3600.0)
+        rad_out = e * boltzman * area_t * T_str ** 4
+        Q_str = ((solar_str[k] - rad_out) + -R_pay * (T_str - T_pay)) + -R_batt * (T_str - T_batt)
+        Q_batt = (-R_batt * (T_batt - T_str) + batt_heater_power * heat_batt) + 4 * (r_batt * I_t) ** 2
+        Q_pay = (-R_batt * (T_pay - T_str) + pay_heater_power * heat_pay) + (solar_pay[k] - rad_out)
+        T_str_new = T_str + (1 / c_str) * dt * Q_str
+        T_batt = T_batt + (1 / c_batt) * dt * Q_batt
+        T_pay = T_pay + (1 / c_pay) * dt * Q_pay
+        T_str = T_str_new
+
+        # charge_from_solar_panel
+        new_charge = charge + max_solar[k] * (dt / 3600)
+        current_in = (min(new_charge, cap) - charge) / (dt * 1.0 / 3600.0)
+        charge = min(new_charge, cap)
+        if new_charge > cap:
+            shunts = 1.0
+        current_net = current_out - current_in
+
+        row = out[k]
+        row[0] = heat_batt
+        row[1] = heat_pay
+        row[2] = charge
+        row[3] = T_batt
+        row[4] = T_str
+        row[5] = T_pay
+        row[6] = Q_batt
+        row[7] = Q_str
+        row[8] = Q_pay
+        row[9] = current_in
+        row[10] = current_out
+        row[11] = shunts
+
+    state[0] = charge
+    state[1] = T_str
+    state[2] = T_pay
+    state[3] = T_batt
+    state[4] = current_in
+    state[5] = current_out
+    state[6] = current_net
+    state[7] = shunts
+    state[8] = exp_on
+    state[10] = Q_str
+    state[11] = Q_pay
+    state[12] = Q_batt
+    return died
+
+
+def run_fused(sat, profile, n_points, dt=1.0, t0=0.0, sched=None, side_area=0.03 * 0.01):
+    """
+    Run the standard simulation loop on a Satellite in one compiled kernel, and record every step in its trackers.
+    Equivalent to calling set_state, draw_powers, update_thermal (Euler), charge_from_solar_panel and
+    update_state_tracker at t0, t0 + dt, ..., but without any Python calls or dictionaries per step.
+    Uses numba if it is installed. Otherwise the same kernel runs as plain Python on lists: the parts that only
+    depend on time are still computed with numpy, but the heaters, charge and temperatures are stepped one at a time.
+
+    Arguments:
+        sat {satellite.Satellite} -- satellite to simulate, its state is updated to the end of the run
+        profile {orbit.OrbitProfile} -- sun areas over one orbit
+        n_points {int} -- number of steps
+
+    Keyword Arguments:
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        t0 {float} -- Time of the first step (seconds) (default: {0.0})
+        sched {schedule.LoadSchedule} -- compiled schedule covering the steps, compiled from the satellite's timings if None (default: {None})
+        side_area {float} -- area of one side (m^2), to turn the panel area into the effective area of charge_from_solar_panel (default: {0.03*0.01})
+
+    Returns:
+        satellite.Satellite -- the satellite
+    """
+
+    if n_points <= 0:
+        return sat
+    t = t0 + n.arange(n_points) * dt
+    if sched is None:
+        timings = {'beacon_interval': sat.beacon_interval, 'beacon_duration': sat.beacon_duration,
+                   'passover_interval': sat.passover_interval,
+                   'passover_duration_exp_off': sat.passover_duration_exp_off,
+                   'passover_duration_exp_on': sat.passover_duration_exp_on,
+                   'exp_start_time': sat.exp_start_time, 'exp_duration': sat.exp_duration}
+        sched = schedule.compile_schedule(timings, n_points, dt, t0)
+    rows = slice(sched.index(t0), sched.index(t[-1]) + 1)
+    beacon, passover, exp = [sched.states[k][rows].astype(n.float64) for k in ('beacon', 'passover', 'exp')]
+
+    sc = sat.structure_constants
+    # the parts that only depend on time, in the same order of operations as the Satellite loop
+    sun_area, paycap_area, panel_area = profile.areas_at(t)
+    solar_str = sc['a'] * sun_area * solar_flux
+    solar_pay = paycap_area * sc['a'] * solar_flux
+    max_solar = (panel_area / side_area) * 1500.0
+    params = n.array([sat.battery_capacity_mAh, sat.converter_efficiency, sat.heater_setpoints['battery'],
+                      sat.heater_setpoints['payload_stasis'], sat.heater_setpoints['payload_exp'],
+                      sc['area_t'], sc['r_batt'], sc['R_str_pay'], sc['R_str_batt'],
+                      sc['c_str'], sc['c_batt'], sc['c_pay'], sc['e'], sc['a'], dt], n.float64)
+    roles = [sat.exp, sat.bus_const_pwr, sat.beacon, sat.passover, sat.batt_heater, sat.pay_heater]
+    load_i = n.array([l['i'] for l in roles], n.float64)
+    load_power = n.array([l['v'] * l['i'] for l in roles], n.float64)
+    order = n.array([[l is r for r in roles].index(True) for l in sat.loads], n.int64)
+    state = n.array([sat.charge, sat.temperatures['structure'], sat.temperatures['payload'],
+                     sat.temperatures['battery'], sat.batt_current_in, sat.batt_current_out, sat.batt_current_net,
+                     sat.solar_shunts, sat.exp['state'], sat.max_solar_current_in_mA,
+                     sat.qdots['structure'], sat.qdots['payload'], sat.qdots['battery']], n.float64)
+
+    inputs = [beacon, passover, exp, solar_str, solar_pay, max_solar, params, load_power, load_i, order]
+    if not has_numba:
+        # indexing lists is much faster than indexing arrays in plain Python
+        inputs = [a.tolist() for a in inputs]
+    # column-major, so that every column is contiguous when it is copied into the trackers
+    out = n.zeros((n_points, len(step_layout)), order='F')
+    died = fused_steps(*inputs, state, out)
+    if died:
+        print("Battery Died (%d steps)" % died)
+
+    # write the final state back to the satellite
+    sat.charge, T_str, T_pay, T_batt = state[0:4]
+    sat.temperatures['structure'], sat.temperatures['payload'], sat.temperatures['battery'] = T_str, T_pay, T_batt
+    sat.batt_current_in, sat.batt_current_out, sat.batt_current_net = state[4:7]
+    sat.solar_shunts = bool(state[7])
+    sat.max_solar_current_in_mA = max_solar[-1]
+    sat.qdots['structure'], sat.qdots['payload'], sat.qdots['battery'] = state[10:13]
+
+    # update_state_tracker, for all of the steps at once
+    steps = dict(zip(step_layout, out.T))
+    states = [exp, n.ones(n_points), beacon, passover, steps['batt_heater'], steps['pay_heater']]
+    columns = {}
+    for load, role in zip(sat.loads, order):
+        columns['loads/%s/0' % load['name']] = states[role]
+        columns['loads/%s/1' % load['name']] = n.where(states[role] > 0, load_i[role], 0.0)
+        load['state'] = bool(states[role][-1])
+        load['inst_current'] = columns['loads/%s/1' % load['name']][-1]
+    current_in, current_out, charge = steps['current_in'], steps['current_out'], steps['charge']
+    current_net = current_out - current_in
+    batt_v = 2.5 + (charge / sat.battery_capacity_mAh) * 1.5
+    for name, column in zip(output_layout, [t, steps['solar_shunts'], steps['T_batt'], steps['T_str'], steps['T_pay'],
+                                            steps['Q_batt'], steps['Q_str'], steps['Q_pay'], current_net, current_in,
+                                            current_out, batt_v, charge, current_in * batt_v, current_out * batt_v,
+                                            -current_net * batt_v, max_solar]):
+        columns[name] = column
+    sat.trackers.extend(columns)
+    return sat
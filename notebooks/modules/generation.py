@@ -0,0 +1,77 @@
+import numpy as n
+from modules import geometry
+
+# 0-3: long edges, 4: top, 5: bottom
+starting_orientation = n.array([[1, 0, 0], [0, 1, 0], [-1, 0, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]], n.float64)
+
+
+def orbit_points(period, dt, n_orbits):
+    """
+    Times of the points of a simulation, the same way as vpython_utils.simulate picks them.
+    dt is shrunk so that a whole number of points fits in an orbit.
+
+    Arguments:
+        period {float} -- length of an orbit
+        dt {float} -- time step, in the same unit as period
+        n_orbits {int} -- number of orbits
+
+    Returns:
+        tuple -- (time of every point, the dt that was used)
+    """
+
+    n_pts_per_orbit = int(period / dt)
+    dt = period / (1.0 * n_pts_per_orbit)
+    n_pts = int(n_pts_per_orbit * n_orbits + 1)
+    return n.arange(n_pts) * dt, dt
+
+
+def generate_powers(orbit, solar_sys, cell_areas, dt, n_orbits=1, eclipse_frac=0.5, faces=starting_orientation,
+                    efficiency=0.3, spin=False, chunk_size=1000000):
+    """
+    Power generated by each face of the satellite over whole orbits, without vpython or real-time pacing.
+    Uses the same model as vpython_utils.animate: each face normal is rotated by the orbit's theta and phi
+    and the psi of orbit['psi_mode'], and generates power in proportion to its projection on the sun vector,
+    except during the eclipse (orbit fraction < eclipse_frac).
+
+    Arguments:
+        orbit {dict} -- 'period', 'theta', 'phi', 'psi_mode' and 'zrot_period' of the orbit
+        solar_sys {dict} -- 'sun_vector' and 'solar_flux' (W m^-2)
+        cell_areas {np.array} -- area of solar cells on each face (cm^2)
+        dt {float} -- time step, in the same unit as the period
+
+    Keyword Arguments:
+        n_orbits {int} -- number of orbits (default: {1})
+        eclipse_frac {float} -- fraction of the orbit spent in eclipse, at the start of each orbit (default: {0.5})
+        faces {np.array} -- normal of each face before any rotation (default: {starting_orientation})
+        efficiency {float} -- efficiency of the solar cells (default: {0.3})
+        spin {bool} -- also spin the satellite around its long axis with orbit['zrot_period'], which animate only
+                       shows in the 3D view and leaves out of the power (default: {False})
+        chunk_size {int} -- number of points computed at once, to bound memory on long runs (default: {1000000})
+
+    Returns:
+        dict -- 't': time of each point, 'dt': time step used, 'zrot': spin angle at each point,
+                'per_face': power of each face (W) with shape (faces, points), 'total': total power (W)
+    """
+
+    ts, dt = orbit_points(orbit['period'], dt, n_orbits)
+    # animate adds the spin of the step before drawing the point
+    zrot = (n.arange(1, len(ts) + 1) * geometry.get_zrot(dt / orbit['zrot_period'])) % (2 * n.pi)
+    scale = -1.0 * solar_sys['solar_flux'] * (1 / 10000.0) * n.asarray(cell_areas, n.float64) * efficiency
+
+    per_face = n.zeros((len(faces), len(ts)), n.float32)
+    for start in range(0, len(ts), chunk_size):
+        stop = min(start + chunk_size, len(ts))
+        fraction = (ts[start:stop] % orbit['period']) / orbit['period']
+        psi = geometry.get_psi_batch(fraction, orbit['psi_mode'])
+        if spin:
+            # spinning around the long axis is a rotation around z before the attitude is applied
+            body = geometry.rotate_vector_batch(faces, phi=-zrot[start:stop])
+            normals = n.einsum('aij,afj->afi', geometry.rotation_matrices(orbit['theta'], orbit['phi'], psi), body)
+        else:
+            normals = geometry.rotate_vector_batch(faces, orbit['theta'], orbit['phi'], psi)
+        area_ratio, _ = geometry.dot_and_angle_batch(solar_sys['sun_vector'], normals)
+        power = scale * area_ratio
+        power[(power < 0) | (fraction < eclipse_frac)[:, None]] = 0
+        per_face[:, start:stop] = power.T
+
+    return {'t': ts, 'dt': dt, 'zrot': zrot, 'per_face': per_face, 'total': per_face.sum(axis=0)}
@@ -1,7 +1,5 @@
 import numpy as n
 
-from vpython import vector
-
 
 def unit_vector(vector):
     """ Returns the unit vector of the vector.  """
@@ -85,10 +83,72 @@ def orbit_xyz(t,  # time elapsed / period, 0 < t < 1
     return rotate_vector(starting_position, theta, phi, 2*n.pi*t)
 
 
+# Array versions of the functions above, for computing a whole orbit (or mission) at once.
+# Angles and times can be arrays of any shape (they are broadcast together), and the results are
+# stacked along the leading axes instead of being computed one call at a time.
+
+def rotation_matrices(theta=0, phi=0, psi=0):
+    """ Stacked rotation matrices of rotate_vector, shape angles.shape + (3, 3) """
+    theta, phi, psi = n.broadcast_arrays(*[n.asarray(a, n.float64) for a in (theta, phi, psi)])
+    ct, st = n.cos(theta), n.sin(theta)
+    cf, sf = n.cos(phi), n.sin(phi)
+    cp, sp = n.cos(psi), n.sin(psi)
+    # rot_matrix_d . rot_matrix_c . rot_matrix_b, multiplied out
+    rot = n.empty(theta.shape + (3, 3))
+    rot[..., 0, 0] = cf*cp + sf*st*sp
+    rot[..., 0, 1] = sf*ct
+    rot[..., 0, 2] = -cf*sp + sf*st*cp
+    rot[..., 1, 0] = -sf*cp + cf*st*sp
+    rot[..., 1, 1] = cf*ct
+    rot[..., 1, 2] = sf*sp + cf*st*cp
+    rot[..., 2, 0] = ct*sp
+    rot[..., 2, 1] = -st
+    rot[..., 2, 2] = ct*cp
+    return rot
+
+
+def rotate_vector_batch(v, theta=0, phi=0, psi=0):
+    """ rotate_vector for arrays of angles and vectors.
+
+        v has shape V + (3,), e.g. (3,) for one vector or (6, 3) for the normals of every face,
+        and the angles broadcast to a shape A. Returns every vector rotated by every set of angles,
+        with shape A + V + (3,).
+    """
+    rot = rotation_matrices(theta, phi, psi)
+    v = n.asarray(v, n.float64)
+    # tensordot goes through BLAS, and is much faster than einsum for long orbits
+    out = n.tensordot(rot, v, axes=([-1], [-1]))
+    return n.moveaxis(out, rot.ndim - 2, -1)
+
+
+def orbit_xyz_batch(t, theta=0, phi=0, starting_position=(0, 0, 1)):
+    """ orbit_xyz for an array of orbit fractions t, returns shape t.shape + (3,) """
+    return rotate_vector_batch(starting_position, theta, phi, 2*n.pi*n.asarray(t, n.float64))
+
+
+def get_psi_batch(t, method='fast-pole-flip'):
+    """ get_psi for an array of orbit fractions t """
+    t = n.asarray(t, n.float64)
+    if method == 'zero':
+        return n.zeros(t.shape)
+    return get_psi(t, method)
+
+
+def dot_and_angle_batch(v1, v2):
+    """ dot_and_angle along the last axis of two arrays of vectors, which are broadcast together """
+    v1 = n.asarray(v1, n.float64)
+    v2 = n.asarray(v2, n.float64)
+    norms = n.sqrt(n.einsum('...i,...i->...', v1, v1) * n.einsum('...i,...i->...', v2, v2))
+    dot = n.clip(n.einsum('...i,...i->...', v1, v2) / norms, -1.0, 1.0)
+    return dot, n.arccos(dot)
+
+
 # Because our coordinate system doesn't look so nice on vpython,
 # we're gonna flip everything when passing to vpython
 # this is kind of just asking for things to go wrong but its ok we'll figure it out
 # flip of (1,2,0) makes x come out of the page, y to the right and z up when it is first loaded 
 def vecflip(vin, flip=(1, 2, 0), signs = (1,1,1)):
+    # imported here so that the rest of geometry works without vpython installed
+    from vpython import vector
     #print (vin[flip[0]], vin[flip[1]], vin[flip[2]])
     return vector(signs[0] * vin[flip[0]], signs[1] * vin[flip[1]], signs[2] * vin[flip[2]])
@@ -0,0 +1,606 @@
+import csv
+import time
+import threading
+import numpy as n
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from modules import hilfile
+# all times are in seconds, from time.monotonic
+
+
+def eload_command(load_power_mW):
+    # the e-load takes watts
+    return 'POW ' + str(load_power_mW / 1000.0)
+
+
+def supply_command(supply_current_mA, channel=1, voltage=5):
+    # the supply takes amps
+    return 'APPL CH%d, %s, %s' % (channel, voltage, supply_current_mA / 1000.0)
+
+
+def profile_commands(load_power_mW, supply_current_mA, channel=1, voltage=5):
+    """
+    Commands replaying a load power and supply current profile, one step per sample
+
+    Arguments:
+        load_power_mW {list} -- power drawn by the e-load at each step (mW)
+        supply_current_mA {list} -- current given by the DC supply at each step (mA)
+
+    Keyword Arguments:
+        channel {int} -- channel of the DC supply (default: {1})
+        voltage {float} -- voltage of the DC supply (V) (default: {5})
+
+    Returns:
+        generator -- {'eload': command, 'DC': command} for every step
+    """
+
+    for power, current in zip(load_power_mW, supply_current_mA):
+        yield {'eload': eload_command(float(power)), 'DC': supply_command(float(current), channel, voltage)}
+
+
+def profile_settings(load_power_mW, supply_current_mA, channel=1, voltage=5):
+    """
+    Settings replaying a load power and supply current profile, one step per sample, for CommandPipeline
+
+    Arguments:
+        load_power_mW {list} -- power drawn by the e-load at each step (mW)
+        supply_current_mA {list} -- current given by the DC supply at each step (mA)
+
+    Keyword Arguments:
+        channel {int} -- channel of the DC supply (default: {1})
+        voltage {float} -- voltage of the DC supply (V) (default: {5})
+
+    Returns:
+        generator -- {'eload': {'POW': W}, 'DC': {'APPL CH<channel>': (V, A)}} for every step
+    """
+
+    key = 'APPL CH%d' % channel
+    for power, current in zip(load_power_mW, supply_current_mA):
+        yield {'eload': {'POW': float(power) / 1000.0}, 'DC': {key: (voltage, float(current) / 1000.0)}}
+
+
+def accelerate_profile(series, dt=1.0, factor=1.0, min_interval=0.0, limits=None):
+    """
+    Resample profiles to replay them factor times faster than the simulation ran.
+    Every replay step stands for factor * (its wall-clock length) seconds of simulation, and its value is the mean
+    of the profile over that span, times factor: the charge delivered and energy dissipated over a step are the same
+    as over the span of simulation it replaces. Fine for battery and EPS endurance tests, but the currents and
+    powers are factor times higher, and everything thermal happens factor times faster.
+
+    The replay step is dt / factor, or min_interval (the shortest time between commands the instruments handle)
+    if that is longer, in which case several simulation steps are merged into each replay step.
+
+    Arguments:
+        series {dict} -- name -> profile, one value per simulation step (e.g. mA or mW)
+
+    Keyword Arguments:
+        dt {float} -- time step of the profiles (seconds) (default: {1.0})
+        factor {float} -- speedup of the replay (default: {1.0})
+        min_interval {float} -- shortest wall-clock time between steps (seconds) (default: {0.0})
+        limits {dict} -- name -> largest value the instrument can produce, to check the scaled profiles (default: {None})
+
+    Returns:
+        tuple -- (name -> resampled profile, scaling), where scaling is a dict with 'factor', 'period' (wall-clock
+                 time between replay steps), 'sim_per_step' (simulation seconds in a step), 'amplitude_scale',
+                 'steps' and, for every profile, its total (value * seconds of simulation) and peak before and after
+    """
+
+    period = max(dt / float(factor), min_interval)
+    sim_per_step = period * factor
+    length = len(next(iter(series.values())))
+    duration = length * dt
+    n_steps = int(n.ceil(duration / sim_per_step - 1e-9))
+    edges = n.minimum(n.arange(n_steps + 1) * sim_per_step, duration)
+
+    resampled = {}
+    scaling = {'factor': float(factor), 'period': period, 'sim_per_step': sim_per_step, 'amplitude_scale': float(factor),
+               'steps': n_steps}
+    for name, values in series.items():
+        values = n.asarray(values, n.float64)
+        # integral of the piecewise constant profile, at the edges of the replay steps
+        integral = n.interp(edges, n.arange(length + 1) * dt, n.concatenate([[0.0], n.cumsum(values) * dt]))
+        # the last step can be shorter than the others: it is replayed for a whole period, so average over its length
+        resampled[name] = n.diff(integral) / n.diff(edges) * factor
+        scaling[name + '_total'] = float(integral[-1])
+        scaling[name + '_total_replayed'] = float(n.sum(resampled[name] * n.diff(edges) / factor))
+        scaling[name + '_peak'] = float(n.max(values)) if length else 0.0
+        scaling[name + '_peak_replayed'] = float(n.max(resampled[name])) if n_steps else 0.0
+        if limits is not None and name in limits and scaling[name + '_peak_replayed'] > limits[name]:
+            print("Warning: %s reaches %.1f at %gx, above the limit of %.1f" % (
+                name, scaling[name + '_peak_replayed'], factor, limits[name]))
+    return resampled, scaling
+
+
+def scaling_report(scaling):
+    """
+    Scaling of an accelerated replay as text, for printing or logging
+
+    Arguments:
+        scaling {dict} -- scaling returned by accelerate_profile
+
+    Returns:
+        string -- the report
+    """
+
+    lines = ["Replay %gx faster: %d steps of %g s wall-clock, %g s of simulation each, amplitudes x%g" % (
+        scaling['factor'], scaling['steps'], scaling['period'], scaling['sim_per_step'], scaling['amplitude_scale'])]
+    names = [k[:-len('_total')] for k in scaling if k.endswith('_total')]
+    for name in names:
+        lines.append("  %s: peak %.1f -> %.1f, total %.1f -> %.1f" % (
+            name, scaling[name + '_peak'], scaling[name + '_peak_replayed'], scaling[name + '_total'],
+            scaling[name + '_total_replayed']))
+    return '\n'.join(lines)
+
+
+class ReplayLog():
+    def __init__(self, names, n_steps):
+        """
+        Timing of every step of a replay, filled in by ReplayScheduler.run
+
+        Arguments:
+            names {list} -- names of the instruments
+            n_steps {int} -- number of steps expected (the arrays grow if there are more)
+        """
+
+        self.names = list(names)
+        self.length = 0
+        self.deadline = n.zeros(n_steps)
+        self.start = n.zeros(n_steps)
+        self.latency = n.zeros((n_steps, len(self.names)))
+        # 0: on time, 1: late, 2: missed (skipped)
+        self.status = n.zeros(n_steps, n.int8)
+
+    def add(self, deadline, start, latency, status):
+        if self.length == len(self.deadline):
+            grow = max(len(self.deadline), 1)
+            self.deadline = n.concatenate([self.deadline, n.zeros(grow)])
+            self.start = n.concatenate([self.start, n.zeros(grow)])
+            self.latency = n.concatenate([self.latency, n.zeros((grow, len(self.names)))])
+            self.status = n.concatenate([self.status, n.zeros(grow, n.int8)])
+        k = self.length
+        self.deadline[k], self.start[k], self.latency[k], self.status[k] = deadline, start, latency, status
+        self.length += 1
+
+    @property
+    def jitter(self):
+        # how long after its deadline every step was sent (seconds)
+        return self.start[:self.length] - self.deadline[:self.length]
+
+    def summary(self):
+        '''
+        Statistics of the replay
+
+        Returns:
+            dict -- number of steps, late and missed steps, jitter and per-instrument latency statistics (seconds),
+                    and the drift of the last step from its deadline
+        '''
+
+        sent = self.status[:self.length] < 2
+        jitter = self.jitter[sent]
+        stats = {'steps': self.length,
+                 'late': int(n.sum(self.status[:self.length] == 1)),
+                 'missed': int(n.sum(self.status[:self.length] == 2)),
+                 'jitter_mean': float(n.mean(jitter)) if len(jitter) else 0.0,
+                 'jitter_max': float(n.max(jitter)) if len(jitter) else 0.0,
+                 'drift': float(self.jitter[-1]) if self.length else 0.0}
+        for j, name in enumerate(self.names):
+            latency = self.latency[:self.length, j][sent]
+            stats[name + '_latency_mean'] = float(n.mean(latency)) if len(latency) else 0.0
+            stats[name + '_latency_p99'] = float(n.percentile(latency, 99)) if len(latency) else 0.0
+            stats[name + '_latency_max'] = float(n.max(latency)) if len(latency) else 0.0
+        return stats
+
+    def report(self):
+        '''
+        Summary of the replay as text, for printing
+
+        Returns:
+            string -- the report
+        '''
+
+        s = self.summary()
+        lines = ["%d steps, %d late, %d missed" % (s['steps'], s['late'], s['missed']),
+                 "jitter: mean %.2f ms, max %.2f ms, last step %.2f ms" % (1e3 * s['jitter_mean'], 1e3 * s['jitter_max'],
+                                                                          1e3 * s['drift'])]
+        for name in self.names:
+            lines.append("%s latency: mean %.2f ms, p99 %.2f ms, max %.2f ms" % (
+                name, 1e3 * s[name + '_latency_mean'], 1e3 * s[name + '_latency_p99'], 1e3 * s[name + '_latency_max']))
+        return '\n'.join(lines)
+
+    def write_csv(self, path):
+        '''
+        Write the timing of every step to a csv file
+
+        Arguments:
+            path {string} -- path of the file
+        '''
+
+        status = ['ok', 'late', 'missed']
+        with open(path, 'w') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['step', 'deadline_s', 'jitter_ms'] + [name + '_latency_ms' for name in self.names] + ['status'])
+            for k in range(self.length):
+                writer.writerow([k, self.deadline[k] - self.deadline[0], 1e3 * (self.start[k] - self.deadline[k])] +
+                                list(1e3 * self.latency[k]) + [status[self.status[k]]])
+
+
+class ReplayScheduler():
+    def __init__(self, instruments, period=1.0, late_after=0.05, lead_time=0.5, clock=time.monotonic, sleep=time.sleep,
+                 telemetry=None):
+        """
+        Send commands to instruments on a fixed schedule. Step k is due at start + k * period on the monotonic
+        clock, so time spent talking to the instruments does not push the following steps back.
+        At every step, the commands of all of the instruments are sent at the same time, one thread per instrument.
+
+        A step sent more than late_after after its deadline is counted as late. A step whose deadline is
+        already behind the next step's deadline is missed: it is skipped, since its setpoints would be
+        replaced straight away, and the replay stays on schedule.
+
+        Arguments:
+            instruments {dict} -- name -> instrument with a write(command) method, e.g. a pyvisa resource
+
+        Keyword Arguments:
+            period {float} -- time between steps (seconds) (default: {1.0})
+            late_after {float} -- delay after the deadline (seconds) after which a step counts as late (default: {0.05})
+            lead_time {float} -- delay before the first step (seconds) (default: {0.5})
+            clock {function} -- clock used for the deadlines (default: {time.monotonic})
+            sleep {function} -- function used to wait (default: {time.sleep})
+            telemetry {TelemetryCapture} -- read the instruments between the steps (default: {None})
+        """
+
+        self.instruments = instruments
+        self.names = list(instruments.keys())
+        self.period = float(period)
+        self.late_after = late_after
+        self.lead_time = lead_time
+        self.clock = clock
+        self.sleep = sleep
+        self.telemetry = telemetry
+
+    def _send(self, name, commands):
+        # write the commands of one instrument in order, and time them
+        with self.telemetry.locks[name] if self.telemetry is not None else nullcontext():
+            start = self.clock()
+            for command in commands:
+                self.instruments[name].write(command)
+            return self.clock() - start
+
+    def run(self, steps, n_steps=None, on_step=None, times=None):
+        '''
+        Replay the steps
+
+        Arguments:
+            steps {iterable} -- for every step, a dict of instrument name -> command (or list of commands) to send
+
+        Keyword Arguments:
+            n_steps {int} -- number of steps, to preallocate the log (default: {None})
+            on_step {function} -- called as on_step(k, status) after step k, in the time left before the next deadline,
+                                  e.g. to log the data (default: {None})
+            times {np.array} -- time of every step from the start (seconds), instead of k * period (default: {None})
+
+        Returns:
+            ReplayLog -- timing of every step
+        '''
+
+        log = ReplayLog(self.names, 1024 if n_steps is None else n_steps)
+        with ThreadPoolExecutor(max_workers=len(self.names)) as pool:
+            start = self.clock() + self.lead_time
+            if self.telemetry is not None:
+                self.telemetry.start(start)
+            try:
+                self._run(steps, on_step, times, log, pool, start)
+            finally:
+                if self.telemetry is not None:
+                    self.telemetry.stop()
+        return log
+
+    def _run(self, steps, on_step, times, log, pool, start):
+        for k, commands in enumerate(steps):
+            deadline = start + (k * self.period if times is None else times[k])
+            next_deadline = start + ((k + 1) * self.period if times is None or k + 1 >= len(times) else times[k + 1])
+            now = self.clock()
+            if now < deadline:
+                self.sleep(deadline - now)
+                now = self.clock()
+
+            if now >= next_deadline:
+                log.add(deadline, now, n.zeros(len(self.names)), 2)
+            else:
+                futures = {}
+                for name, command in commands.items():
+                    futures[name] = pool.submit(self._send, name, [command] if isinstance(command, str) else command)
+                latency = [futures[name].result() if name in futures else 0.0 for name in self.names]
+                log.add(deadline, now, latency, 1 if now - deadline > self.late_after else 0)
+            if self.telemetry is not None:
+                self.telemetry.next_deadline = next_deadline
+            if on_step is not None:
+                on_step(k, log.status[k])
+
+
+class CommandPipeline():
+    def __init__(self, resolutions, coalesce=True):
+        """
+        Turn the settings of every step into instrument commands, sending only what changed.
+        A setting is sent when it differs from the last value sent by more than its resolution, so long
+        constant stretches of a profile (eclipse, loads that do not toggle) cost no bus traffic.
+        With coalesce, all of the commands for one instrument in a step go in one message, separated by ';:'
+        (the ':' keeps a key like 'SOUR:CURR' from taking the path of the command before it).
+
+        A setting is written as '<key> <value>', or '<key>, <v1>, <v2>' for a tuple of values,
+        e.g. 'POW 1.5' and 'APPL CH1, 5, 0.5'.
+
+        If the scheduler skips a step (missed deadline), call missed so that its changes are sent with the next step.
+
+        Arguments:
+            resolutions {dict} -- instrument name -> {setting key -> resolution}, e.g.
+                                  {'eload': {'POW': 0.001}, 'DC': {'APPL CH1': 0.001}}, in the units of the commands
+
+        Keyword Arguments:
+            coalesce {bool} -- send all of the commands of an instrument in a step as one message (default: {True})
+        """
+
+        self.resolutions = resolutions
+        self.coalesce = coalesce
+        self.reset()
+
+    def reset(self):
+        '''
+        Forget what was sent, so that every setting is sent again at the next step, e.g. after reconnecting
+        '''
+
+        self.last = {name: {} for name in self.resolutions}
+        self.before = None
+        self.n_steps = 0
+        self.n_settings = 0
+        self.n_sent = 0
+        self.n_writes = 0
+        self.n_missed = 0
+
+    def changed(self, name, key, value):
+        # True if value is more than a resolution away from what was last sent
+        if key not in self.last[name]:
+            return True
+        resolution = self.resolutions[name].get(key, 0.0)
+        return n.any(n.abs(n.subtract(value, self.last[name][key])) > resolution)
+
+    def commands(self, settings):
+        '''
+        Commands to send for one step
+
+        Arguments:
+            settings {dict} -- instrument name -> {setting key -> value}
+
+        Returns:
+            dict -- instrument name -> command, or list of commands without coalesce, only for instruments with changes
+        '''
+
+        self.before = ({name: dict(last) for name, last in self.last.items()}, self.n_sent, self.n_writes)
+        self.n_steps += 1
+        out = {}
+        for name, values in settings.items():
+            sent = []
+            for key, value in values.items():
+                self.n_settings += 1
+                if self.changed(name, key, value):
+                    self.last[name][key] = value
+                    if isinstance(value, tuple):
+                        sent.append(key + ', ' + ', '.join(str(v) for v in value))
+                    else:
+                        sent.append(key + ' ' + str(value))
+            if sent:
+                self.n_sent += len(sent)
+                self.n_writes += 1 if self.coalesce else len(sent)
+                out[name] = ';:'.join(c.lstrip(':') for c in sent) if self.coalesce else sent
+        return out
+
+    def steps(self, settings):
+        '''
+        Commands of every step, for ReplayScheduler.run
+
+        Arguments:
+            settings {iterable} -- settings of every step, e.g. from profile_settings
+
+        Returns:
+            generator -- commands of every step (see commands)
+        '''
+
+        for step in settings:
+            yield self.commands(step)
+
+    def missed(self):
+        '''
+        The last step was not sent: go back to what was sent before it
+        '''
+
+        if self.before is not None:
+            self.last, self.n_sent, self.n_writes = self.before
+            self.before = None
+            self.n_missed += 1
+
+    def summary(self):
+        '''
+        Bus traffic saved
+
+        Returns:
+            dict -- steps, settings asked for, commands sent, writes (round-trips) made, and round-trips saved
+                    compared to one write per setting per step
+        '''
+
+        return {'steps': self.n_steps, 'settings': self.n_settings, 'sent': self.n_sent, 'writes': self.n_writes,
+                'round_trips_saved': self.n_settings - self.n_writes}
+
+    def report(self):
+        s = self.summary()
+        return "%d settings over %d steps: %d commands sent in %d writes, %d round-trips saved (%.1f%%)" % (
+            s['settings'], s['steps'], s['sent'], s['writes'], s['round_trips_saved'],
+            100.0 * s['round_trips_saved'] / max(s['settings'], 1))
+
+
+class TelemetryCapture():
+    def __init__(self, instruments, queries, period=1.0, interval=0.25, commanded=None, window=100, guard=0.005,
+                 log_prefix=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Read the measurements of the instruments while a ReplayScheduler sends the setpoints (pass it as
+        telemetry=). Every instrument is polled by its own thread, and all of its queries go in one compound
+        message (with a ':' before every header after the first, so they do not take the path of the one before).
+        A poll is only started if it can be done before the next command deadline (given the longest round-trip
+        seen so far), and an instrument is never written and queried at the same time, so the commands stay
+        on schedule. Pyvisa resources are not thread safe, so the instruments are locked while they are used.
+
+        Samples are timed on the replay clock, as the step they fall in and the time since that step's
+        deadline. If commanded values are given, the error of every measurement (measured - commanded, with the
+        setpoint of the step) is accumulated, over the whole run and over the last window samples.
+
+        Arguments:
+            instruments {dict} -- name -> instrument with a query_ascii_values(message, separator) method, the same as the scheduler's
+            queries {dict} -- name -> {channel: query}, e.g. {'eload': {'power_W': 'FETC:POW?'}}
+
+        Keyword Arguments:
+            period {float} -- time between replay steps (seconds) (default: {1.0})
+            interval {float} -- time between two polls of an instrument (seconds) (default: {0.25})
+            commanded {dict} -- (name, channel) -> setpoint of every step, in the units of the measurement (default: {None})
+            window {int} -- number of recent samples for the recent error statistics (default: {100})
+            guard {float} -- margin left before a command deadline (seconds) (default: {0.005})
+            log_prefix {string} -- write the samples of every instrument to <log_prefix>-telemetry-<name>.hil (default: {None})
+            clock {function} -- clock of the replay (default: {time.monotonic})
+            sleep {function} -- function used to wait (default: {time.sleep})
+        """
+
+        self.instruments = instruments
+        self.queries = {name: dict(q) for name, q in queries.items()}
+        self.period = float(period)
+        self.interval = interval
+        self.commanded = {} if commanded is None else commanded
+        self.window = window
+        self.guard = guard
+        self.log_prefix = log_prefix
+        self.clock = clock
+        self.sleep = sleep
+        self.locks = {name: threading.Lock() for name in instruments}
+        self.start_time = None
+        self.next_deadline = -n.inf
+        self.running = False
+        self.threads = []
+        self.n_samples = {name: 0 for name in self.queries}
+        self.n_errors = {name: 0 for name in self.queries}
+        self.last_error = {name: None for name in self.queries}
+        self.round_trip = {name: 0.0 for name in self.queries}
+        self.last = {}
+        self.stats = {}
+        for name, channels in self.queries.items():
+            for channel in channels:
+                if (name, channel) in self.commanded:
+                    self.stats[(name, channel)] = {'n': 0, 'sum': 0.0, 'sum2': 0.0, 'max': 0.0,
+                                                   'recent': deque(maxlen=window)}
+
+    def start(self, start_time):
+        '''
+        Start polling, called by ReplayScheduler.run
+
+        Arguments:
+            start_time {float} -- time of the deadline of step 0, on the clock
+        '''
+
+        self.start_time = start_time
+        self.next_deadline = start_time
+        self.running = True
+        self.threads = [threading.Thread(target=self._poll, args=(name,), daemon=True) for name in self.queries]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _poll(self, name):
+        channels = list(self.queries[name].keys())
+        message = ';:'.join(self.queries[name][channel].lstrip(':') for channel in channels)
+        writer = None
+        if self.log_prefix is not None:
+            writer = hilfile.HilWriter(self.log_prefix + '-telemetry-' + name + '.hil', ['step', 'step_time'] + channels,
+                                       dt=self.period, kind='telemetry', meta={'instrument': name, 'queries': self.queries[name]})
+        next_poll = self.clock()
+        try:
+            while self.running:
+                now = self.clock()
+                if now < next_poll:
+                    self.sleep(min(next_poll - now, self.guard))
+                    continue
+                if now + self.round_trip[name] + self.guard > self.next_deadline:
+                    # a command is due: wait until it has been sent (next_deadline moves on)
+                    self.sleep(max(self.next_deadline - now, 0.0) + self.guard)
+                    continue
+                with self.locks[name]:
+                    sent = self.clock()
+                    if sent + self.round_trip[name] + self.guard > self.next_deadline:
+                        # the command came closer while waiting for the lock
+                        continue
+                    try:
+                        values = self.instruments[name].query_ascii_values(message, separator=';')
+                        if len(values) != len(channels):
+                            raise ValueError("Expected %d values, got %d" % (len(channels), len(values)))
+                    except Exception as error:
+                        # a bad answer or a bus error loses this sample, not the rest of the run
+                        values = None
+                        self.n_errors[name] += 1
+                        if self.last_error[name] is None:
+                            print("Telemetry of %s failed: %r" % (name, error))
+                        self.last_error[name] = error
+                    received = self.clock()
+                next_poll = sent + self.interval
+                if values is None:
+                    continue
+                self.round_trip[name] = max(self.round_trip[name], received - sent)
+                self._add(name, channels, 0.5 * (sent + received) - self.start_time, values, writer)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _add(self, name, channels, t, values, writer):
+        step = int(n.floor(t / self.period))
+        self.n_samples[name] += 1
+        for channel, value in zip(channels, values):
+            self.last[(name, channel)] = value
+            if (name, channel) in self.stats and 0 <= step < len(self.commanded[(name, channel)]):
+                error = value - self.commanded[(name, channel)][step]
+                s = self.stats[(name, channel)]
+                s['n'] += 1
+                s['sum'] += error
+                s['sum2'] += error * error
+                s['max'] = max(s['max'], abs(error))
+                s['recent'].append(error)
+        if writer is not None:
+            writer.append([step, t - step * self.period] + list(values))
+            writer.flush()
+
+    def summary(self):
+        '''
+        Commanded vs measured statistics, can be called while the replay runs
+
+        Returns:
+            dict -- (name, channel) -> number of samples, mean, rms and largest absolute error over the run,
+                    and mean and rms error over the last window samples
+        '''
+
+        summary = {}
+        for key, s in self.stats.items():
+            recent = n.array(s['recent'])
+            summary[key] = {'n': s['n'],
+                            'mean': s['sum'] / s['n'] if s['n'] else 0.0,
+                            'rms': n.sqrt(s['sum2'] / s['n']) if s['n'] else 0.0,
+                            'max': s['max'],
+                            'recent_mean': float(n.mean(recent)) if len(recent) else 0.0,
+                            'recent_rms': float(n.sqrt(n.mean(recent ** 2))) if len(recent) else 0.0}
+        return summary
+
+    def report(self):
+        lines = ["%s: %d samples, %d failed, round-trip up to %.2f ms" % (
+            name, self.n_samples[name], self.n_errors[name], 1e3 * self.round_trip[name]) for name in self.queries]
+        lines += ["%s last error: %r" % (name, error) for name, error in self.last_error.items() if error is not None]
+        for (name, channel), s in self.summary().items():
+            lines.append("%s %s error: mean %.4g, rms %.4g, max %.4g, last %d samples mean %.4g, rms %.4g" % (
+                name, channel, s['mean'], s['rms'], s['max'], min(s['n'], self.window), s['recent_mean'], s['recent_rms']))
+        return '\n'.join(lines)
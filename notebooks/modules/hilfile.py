@@ -0,0 +1,313 @@
+import os
+import csv
+import glob
+import json
+import pickle
+import struct
+import numpy as n
+# dt is always in seconds
+
+MAGIC = b'HILDATA\x00'
+SCHEMA_VERSION = 1
+# the data starts at a multiple of ALIGN bytes, so it can be memory-mapped
+ALIGN = 64
+DTYPE = n.dtype('<f4')
+UNITS = {'load_power_mW': 'mW', 'supply_current_mA': 'mA'}
+
+
+def _json_default(value):
+    # numpy values in the loads or the metadata
+    if isinstance(value, n.ndarray):
+        return value.tolist()
+    if isinstance(value, n.generic):
+        return value.item()
+    raise TypeError("Cannot store %s in the header" % type(value))
+
+
+def _header_bytes(header):
+    text = json.dumps(header, default=_json_default).encode()
+    size = len(MAGIC) + 4 + len(text)
+    text += b' ' * (-size % ALIGN)
+    return MAGIC + struct.pack('<I', len(text)) + text
+
+
+def _upgrade_header(header):
+    # older schema versions are upgraded here, when there are some
+    if header.get('schema', 0) > SCHEMA_VERSION:
+        raise ValueError("File has schema version %s, this code reads up to %d" % (header.get('schema'), SCHEMA_VERSION))
+    return header
+
+
+class HilWriter():
+    def __init__(self, path, columns, dt=1.0, units=None, loads=None, kind='log', meta=None):
+        """
+        Write a file of float32 columns, one row at a time, e.g. the log of a bench test while it runs.
+        The header (schema version, dt, column names and units, load definitions and metadata) is written first,
+        and every row is appended as it comes, so the file can be read (with HilFile) while it is written or
+        after a crash: a row that was only partly written is ignored.
+
+        Arguments:
+            path {string} -- path of the file
+            columns {list} -- names of the columns
+
+        Keyword Arguments:
+            dt {float} -- time between two rows (seconds) (default: {1.0})
+            units {dict} -- unit of each column, UNITS are used for the others (default: {None})
+            loads {list} -- load dictionaries of the test, see loadprofile.load_profile (default: {None})
+            kind {string} -- 'profile' for the profile of a test, 'log' for what happened during a test (default: {'log'})
+            meta {dict} -- anything else to keep in the header, e.g. the replay scaling (default: {None})
+        """
+
+        units = {} if units is None else units
+        self.path = path
+        self.columns = list(columns)
+        self.header = {'schema': SCHEMA_VERSION, 'kind': kind, 'dt': float(dt), 'columns': self.columns,
+                       'units': [units.get(name, UNITS.get(name, '')) for name in self.columns],
+                       'loads': [] if loads is None else list(loads), 'meta': {} if meta is None else dict(meta)}
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(_header_bytes(self.header))
+        self.file.flush()
+
+    def append(self, row):
+        '''
+        Add a row
+
+        Arguments:
+            row {list} -- one value per column
+        '''
+
+        assert len(row) == len(self.columns), "Expected %d values, got %d" % (len(self.columns), len(row))
+        self.file.write(n.asarray(row, DTYPE).tobytes())
+        self.rows += 1
+
+    def extend(self, rows):
+        '''
+        Add several rows
+
+        Arguments:
+            rows {np.array} -- array of shape (rows, columns)
+        '''
+
+        rows = n.asarray(rows, DTYPE).reshape(-1, len(self.columns))
+        self.file.write(n.ascontiguousarray(rows).tobytes())
+        self.rows += len(rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write(path, columns, dt=1.0, units=None, loads=None, kind='profile', meta=None):
+    """
+    Write a whole file at once, e.g. the profile of a test. The file is written next to path and then moved
+    over it, so a file that is being read is never left half-written.
+
+    Arguments:
+        path {string} -- path of the file
+        columns {dict} -- arrays of the same length, by column name
+
+    Keyword Arguments:
+        see HilWriter (kind defaults to 'profile')
+    """
+
+    names = list(columns.keys())
+    data = n.column_stack([n.asarray(columns[name], DTYPE) for name in names]) if names else n.zeros((0, 0), DTYPE)
+    with HilWriter(path + '.tmp', names, dt, units, loads, kind, meta) as writer:
+        writer.extend(data)
+    os.replace(path + '.tmp', path)
+
+
+class HilFile():
+    def __init__(self, path, mmap=True):
+        """
+        Read a file written by HilWriter or write. The columns are memory-mapped, so opening a profile of
+        several days takes no time and only the rows that are used are read from the disk.
+
+        Arguments:
+            path {string} -- path of the file
+
+        Keyword Arguments:
+            mmap {bool} -- memory-map the data, or read it all (default: {True})
+        """
+
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not a HIL data file" % path)
+            size = struct.unpack('<I', f.read(4))[0]
+            self.header = _upgrade_header(json.loads(f.read(size).decode()))
+        self.offset = len(MAGIC) + 4 + size
+        self.columns = self.header['columns']
+        self.units = dict(zip(self.columns, self.header['units']))
+        self.dt = self.header['dt']
+        self.kind = self.header['kind']
+        self.loads = self.header['loads']
+        self.meta = self.header['meta']
+
+        row_size = DTYPE.itemsize * max(len(self.columns), 1)
+        rows = (os.path.getsize(path) - self.offset) // row_size
+        if rows == 0 or len(self.columns) == 0:
+            self.data = n.zeros((0, len(self.columns)), DTYPE)
+        elif mmap:
+            self.data = n.memmap(path, DTYPE, 'r', self.offset, (rows, len(self.columns)))
+        else:
+            with open(path, 'rb') as f:
+                f.seek(self.offset)
+                self.data = n.fromfile(f, DTYPE, rows * len(self.columns)).reshape(rows, len(self.columns))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def keys(self):
+        return list(self.columns)
+
+    def __getitem__(self, name):
+        return self.data[:, self.columns.index(name)]
+
+    def column(self, name, rows=None):
+        return self[name] if rows is None else self[name][rows]
+
+    def time(self):
+        return n.arange(len(self)) * self.dt
+
+    def window(self, t_start, t_stop):
+        '''
+        Rows between two times, still memory-mapped
+
+        Arguments:
+            t_start {float} -- first time (seconds)
+            t_stop {float} -- last time, excluded (seconds)
+
+        Returns:
+            dict -- columns by name
+        '''
+
+        rows = slice(int(n.ceil(t_start / self.dt)), int(n.ceil(t_stop / self.dt)))
+        return {name: self.column(name, rows) for name in self.columns}
+
+    def as_dict(self):
+        return {name: n.array(self[name], n.float64) for name in self.columns}
+
+
+def save_profile(path, sim_time, loads, load_power_mW, supply_current_mA, dt=1.0, meta=None):
+    """
+    Save the profile of a test, what integrated_test.py used to pickle in -config.pickle
+
+    Arguments:
+        path {string} -- path of the file
+        sim_time {int} -- length of the test (seconds)
+        loads {list} -- load dictionaries
+        load_power_mW {np.array} -- load power at every step (mW)
+        supply_current_mA {np.array} -- supply current at every step (mA)
+
+    Keyword Arguments:
+        dt {float} -- time step of the profile (seconds) (default: {1.0})
+        meta {dict} -- anything else to keep, e.g. {'replay_scaling': scaling} (default: {None})
+    """
+
+    meta = {} if meta is None else dict(meta)
+    meta['sim_time'] = int(sim_time)
+    write(path, {'load_power_mW': load_power_mW, 'supply_current_mA': supply_current_mA}, dt, loads=loads,
+          kind='profile', meta=meta)
+
+
+def read_profile(path):
+    """
+    Read the profile of a test, saved with save_profile or as an old -config pickle
+
+    Arguments:
+        path {string} -- path of the file
+
+    Returns:
+        dict -- 'loads', 'sim_time', 'load_power_mW', 'supply_current_mA' (and the other keys of the metadata)
+    """
+
+    with open(path, 'rb') as f:
+        is_hil = f.read(len(MAGIC)) == MAGIC
+    if not is_hil:
+        return _read_pickle_config(path)
+    profile = HilFile(path)
+    config = dict(profile.meta)
+    config.update({'loads': profile.loads, 'sim_time': config.get('sim_time', len(profile)),
+                   'load_power_mW': profile['load_power_mW'], 'supply_current_mA': profile['supply_current_mA']})
+    return config
+
+
+def _read_pickle_config(path):
+    # the first logs only pickled the list of loads
+    with open(path, 'rb') as f:
+        config = pickle.load(f)
+    if isinstance(config, list):
+        config = {'loads': config}
+    return config
+
+
+def _read_csv_data(path):
+    with open(path, 'r') as f:
+        return n.array([[float(v) for v in row] for row in csv.reader(f) if row], n.float64).reshape(-1, 2)
+
+
+def upgrade_logs(directory='logs', verbose=True):
+    """
+    Convert the logs of integrated_test.py written before HIL data files: every <prefix>-config(.pickle) becomes
+    <prefix>-profile.hil and every <prefix>-data(.csv) becomes <prefix>-data.hil, with the loads of the config in
+    its header. The old files are kept, and tests that were already converted are skipped.
+
+    Keyword Arguments:
+        directory {string} -- folder of the logs (default: {'logs'})
+        verbose {bool} -- print what is converted (default: {True})
+
+    Returns:
+        list -- paths of the files written
+    """
+
+    written = []
+    prefixes = set()
+    for path in glob.glob(os.path.join(directory, '*')):
+        for suffix in ('-config.pickle', '-config', '-data.csv', '-data'):
+            if path.endswith(suffix):
+                prefixes.add(path[:-len(suffix)])
+                break
+
+    for prefix in sorted(prefixes):
+        config = None
+        for path in (prefix + '-config.pickle', prefix + '-config'):
+            if os.path.isfile(path):
+                config = _read_pickle_config(path)
+                break
+        loads = [] if config is None else config.get('loads', [])
+
+        if config is not None and not os.path.isfile(prefix + '-profile.hil'):
+            if 'load_power_mW' in config:
+                meta = {k: v for k, v in config.items() if k not in ('loads', 'load_power_mW', 'supply_current_mA')}
+                save_profile(prefix + '-profile.hil', config.get('sim_time', len(config['load_power_mW'])), loads,
+                             config['load_power_mW'], config['supply_current_mA'], meta=meta)
+            else:
+                # only the loads were saved
+                write(prefix + '-profile.hil', {'load_power_mW': [], 'supply_current_mA': []}, loads=loads)
+            written.append(prefix + '-profile.hil')
+
+        for path in (prefix + '-data.csv', prefix + '-data'):
+            if os.path.isfile(path) and not os.path.isfile(prefix + '-data.hil'):
+                data = _read_csv_data(path)
+                write(prefix + '-data.hil', {'load_power_mW': data[:, 0], 'supply_current_mA': data[:, 1]},
+                      loads=loads, kind='log', meta={'source': os.path.basename(path)})
+                written.append(prefix + '-data.hil')
+                break
+
+    if verbose:
+        for path in written:
+            print("Wrote %s" % path)
+    return written
@@ -0,0 +1,255 @@
+import csv
+import json
+import numpy as n
+# profiles have one value per second of the test, powers are in mW and currents in mA
+
+
+def constant(sim_time, value):
+    """
+    Profile that stays at value for the whole test
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        value {float} -- value of the profile
+
+    Returns:
+        np.array -- the profile
+    """
+
+    return n.full(int(sim_time), float(value))
+
+
+def periodic(sim_time, value, period_s, length_s, offset_s=0):
+    """
+    Profile at value for length_s at the start of every period_s, and 0 otherwise
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        value {float} -- value when on
+        period_s {float} -- time between the starts of two pulses (seconds)
+        length_s {float} -- length of a pulse (seconds)
+
+    Keyword Arguments:
+        offset_s {float} -- time of the start of the first pulse (seconds) (default: {0})
+
+    Returns:
+        np.array -- the profile
+    """
+
+    t = n.arange(int(sim_time))
+    return n.where((t - offset_s) % period_s < length_s, float(value), 0.0)
+
+
+def one_shot(sim_time, value, onset_s, length_s):
+    """
+    Profile at value between onset_s and onset_s + length_s (both excluded), and 0 otherwise
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        value {float} -- value when on
+        onset_s {float} -- start of the pulse (seconds)
+        length_s {float} -- length of the pulse (seconds)
+
+    Returns:
+        np.array -- the profile
+    """
+
+    t = n.arange(int(sim_time))
+    return n.where((t > onset_s) & (t < onset_s + length_s), float(value), 0.0)
+
+
+def phases(sim_time, periods):
+    """
+    Piecewise constant profile, e.g. sunlight and eclipse currents. The last period is stretched to the end of the
+    test, or the periods are cut at the end of the test.
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        periods {list} -- (length (seconds), value) of every period, in order
+
+    Returns:
+        np.array -- the profile
+    """
+
+    if len(periods) == 0:
+        raise ValueError("At least one period is needed")
+    lengths = n.array([int(p[0]) for p in periods])
+    values = n.array([float(p[1]) for p in periods])
+    lengths[-1] = max(int(sim_time) - n.sum(lengths[:-1]), 0)
+    return n.repeat(values, lengths)[:int(sim_time)]
+
+
+def from_file(sim_time, path, column=0):
+    """
+    Profile read from a csv file with a header row and one row per second, e.g. simulation_currents.csv.
+    It is cut to sim_time, or padded with 0 if the file is too short.
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds), the length of the file if None
+        path {string} -- path of the file
+
+    Keyword Arguments:
+        column {int} -- column to read (default: {0})
+
+    Returns:
+        np.array -- the profile
+    """
+
+    with open(path, 'r') as f:
+        values = n.array([float(row[column]) for row in list(csv.reader(f))[1:]])
+    if sim_time is None:
+        return values
+    return n.concatenate([values[:int(sim_time)], n.zeros(max(int(sim_time) - len(values), 0))])
+
+
+def from_trackers(sim_time, trackers, column, dt=1.0, scale=1.0):
+    """
+    Profile taken from the trackers of a Satellite run, e.g. 'power_out' for the load power, or
+    'max_solar_current_in_mA' for the solar current. The run is averaged or repeated onto 1 s steps.
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        trackers {tracker.StateTracker} -- trackers of the run (or a tracker.TrackerFile)
+        column {string} -- name of the column, e.g. 'power_out' or 'loads/Beacon/1'
+
+    Keyword Arguments:
+        dt {float} -- time step of the run (seconds) (default: {1.0})
+        scale {float} -- factor applied to the values, e.g. to change units (default: {1.0})
+
+    Returns:
+        np.array -- the profile, the run is repeated if it is shorter than the test
+    """
+
+    values = n.asarray(trackers.column(column), n.float64) * scale
+    # mean over every second: the cumulative integral at whole seconds
+    t = n.arange(len(values) + 1) * dt
+    integral = n.concatenate([[0.0], n.cumsum(values) * dt])
+    seconds = n.arange(int(t[-1]) + 1)
+    per_second = n.diff(n.interp(seconds, t, integral))
+    return n.resize(per_second, int(sim_time))
+
+
+def from_satellite(sim_time, config, area_file, column, scale=1.0, t_orbit=92 * 60):
+    """
+    Run the Satellite model (with fused.run_fused) for the length of the test and take a profile from it
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        config {dict} -- 'timings', 'eps', 'temperatures', 'setpoints' and 'structure_constants', e.g. sweep_config.json
+        area_file {string} -- STK area export
+        column {string} -- column of the trackers (see from_trackers)
+
+    Keyword Arguments:
+        scale {float} -- factor applied to the values (default: {1.0})
+        t_orbit {float} -- length of the orbit (seconds) (default: {92*60})
+
+    Returns:
+        np.array -- the profile
+    """
+
+    from modules import fused, orbit, satellite
+    sat = satellite.Satellite(config['timings'], config['eps'], config['temperatures'], config['setpoints'],
+                              config['structure_constants'])
+    profile = orbit.OrbitProfile.from_file(area_file, 1.0, t_orbit)
+    fused.run_fused(sat, profile, int(sim_time))
+    return from_trackers(sim_time, sat.trackers, column, 1.0, scale)
+
+
+def load_profile(load, sim_time):
+    """
+    Profile of one load, in mW. Loads are the dictionaries of integrated_test.py, with a 'type':
+        'constant': on for the whole test
+        'periodic': on for 'length_s' every 'period_s', from 'offset_s'
+        'one_shot': on between 'onset_s' and 'onset_s' + 'length_s'
+        'phases': 'phases' is a list of (length (s), power (mW))
+        'file': column 'column' of the csv file 'path', in mW
+        'satellite': column 'column' (default 'power_out') of a run of the Satellite model with the
+                     configuration file 'config' and the area file 'area_file'
+    Loads without a type use the 'constant' and 'periodic' flags like integrated_test.py always did,
+    and are one-shots if neither is set. Loads with 'enabled' False give 0.
+
+    Arguments:
+        load {dict} -- the load
+        sim_time {int} -- length of the test (seconds)
+
+    Returns:
+        np.array -- power of the load at every second (mW)
+    """
+
+    if not load.get('enabled', True):
+        return n.zeros(int(sim_time))
+    kind = load.get('type')
+    if kind is None:
+        kind = 'constant' if load.get('constant') else 'periodic' if load.get('periodic') else 'one_shot'
+    power = load.get('i', 0) * load.get('v', 0)
+
+    if kind == 'constant':
+        return constant(sim_time, power)
+    if kind == 'periodic':
+        return periodic(sim_time, power, load['period_s'], load['length_s'], load.get('offset_s', 0))
+    if kind == 'one_shot':
+        return one_shot(sim_time, power, load['onset_s'], load['length_s'])
+    if kind == 'phases':
+        return phases(sim_time, load['phases'])
+    if kind == 'file':
+        return from_file(sim_time, load['path'], load.get('column', 0))
+    if kind == 'satellite':
+        with open(load['config'], 'r') as f:
+            config = json.load(f)
+        return from_satellite(sim_time, config, load['area_file'], load.get('column', 'power_out'),
+                              load.get('scale', 1.0))
+    raise ValueError("Unknown load type: %s" % kind)
+
+
+def compose(sim_time, loads):
+    """
+    Total power of a list of loads
+
+    Arguments:
+        sim_time {int} -- length of the test (seconds)
+        loads {list} -- load dictionaries (see load_profile)
+
+    Returns:
+        np.array -- total power at every second (mW)
+    """
+
+    total = n.zeros(int(sim_time))
+    for load in loads:
+        total += load_profile(load, sim_time)
+    return total
+
+
+def build_profile(config):
+    """
+    Supply current and load power profiles of a test, from a declarative configuration, for example:
+        {"sim_time": 16560,
+         "supply": {"type": "phases", "phases": [[3312, 0], [2208, 2000]]},
+         "loads": [{"name": "beacon", "type": "periodic", "v": 5.0, "i": 1000, "period_s": 120, "length_s": 10},
+                   {"name": "bus", "type": "constant", "v": 3.3, "i": 200}]}
+    The supply takes the same types as the loads (see load_profile), with the value in 'value' (mA) for
+    'constant', 'periodic' and 'one_shot'. sim_time can be left out if the supply is read from a file.
+
+    Arguments:
+        config {dict} -- the configuration, or the path of a .json file holding it
+
+    Returns:
+        dict -- 'sim_time', 'loads', 'supply_current_mA' and 'load_power_mW'
+    """
+
+    if not isinstance(config, dict):
+        with open(config, 'r') as f:
+            config = json.load(f)
+
+    supply = dict(config['supply'])
+    sim_time = config.get('sim_time')
+    if sim_time is None:
+        if supply.get('type') != 'file':
+            raise ValueError("sim_time is needed unless the supply is read from a file")
+        sim_time = len(from_file(None, supply['path'], supply.get('column', 0)))
+    # the supply is a 'load' of value mA, with the same types
+    supply.setdefault('v', 1.0)
+    supply.setdefault('i', supply.get('value', 0.0))
+    loads = [dict(load) for load in config.get('loads', [])]
+    return {'sim_time': int(sim_time), 'loads': loads,
+            'supply_current_mA': load_profile(supply, sim_time),
+            'load_power_mW': compose(sim_time, loads)}
@@ -0,0 +1,295 @@
+import copy
+import numpy as n
+from modules import fused, satellite, schedule
+# dt is always in seconds
+
+day = 24 * 60 * 60
+
+
+def read_beta_table(path, sheet=None):
+    """
+    Read the daily beta angles and eclipse fractions of an orbit from one of the STK workbooks
+    (e.g. sources/July19_July20SSO.xlsx), laid out like in Mission Simulator.ipynb: one row per day from row 2,
+    with the day in column D, the beta angle in E and the eclipse fraction in G.
+
+    Arguments:
+        path {string} -- path to the .xlsx workbook
+
+    Keyword Arguments:
+        sheet {string} -- name of the sheet, the first sheet if None (default: {None})
+
+    Returns:
+        dict -- 'day', 'beta' (degrees) and 'eclipse_frac' arrays, one entry per day
+    """
+
+    # openpyxl is only needed for this function
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, data_only=True)
+    sh = wb[sheet] if sheet is not None else wb.worksheets[0]
+    days, betas, eclipses = [], [], []
+    row = 2
+    while sh['D' + str(row)].value is not None:
+        days.append(sh['D' + str(row)].value)
+        betas.append(sh['E' + str(row)].value)
+        eclipses.append(sh['G' + str(row)].value)
+        row += 1
+    return {'day': n.array(days), 'beta': n.array(betas, n.float64), 'eclipse_frac': n.array(eclipses, n.float64)}
+
+
+class LongMission():
+    def __init__(self, config, profile, table, bin_width=5.0, charge_levels=(0.0, 0.25, 0.5, 0.75, 1.0), temp_step=1.0,
+                 dt=1.0):
+        """
+        Mission-length simulation (hundreds of days) built from single-orbit runs of the 1 s Satellite model.
+
+        Days are binned by beta angle, and every bin is simulated with the sun areas of profile squeezed to the
+        mean eclipse fraction of its days (OrbitProfile.with_eclipse). For a bin, the experiment state and a starting
+        temperature (rounded to temp_step), one orbit of the full model gives:
+            - the change of charge over the orbit, at a few battery charge levels
+            - the temperatures at the end of the orbit, and how they change with the starting temperatures
+              (finite differences), so that nearby starting temperatures can be extrapolated linearly
+            - the temperature range over the orbit
+        These orbit responses are cached, so each one is simulated once, and the mission is chained from them
+        one orbit at a time (charge and temperatures carry over), and reported daily.
+        The structure takes days to settle, so the temperatures have to be chained like the charge.
+
+        Use error_estimate to compare against the full model over a few days.
+
+        Arguments:
+            config {dict} -- 'timings', 'eps', 'temperatures', 'setpoints' and 'structure_constants' dictionaries
+            profile {orbit.OrbitProfile} -- sun areas over one orbit
+            table {dict} -- daily 'beta' and 'eclipse_frac' arrays, from read_beta_table
+
+        Keyword Arguments:
+            bin_width {float} -- width of the beta angle bins (degrees) (default: {5.0})
+            charge_levels {tuple} -- charge fractions the change of charge is measured at (default: {(0.0, 0.25, 0.5, 0.75, 1.0)})
+            temp_step {float} -- spacing of the starting temperatures the orbits are simulated from (K) (default: {1.0})
+            dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        """
+
+        self.config = copy.deepcopy(config)
+        self.profile = profile.resample(dt) if profile.dt != dt else profile
+        self.table = table
+        self.bin_width = float(bin_width)
+        self.charge_levels = n.array(charge_levels, n.float64)
+        self.temp_step = float(temp_step)
+        self.dt = float(dt)
+        self.orbits_per_day = day / self.profile.t_orbit
+        self.capacity = float(self.config['eps']['battery_capacity_mAh'])
+        self.nodes = list(self.config['temperatures'].keys())
+
+        self.bins = n.floor(n.abs(table['beta']) / self.bin_width).astype(int)
+        # every day of a bin is simulated with the mean eclipse fraction of the bin
+        self.bin_eclipse = {b: float(n.mean(table['eclipse_frac'][self.bins == b])) for b in n.unique(self.bins)}
+        self.profiles = {}
+        self.responses = {}
+
+    def exp_on(self, d):
+        '''
+        Whether the experiment runs during day d (at the middle of the day)
+        '''
+
+        t = (d + 0.5) * day
+        timings = self.config['timings']
+        return bool(timings['exp_start_time'] < t < timings['exp_start_time'] + timings['exp_duration'])
+
+    def _timings(self, exp):
+        timings = dict(self.config['timings'])
+        if exp is not None:
+            # keep the experiment on (or off) for the whole run
+            timings['exp_start_time'] = -1.0 if exp else 0.0
+            timings['exp_duration'] = 2.0 * day if exp else 0.0
+        return timings
+
+    def _satellite(self, charge_frac, temperatures, exp, capacity_scale=1.0):
+        config = copy.deepcopy(self.config)
+        config['eps']['starting_charge_frac'] = charge_frac
+        config['eps']['battery_capacity_mAh'] = self.capacity * capacity_scale
+        return satellite.Satellite(self._timings(exp), config['eps'], dict(zip(self.nodes, temperatures)),
+                                   config['setpoints'], config['structure_constants'])
+
+    def _orbit(self, b, exp, charge_frac, temperatures):
+        # one orbit of the full model. A much bigger battery keeps the charge fraction (and so the battery voltage)
+        # at charge_frac for the whole orbit and never fills up or dies: the clipping is done when chaining.
+        # An empty or full battery is started one real capacity away from the ends, so that it does not die or shunt either.
+        # Returns the satellite and the change of charge over the orbit.
+        if b not in self.profiles:
+            self.profiles[b] = self.profile.with_eclipse(self.bin_eclipse[b])
+        scale = 1000.0
+        sat = self._satellite(min(max(charge_frac, 1.0 / scale), 1.0 - 1.0 / scale), temperatures, exp, capacity_scale=scale)
+        start = sat.charge
+        # The passovers do not line up with the orbits: shift the schedule by half a passover interval, so that
+        # the orbit does not catch a passover at both ends (as it would starting at t = 0)
+        points = len(self.profiles[b])
+        shifted = schedule.compile_schedule(self._timings(exp), points, self.dt, 0.5 * sat.passover_interval)
+        sched = schedule.LoadSchedule(n.arange(points) * self.dt, self.dt, shifted.states, shifted.timings)
+        fused.run_fused(sat, self.profiles[b], points, self.dt, sched=sched)
+        return sat, sat.charge - start
+
+    def orbit_response(self, b, exp, temperatures):
+        '''
+        Simulate (or get from the cache) one orbit of beta bin b, starting from temperatures rounded to temp_step
+
+        Arguments:
+            b {int} -- beta angle bin
+            exp {bool} -- experiment state
+            temperatures {np.array} -- starting temperature of each node (in the order of config['temperatures'])
+
+        Returns:
+            dict -- 'T0': starting temperatures the orbit was simulated from, 'T_end': temperatures at the end of the orbit,
+                    'jacobian': derivative of T_end with respect to T0,
+                    'dcharge': change of charge over the orbit (mAh) at each of charge_levels, before clipping to the capacity,
+                    'T_min'/'T_mean'/'T_max': temperatures over the orbit, relative to T0,
+                    'energy_in'/'energy_out': energy into/out of the battery over the orbit (Wh)
+        '''
+
+        cell = tuple(int(k) for k in n.round(n.asarray(temperatures) / self.temp_step))
+        key = (b, bool(exp), cell)
+        if key in self.responses:
+            return self.responses[key]
+
+        T0 = n.array(cell, n.float64) * self.temp_step
+        middle = self.charge_levels[len(self.charge_levels) // 2]
+        dcharge = []
+        for level in self.charge_levels:
+            sat, change = self._orbit(b, exp, level, T0)
+            dcharge.append(change)
+            if level == middle:
+                # temperatures and energies are measured at the middle charge level
+                temps = sat.trackers['temperatures']
+                response = {
+                    'T0': T0,
+                    'T_end': n.array([sat.temperatures[node] for node in self.nodes]),
+                    'T_min': n.array([temps[node].min() for node in self.nodes]) - T0,
+                    'T_mean': n.array([temps[node].mean() for node in self.nodes]) - T0,
+                    'T_max': n.array([temps[node].max() for node in self.nodes]) - T0,
+                    'energy_in': sat.trackers['power_in'].sum() * self.dt / 3600.0 / 1000.0,
+                    'energy_out': sat.trackers['power_out'].sum() * self.dt / 3600.0 / 1000.0,
+                }
+        response['dcharge'] = n.array(dcharge)
+
+        # finite differences of the end temperatures, half a cell away
+        delta = 0.5 * self.temp_step
+        jacobian = n.zeros((len(self.nodes), len(self.nodes)))
+        for j in range(len(self.nodes)):
+            sat, _ = self._orbit(b, exp, middle, T0 + delta * n.eye(len(self.nodes))[j])
+            jacobian[:, j] = (n.array([sat.temperatures[node] for node in self.nodes]) - response['T_end']) / delta
+        response['jacobian'] = jacobian
+
+        self.responses[key] = response
+        return response
+
+    def run(self, first_day=0, n_days=None, start_charge=None, start_temperatures=None):
+        '''
+        Chain the orbit responses over the mission, one orbit at a time
+
+        Keyword Arguments:
+            first_day {int} -- index of the first day in the table (default: {0})
+            n_days {int} -- number of days, until the end of the table if None (default: {None})
+            start_charge {float} -- charge at the start (mAh), from the eps starting_charge_frac if None (default: {None})
+            start_temperatures {dict} -- temperatures at the start, the configured ones if None (default: {None})
+
+        Returns:
+            dict -- arrays with one entry per day: 'day', 'beta', 'eclipse_frac', 'bin', 'exp',
+                    'charge' (mAh, at the end of the day), 'energy_in'/'energy_out' (Wh),
+                    and for every node '<node>_min'/'<node>_mean'/'<node>_max' over the day and '<node>_end' (K)
+        '''
+
+        n_days = len(self.table['beta']) - first_day if n_days is None else n_days
+        charge = self.capacity * self.config['eps']['starting_charge_frac'] if start_charge is None else start_charge
+        temperatures = self.config['temperatures'] if start_temperatures is None else start_temperatures
+        T = n.array([temperatures[node] for node in self.nodes], n.float64)
+
+        days = n.arange(first_day, first_day + n_days)
+        result = {'day': days, 'beta': self.table['beta'][days], 'eclipse_frac': self.table['eclipse_frac'][days],
+                  'bin': self.bins[days], 'exp': n.array([self.exp_on(d) for d in days]),
+                  'charge': n.zeros(n_days), 'energy_in': n.zeros(n_days), 'energy_out': n.zeros(n_days)}
+        for node in self.nodes:
+            for stat in ('min', 'mean', 'max', 'end'):
+                result[node + '_' + stat] = n.zeros(n_days)
+
+        for k, d in enumerate(days):
+            T_min = n.full(len(self.nodes), n.inf)
+            T_max = n.full(len(self.nodes), -n.inf)
+            T_sum = n.zeros(len(self.nodes))
+            orbits = self.orbits_per_day
+            while orbits > 0:
+                # the last orbit of the day is partial
+                step = min(orbits, 1.0)
+                response = self.orbit_response(self.bins[d], result['exp'][k], T)
+                dcharge = n.interp(charge / self.capacity, self.charge_levels, response['dcharge'])
+                charge = min(max(charge + step * dcharge, 0.0), self.capacity)
+                T_min = n.minimum(T_min, T + response['T_min'])
+                T_max = n.maximum(T_max, T + response['T_max'])
+                T_sum += step * (T + response['T_mean'])
+                result['energy_in'][k] += step * response['energy_in']
+                result['energy_out'][k] += step * response['energy_out']
+                T_end = response['T_end'] + response['jacobian'].dot(T - response['T0'])
+                T = T + step * (T_end - T)
+                orbits -= step
+
+            result['charge'][k] = charge
+            for j, node in enumerate(self.nodes):
+                result[node + '_min'][k] = T_min[j]
+                result[node + '_mean'][k] = T_sum[j] / self.orbits_per_day
+                result[node + '_max'][k] = T_max[j]
+                result[node + '_end'][k] = T[j]
+        return result
+
+    def reference(self, first_day, n_days, start_charge, start_temperatures):
+        '''
+        Run the full 1 s model over a few days, with the exact eclipse fraction of every day
+
+        Arguments:
+            first_day {int} -- index of the first day in the table
+            n_days {int} -- number of days
+            start_charge {float} -- charge at the start of the first day (mAh)
+            start_temperatures {dict} -- temperatures at the start of the first day
+
+        Returns:
+            satellite.Satellite -- the simulated satellite, with its trackers
+        '''
+
+        T = [start_temperatures[node] for node in self.nodes]
+        sat = self._satellite(start_charge / self.capacity, T, None)
+        points = int(round(day / self.dt))
+        timings = self.config['timings']
+        for d in range(first_day, first_day + n_days):
+            profile = self.profile.with_eclipse(self.table['eclipse_frac'][d])
+            sched = schedule.compile_schedule(timings, points, self.dt, d * day)
+            fused.run_fused(sat, profile, points, self.dt, d * day, sched)
+        return sat
+
+    def error_estimate(self, result, first_day=None, n_days=3):
+        '''
+        Compare a result of run against the full model over a window of days, starting from the state of the result
+
+        Arguments:
+            result {dict} -- output of run
+
+        Keyword Arguments:
+            first_day {int} -- first day of the window, the second day of the result if None (default: {None})
+            n_days {int} -- length of the window (days) (default: {3})
+
+        Returns:
+            dict -- largest absolute error over the window of the end-of-day charge (mAh),
+                    and of the daily min, max and end temperature of every node (K)
+        '''
+
+        days = list(result['day'])
+        first_day = days[1] if first_day is None else first_day
+        k = days.index(first_day)
+        assert k > 0 and k + n_days <= len(days), "The window has to start after the first day of the result"
+        start = {node: result[node + '_end'][k - 1] for node in self.nodes}
+        sat = self.reference(first_day, n_days, result['charge'][k - 1], start)
+
+        points = int(round(day / self.dt))
+        charge = sat.trackers['batt_charge'].reshape(n_days, points)
+        errors = {'charge': n.abs(charge[:, -1] - result['charge'][k:k + n_days]).max()}
+        temps = sat.trackers['temperatures']
+        for node in self.nodes:
+            daily = temps[node].reshape(n_days, points)
+            for stat, values in (('min', daily.min(axis=1)), ('max', daily.max(axis=1)), ('end', daily[:, -1])):
+                errors[node + '_' + stat] = n.abs(values - result[node + '_' + stat][k:k + n_days]).max()
+        return errors
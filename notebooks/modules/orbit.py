@@ -0,0 +1,182 @@
+import numpy as n
+from modules import fileio
+# dt is always in seconds
+
+
+def periodic_resample(times, values, t_orbit, dt):
+    """
+    Linearly interpolate samples of one orbit onto a regular grid of step dt.
+    The orbit wraps around, so the end of the grid interpolates towards the first sample.
+    Samples after t_orbit are dropped, and if the samples stop before t_orbit the rest of the orbit is 0,
+    which is how read_areas_from_file pads short files.
+
+    Arguments:
+        times {np.array} -- sample times (seconds), increasing
+        values {np.array} -- samples, the last axis is time
+        t_orbit {float} -- length of the orbit (seconds)
+        dt {float} -- step of the new grid (seconds)
+
+    Returns:
+        tuple -- (grid times, resampled values)
+    """
+
+    times = n.asarray(times, n.float64) - times[0]
+    values = n.asarray(values, n.float64)
+    spacing = n.median(n.diff(times))
+    keep = times < t_orbit
+    times, values = times[keep], values[..., keep]
+    # zero padding between the last sample and the end of the orbit
+    pad = [t for t in (times[-1] + spacing, t_orbit - spacing) if times[-1] < t < t_orbit]
+    if pad:
+        times = n.concatenate([times, pad])
+        values = n.concatenate([values, n.zeros(values.shape[:-1] + (len(pad),))], axis=-1)
+
+    grid = n.arange(int(round(t_orbit / dt))) * dt
+    flat = values.reshape(-1, values.shape[-1])
+    resampled = n.array([n.interp(grid, times, v, period=t_orbit) for v in flat])
+    return grid, resampled.reshape(values.shape[:-1] + grid.shape)
+
+
+class OrbitProfile():
+    def __init__(self, times, faces, t_orbit, dt=1.0, panels=None, paycap='negZ'):
+        """
+        Sun-facing areas of every face over one orbit, on a regular time grid of step dt.
+        Stores the per-face, total, solar panel and payload cap areas once, so the simulation loop
+        only has to look them up, for any time t (the orbit repeats).
+
+        Use OrbitProfile.from_file to read an STK export, and resample to change dt.
+
+        Arguments:
+            times {np.array} -- times of the samples of faces (seconds), do not need to be spaced by dt
+            faces {dict} -- face name -> area samples (m^2)
+            t_orbit {float} -- length of the orbit (seconds)
+
+        Keyword Arguments:
+            dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+            panels {list} -- faces covered in solar panels, the first four faces if None (default: {None})
+            paycap {string} -- face of the payload cap (default: {'negZ'})
+        """
+
+        self.source_times = n.asarray(times, n.float64)
+        self.source_faces = faces
+        self.headers = list(faces.keys())
+        self.panels = self.headers[:4] if panels is None else list(panels)
+        self.paycap_face = paycap
+        self.t_orbit = float(t_orbit)
+        self.dt = float(dt)
+
+        self.t, values = periodic_resample(self.source_times, [faces[h] for h in self.headers], self.t_orbit, self.dt)
+        self.faces = dict(zip(self.headers, values))
+        self.total = values.sum(axis=0)
+        self.panel = sum(self.faces[h] for h in self.panels)
+        self.paycap = self.faces[paycap]
+
+    @classmethod
+    def from_file(cls, path, dt=1.0, t_orbit=92 * 60, headers=['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ'], panels=None, paycap='negZ', cache=True):
+        '''
+        Read an STK area export, using its time column to place the samples.
+
+        Arguments:
+            path {string} -- Absolute path to source csv file
+
+        Keyword Arguments:
+            dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+            t_orbit {float} -- length of the orbit (seconds) (default: {92*60})
+            headers {list} -- The names of the headers for each face (default: {['plusX', 'plusY', 'negX', 'negY', 'plusZ', 'negZ']})
+            panels {list} -- faces covered in solar panels, the first four headers if None (default: {None})
+            paycap {string} -- face of the payload cap (default: {'negZ'})
+            cache {bool} -- use the area cache of fileio.read_areas_from_file (default: {True})
+
+        Returns:
+            OrbitProfile -- the profile
+        '''
+
+        times = fileio.read_times_from_file(path, headers[0], headers)
+        # one row per sample of the file
+        areas = fileio.read_areas_from_file(path, 1, len(times), headers, cache)
+        return cls(times, {h: areas[h] for h in headers}, t_orbit, dt, panels, paycap)
+
+    def resample(self, dt):
+        '''
+        Same profile on a grid of step dt. Interpolates from the samples of the file, not from the current grid.
+
+        Arguments:
+            dt {float} -- Time step of the simulation (seconds)
+
+        Returns:
+            OrbitProfile -- the new profile
+        '''
+
+        return OrbitProfile(self.source_times, self.source_faces, self.t_orbit, dt, self.panels, self.paycap_face)
+
+    def __len__(self):
+        return len(self.t)
+
+    def index(self, t):
+        '''
+        Index into the arrays of the profile for time t, wrapping around the orbit
+
+        Arguments:
+            t {float or np.array} -- time (seconds)
+
+        Returns:
+            int or np.array -- index of the closest grid point
+        '''
+
+        if n.ndim(t) == 0:
+            return int(round(t / self.dt)) % len(self.t)
+        return n.rint(n.asarray(t) / self.dt).astype(int) % len(self.t)
+
+    def areas_at(self, t):
+        '''
+        Areas used by the simulation loop at time t
+
+        Arguments:
+            t {float or np.array} -- time (seconds)
+
+        Returns:
+            tuple -- (total area, payload cap area, solar panel area) (m^2)
+        '''
+
+        i = self.index(t)
+        return self.total[i], self.paycap[i], self.panel[i]
+
+    def eclipse_fraction(self):
+        '''
+        Fraction of the orbit where no face sees the sun
+
+        Returns:
+            float -- eclipse fraction
+        '''
+
+        return float(n.mean(self.total <= 0))
+
+    def with_eclipse(self, eclipse_frac):
+        '''
+        Same profile with a different eclipse fraction, e.g. for another beta angle.
+        The sunlit part of the orbit is stretched or squeezed in time around its middle, and the rest is eclipse.
+        The attitude (the shape of the areas while in the sun) stays the same.
+
+        Arguments:
+            eclipse_frac {float} -- fraction of the orbit in eclipse, between 0 and 1
+
+        Returns:
+            OrbitProfile -- the new profile, on the same grid
+        '''
+
+        lit = n.nonzero(self.total > 0)[0]
+        assert len(lit) > 0, "The profile never sees the sun"
+        # the sunlit part can wrap around the end of the orbit: start it right after the longest eclipse
+        gaps = n.diff(n.concatenate([lit, [lit[0] + len(self.t)]]))
+        first = lit[(n.argmax(gaps) + 1) % len(lit)]
+        order = (first + n.arange(len(lit) + 1)) % len(self.t)
+        base_times = n.arange(len(order)) * self.dt
+
+        length = min((1.0 - eclipse_frac) * self.t_orbit, self.t_orbit - 2 * self.dt)
+        middle = self.t[first] + 0.5 * base_times[-1]
+        start = min(max(middle - 0.5 * length, self.dt), self.t_orbit - length - self.dt)
+        times = start + base_times * (length / base_times[-1])
+        # eclipse up to the sunlit part, the padding of periodic_resample covers the eclipse after it
+        times = n.concatenate([[0.0, start - self.dt], times])
+        faces = {h: n.concatenate([[0.0, 0.0], self.faces[h][order]]) for h in self.headers}
+        return OrbitProfile(times, faces, self.t_orbit, self.dt, self.panels, self.paycap_face)
@@ -0,0 +1,172 @@
+import warnings
+import numpy as n
+from functools import reduce
+from math import gcd
+from modules import fused, schedule
+# dt is always in seconds
+
+
+def _lcm_steps(periods, dt):
+    # least common multiple of the periods, in steps, None if a period is not a whole number of steps
+    steps = []
+    for period in periods:
+        k = int(round(period / dt))
+        if k <= 0 or abs(k * dt - period) > 1e-9 * period:
+            return None
+        steps.append(k)
+    return reduce(lambda a, b: a * b // gcd(a, b), steps)
+
+
+def cycle_steps(timings, t_orbit, dt=1.0):
+    """
+    Length of the shortest cycle after which both the orbit and the periodic loads (beacon and passover) repeat,
+    the least common multiple of their periods. It can be much longer than an orbit: with the 5520 s orbit and
+    5400 s passover interval of the default timings, it is 248400 s (69 h).
+
+    Arguments:
+        timings {dict} -- frequency, length, start/end times of different loads
+        t_orbit {float} -- length of the orbit (seconds)
+
+    Keyword Arguments:
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+
+    Returns:
+        int -- number of steps of the cycle, None if a period is not a whole number of steps
+    """
+
+    return _lcm_steps((t_orbit, timings['beacon_interval'], timings['passover_interval']), dt)
+
+
+def orbit_steps(timings, t_orbit, dt=1.0):
+    """
+    Length of the shortest cycle after which both the orbit and the beacon repeat, usually a single orbit.
+    Orbits without a passover are the same once the satellite has settled.
+
+    Arguments:
+        timings {dict} -- frequency, length, start/end times of different loads
+        t_orbit {float} -- length of the orbit (seconds)
+
+    Keyword Arguments:
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+
+    Returns:
+        int -- number of steps of the cycle, None if a period is not a whole number of steps
+    """
+
+    return _lcm_steps((t_orbit, timings['beacon_interval']), dt)
+
+
+def schedule_breaks(timings):
+    """
+    Times where the schedule stops repeating: the start and the end of the experiment, which change the passover
+    duration and the payload setpoint
+
+    Arguments:
+        timings {dict} -- frequency, length, start/end times of different loads
+
+    Returns:
+        list -- times of the breaks (seconds)
+    """
+
+    return [timings['exp_start_time'], timings['exp_start_time'] + timings['exp_duration']]
+
+
+def boundary_state(sat):
+    """
+    State at the start of a step that the rest of the run depends on
+
+    Arguments:
+        sat {satellite.Satellite} -- the satellite
+
+    Returns:
+        np.array -- charge, temperatures, and the solar shunts and experiment flags
+    """
+
+    return n.array([sat.charge] + [sat.temperatures[node] for node in sorted(sat.temperatures)] +
+                   [float(sat.solar_shunts), float(sat.exp['state'])], n.float64)
+
+
+def run_periodic(sat, profile, n_points, dt=1.0, t0=0.0, tol=1e-3, charge_tol=1e-3, side_area=0.03 * 0.01):
+    """
+    Run the standard simulation loop (see fused.run_fused) one orbit at a time, and skip ahead once it has settled.
+
+    The area profile and the beacon repeat every orbit (orbit_steps), so after the battery fills up and the
+    temperatures converge, the state at the orbit boundaries repeats. It is compared with the state one orbit and
+    one whole cycle (cycle_steps, when the passovers repeat too) before. When it matches:
+        - over a whole cycle, the cycle is repeated up to the next break of the schedule (schedule_breaks)
+        - over an orbit without a passover, that orbit is repeated up to the next passover
+    The repeats are recorded with trackers.tile, without simulating them, and the orbits with a passover are
+    simulated. The simulation also picks up again after a break, until it settles again.
+
+    Only orbits without a passover can be skipped unless two whole cycles fit before the next break. With the
+    default timings the passovers (every 5400 s) fall in every orbit (5520 s) and the cycle is 69 h, so nothing
+    is skipped in a 2 day experiment: a warning is given when a cycle does not fit between two breaks.
+
+    Arguments:
+        sat {satellite.Satellite} -- satellite to simulate, its state is updated to the end of the run
+        profile {orbit.OrbitProfile} -- sun areas over one orbit
+        n_points {int} -- number of steps
+
+    Keyword Arguments:
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        t0 {float} -- Time of the first step (seconds) (default: {0.0})
+        tol {float} -- largest change of a temperature over an orbit or cycle (K) for it to count as settled (default: {1e-3})
+        charge_tol {float} -- largest change of the charge over an orbit or cycle (mAh) for it to count as settled (default: {1e-3})
+        side_area {float} -- area of one side (m^2), see fused.run_fused (default: {0.03*0.01})
+
+    Returns:
+        list -- (start, end) times of the spans that were skipped (seconds)
+    """
+
+    timings = {'beacon_interval': sat.beacon_interval, 'beacon_duration': sat.beacon_duration,
+               'passover_interval': sat.passover_interval,
+               'passover_duration_exp_off': sat.passover_duration_exp_off,
+               'passover_duration_exp_on': sat.passover_duration_exp_on,
+               'exp_start_time': sat.exp_start_time, 'exp_duration': sat.exp_duration}
+    orbit = orbit_steps(timings, profile.t_orbit, dt)
+    cycle = cycle_steps(timings, profile.t_orbit, dt)
+    # steps where the schedule changes, the first step at or after each break
+    breaks = sorted(set(int(n.ceil((b - t0) / dt)) for b in schedule_breaks(timings) if 0 < (b - t0) / dt < n_points))
+    tolerance = n.array([charge_tol] + [tol] * len(sat.temperatures) + [0.5, 0.5])
+    sched = schedule.compile_schedule(timings, n_points, dt, t0)
+    passovers = n.flatnonzero(sched.states['passover'])
+
+    # parts of the run between breaks where orbits could be skipped, but not whole cycles
+    segments = n.diff([0] + breaks + [n_points])
+    if orbit is not None and n.any((segments >= 2 * orbit) & (cycle is None or segments < 2 * cycle)):
+        warnings.warn("The cycle of the orbit, beacon and passovers (%s s) does not fit twice between the breaks of "
+                      "the schedule, only orbits without a passover can be skipped"
+                      % (None if cycle is None else cycle * dt))
+
+    skipped = []
+    # state at the orbit boundaries simulated since the last break or skip, by step
+    boundaries = {}
+    i = 0
+    while i < n_points:
+        next_break = min([b for b in breaks if b > i] + [n_points])
+        if i in breaks:
+            boundaries = {}
+        boundaries[i] = boundary_state(sat)
+
+        for period in (cycle, orbit):
+            if period is None or i - period not in boundaries:
+                continue
+            if not n.all(n.abs(boundaries[i] - boundaries[i - period]) <= tolerance):
+                continue
+            limit = next_break
+            if period != cycle:
+                # the orbit that is repeated and the ones it is repeated into need to be without a passover
+                k = n.searchsorted(passovers, i - period)
+                limit = min(limit, passovers[k] if k < len(passovers) else n_points)
+            count = max(limit - i, 0) // period
+            if count > 0:
+                sat.trackers.tile(period, count, period * dt)
+                skipped.append((t0 + i * dt, t0 + (i + count * period) * dt))
+                i += count * period
+                boundaries = {}
+                break
+        else:
+            stop = min(i + orbit, next_break) if orbit is not None else next_break
+            fused.run_fused(sat, profile, stop - i, dt, t0 + i * dt, sched, side_area)
+            i = stop
+    return skipped
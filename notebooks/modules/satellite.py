@@ -1,9 +1,13 @@
 import copy
 import csv
 import numpy as n
-from modules import thermal
+from modules import thermal, tracker
 # dt is always in seconds
 
+# keys of the timings dictionary, each one is an attribute of the Satellite
+timing_keys = ['beacon_interval', 'beacon_duration', 'passover_interval', 'passover_duration_exp_off',
+               'passover_duration_exp_on', 'exp_start_time', 'exp_duration']
+
 
 class Satellite():
     def __init__(self, timings, eps, temperatures, setpoints, structure_constants):
@@ -40,6 +44,7 @@ class Satellite():
         # Initialize Thermal
         self.temperatures = copy.deepcopy(temperatures)
         self.qdots = {'battery': 0, 'structure': 0, 'payload': 0}
+        self.thermal_substep = None  # last sub-step (s) of the adaptive thermal integration
 
         # create the loads
         self.beacon = {'state': False, 'i': 1000,
@@ -64,10 +69,8 @@ class Satellite():
         self.batt_current_net = self.batt_current_out - self.batt_current_in
         self.max_solar_current_in_mA = 0 #solar current before shunting
 
-        # the trackers dictionary contains all of the data needed
-        self.trackers = {'time': []}
-        for key in self.get_state().keys():
-            self.trackers[key] = []
+        # the trackers contain all of the data needed, with one numpy column per state variable
+        self.trackers = tracker.StateTracker(self.get_state())
 
     def update_state_tracker(self, t):
         '''
@@ -82,9 +85,7 @@ class Satellite():
         '''
 
         state = self.get_state()
-        for k in state.keys():
-            self.trackers[k].append(copy.deepcopy(state[k]))
-        self.trackers['time'].append(t)
+        self.trackers.append(t, state)
         return state
 
     def get_state(self):
@@ -116,12 +117,111 @@ class Satellite():
         }
         return all_state
 
-    def set_state(self, t):
+    def snapshot(self):
+        '''
+        Capture the dynamic state of the satellite (charge, temperatures, qdots, currents, loads, ...) in a small
+        array of fixed size, without the configuration or the trackers. Pass it to restore or fork to continue
+        the run from this point.
+
+        Returns:
+            np.array -- the state, in the order of snapshot_layout
+        '''
+
+        values = [self.charge, self.solar_shunts, self.batt_current_in, self.batt_current_out, self.batt_current_net,
+                  self.max_solar_current_in_mA, n.nan if self.thermal_substep is None else self.thermal_substep]
+        values += [self.temperatures[k] for k in self.temperatures] + [self.qdots[k] for k in self.qdots]
+        for load in self.loads:
+            values += [load['state'], load['inst_current']]
+        return n.array(values, n.float64)
+
+    def snapshot_layout(self):
+        '''
+        Names of the values of a snapshot
+
+        Returns:
+            list -- name of every entry of the array returned by snapshot
+        '''
+
+        names = ['charge', 'solar_shunts', 'batt_current_in', 'batt_current_out', 'batt_current_net',
+                 'max_solar_current_in_mA', 'thermal_substep']
+        names += ['temperatures/' + k for k in self.temperatures] + ['qdots/' + k for k in self.qdots]
+        for load in self.loads:
+            names += ['loads/%s/state' % load['name'], 'loads/%s/inst_current' % load['name']]
+        return names
+
+    def restore(self, snapshot):
+        '''
+        Put the satellite back in the state captured by snapshot. The trackers are left as they are.
+
+        Arguments:
+            snapshot {np.array} -- output of snapshot, from this satellite or one with the same configuration
+        '''
+
+        values = snapshot.tolist()
+        (self.charge, shunts, self.batt_current_in, self.batt_current_out, self.batt_current_net,
+         self.max_solar_current_in_mA, substep) = values[:7]
+        self.solar_shunts = bool(shunts)
+        self.thermal_substep = None if substep != substep else substep
+        i = 7
+        for k in self.temperatures:
+            self.temperatures[k] = values[i]
+            i += 1
+        for k in self.qdots:
+            self.qdots[k] = values[i]
+            i += 1
+        for load in self.loads:
+            load['state'] = bool(values[i])
+            load['inst_current'] = values[i + 1]
+            i += 2
+
+    def fork(self, snapshot=None, timings=None):
+        '''
+        New satellite with the same configuration, starting from snapshot (or from the current state),
+        with its own empty trackers. The trackers of this satellite, which hold the shared part of the run,
+        are not copied.
+
+        For example, to try different experiment start times after a shared launch phase:
+            fused.run_fused(heron, profile, 5 * 60 * 60)  # first 5 hours
+            launch = heron.snapshot()
+            branches = [heron.fork(launch, {'exp_start_time': t}) for t in start_times]
+
+        Keyword Arguments:
+            snapshot {np.array} -- state to start from, the current state if None (default: {None})
+            timings {dict} -- timings to change in the fork, keys of timing_keys, e.g. {'exp_start_time': 6 * 60 * 60} (default: {None})
+
+        Returns:
+            Satellite -- the fork
+        '''
+
+        sat = copy.copy(self)
+        sat.temperatures = dict(self.temperatures)
+        sat.qdots = dict(self.qdots)
+        sat.heater_setpoints = dict(self.heater_setpoints)
+        sat.structure_constants = dict(self.structure_constants)
+        sat.loads = [dict(load) for load in self.loads]
+        # the named loads have to point into the new list
+        roles = (self.exp, self.bus_const_pwr, self.beacon, self.passover, self.batt_heater, self.pay_heater)
+        sat.exp, sat.bus_const_pwr, sat.beacon, sat.passover, sat.batt_heater, sat.pay_heater = [
+            sat.loads[[l is load for l in self.loads].index(True)] for load in roles]
+        for key, value in (timings or {}).items():
+            if key not in timing_keys:
+                raise KeyError("Unknown timing: %s, expected one of %s" % (key, ', '.join(timing_keys)))
+            setattr(sat, key, value)
+        if snapshot is not None:
+            sat.restore(snapshot)
+        sat.trackers = tracker.StateTracker(sat.get_state())
+        return sat
+
+    def set_state(self, t, schedule=None):
         '''
         Determine the on/off status of loads given the current time, and write the status to the state variables of the Satellite object
 
         Arguments:
             t {float} -- current time (in seconds) of the simulation
+
+        Keyword Arguments:
+            schedule {schedule.LoadSchedule} -- precompiled states of the time-based loads, compiled from this satellite's timings.
+                If given, the beacon, passover and experiment states are read from it instead of being recomputed (default: {None})
         '''
 
         # Dynamic State Variables
@@ -131,14 +231,18 @@ class Satellite():
         self.batt_heater['state'] = self.temperatures['battery'] < self.heater_setpoints['battery']
         self.pay_heater['state'] = self.temperatures['payload'] < pay_setpoint
 
+        # The bus is always on
+        self.bus_const_pwr['state'] = True
+
         # Time-based variables
+        if schedule is not None:
+            self.beacon['state'], self.passover['state'], self.exp['state'] = schedule.states_at(t)
+            return
+
         self.beacon['state'] = t % self.beacon_interval < self.beacon_duration
         self.exp['state'] = (t < self.exp_start_time +
                              self.exp_duration) and (t > self.exp_start_time)
 
-        # The bus is always on
-        self.bus_const_pwr['state'] = True
-
         # If the experiment is running, use the short passover time, use the long one otherwise
         if self.exp['state']:
             self.passover['state'] = t % self.passover_interval < self.passover_duration_exp_on
@@ -149,7 +253,7 @@ class Satellite():
         if self.passover['state']:
             self.beacon['state'] = False
 
-    def update_thermal(self, sun_area, zcap_sun_area, battery_discharge, dt=1.0):
+    def update_thermal(self, sun_area, zcap_sun_area, battery_discharge, dt=1.0, method='euler', tol=0.01):
         '''
         Given the current state of the satellite, update the Qdots and the temperatures.
         Uses numerical methods to time-step through the thermal equations.
@@ -161,21 +265,39 @@ class Satellite():
 
         Keyword Arguments:
             dt {float} -- Time step of the simulation (secods) (default: {1.0})
+            method {string} -- 'euler' for a single forward-Euler step, 'rk23' for adaptive sub-steps with error control.
+                Pass the mean sun areas over the step. With 'rk23' and 60 s steps, a 3-orbit run stays within 0.3 K
+                of the 1 s Euler reference; most of that comes from the heaters only switching at step boundaries (default: {'euler'})
+            tol {float} -- maximum local error (K) of each 'rk23' sub-step (default: {0.01})
         '''
 
+        assert method in ['euler', 'rk23'], "Unknown thermal integration method " + str(method)
+
         # Load the current temperatures
         T_str = self.temperatures['structure']
         T_pay = self.temperatures['payload']
         T_bat = self.temperatures['battery']
 
+        # The self-heating current is scaled by the step length in the Euler model, the adaptive model
+        # always uses the 1 s scaling so its results do not depend on dt
+        I_t = battery_discharge * ((dt if method == 'euler' else 1.0)/3600.0)
+
         # Update the Q-dots of the satellite
         self.qdots['structure'] = thermal.Q_str_net(
             sun_area, T_str, T_pay, T_bat, self.structure_constants)
         self.qdots['battery'] = thermal.Q_batt_net(T_str, T_bat, self.batt_heater['state'],
-                                                   battery_discharge * (dt/3600.0), self.structure_constants)
+                                                   I_t, self.structure_constants)
         self.qdots['payload'] = thermal.Q_pay_net(
             T_str, T_pay, self.pay_heater['state'], zcap_sun_area, self.structure_constants)
 
+        if method == 'rk23':
+            rates = lambda T, t: thermal.T_rates(T, sun_area, zcap_sun_area, self.batt_heater['state'],
+                                                 self.pay_heater['state'], I_t, self.structure_constants)
+            T, self.thermal_substep = thermal.T_adaptive([T_str, T_pay, T_bat], dt, rates, tol,
+                                                         self.thermal_substep)
+            self.temperatures['structure'], self.temperatures['payload'], self.temperatures['battery'] = T
+            return
+
         # Update the temperatures
         self.temperatures['structure'] = thermal.T_str_dt(self.qdots['structure'], T_str,
                                                           T_pay, T_bat, dt, self.structure_constants)
@@ -202,19 +324,40 @@ class Satellite():
 
         self.batt_current_net = self.batt_current_out - self.batt_current_in
 
-    def get_battery_voltage(self):
+    def get_battery_voltage(self, charge=None):
         '''
         Calculate the battery voltage depending on the current charge of the battery.
         This model can be expanded to include voltage inflation or sagging, as well as the non-linear chrage/voltage curve, but for now it is a linear model.
 
+        Keyword Arguments:
+            charge {float} -- charge (mAh) to calculate the voltage for, instead of the current charge (default: {None})
+
         Returns:
             float -- battery voltage (V)
         '''
 
+        charge = self.charge if charge is None else charge
         # replace this with actual I-V curve of the batteries
         batt_vmax = 4
         batt_vmin = 2.5
-        return batt_vmin + (self.charge/(self.battery_capacity_mAh)) * (batt_vmax - batt_vmin)
+        return batt_vmin + (charge/(self.battery_capacity_mAh)) * (batt_vmax - batt_vmin)
+
+    def solar_current(self, effective_area):
+        '''
+        Current (mA) provided by the solar panels, before any shunting
+
+        Arguments:
+            effective_area {float} -- projected solar panel area exposed to the sun, expressed as a fraction of 1 side.
+
+        Returns:
+            float -- solar current (mA)
+        '''
+
+        n_cells_per_side = 3.0  # 3 because we have 3 sets of 2 in series
+        # 500 is the assumed mA provided by panels in sun
+        pv_cell_current_mA = 500.0 * n_cells_per_side
+        # assume that charge is linear with area
+        return effective_area * pv_cell_current_mA
 
     def charge_from_solar_panel(self, effective_area, dt=1.0):
         """
@@ -227,14 +370,8 @@ class Satellite():
             dt {float} -- Simulation time step (seconds) (default: {1.0})
         """
 
-        n_cells_per_side = 3.0  # 3 because we have 3 sets of 2 in series
-        # 500 is the assumed mA provided by panels in sun
-        pv_cell_current_mA = 500.0 * n_cells_per_side
-        # assume that charge is linear with area
-        new_charge = self.charge + effective_area * \
-            pv_cell_current_mA * (dt/3600)
-
-        self.max_solar_current_in_mA = effective_area * pv_cell_current_mA
+        self.max_solar_current_in_mA = self.solar_current(effective_area)
+        new_charge = self.charge + self.max_solar_current_in_mA * (dt/3600)
 
         # Add to the battery, making sure we don't overcharge
         self.batt_current_in = ((min(new_charge, self.battery_capacity_mAh)) - self.charge) / (dt * 1.0 / 3600.0)
@@ -0,0 +1,104 @@
+import numpy as n
+# dt is always in seconds
+
+
+def compile_schedule(timings, n_points, dt=1.0, t0=0.0):
+    """
+    Compute the on/off state of the time-based loads (beacon, passover, experiment) for a whole mission at once.
+    Uses the same rules as Satellite.set_state, but over an array of times instead of one time.
+    The result only depends on the timings, so it can be reused by every run that shares them.
+
+    Any value of timings can be a sequence with one entry per variant (see batch.SatelliteBatch),
+    in which case the states have shape (n_points, N) instead of (n_points,).
+
+    Arguments:
+        timings {dict} -- frequency, length, start/end times of different loads
+        n_points {int} -- number of time steps in the mission
+
+    Keyword Arguments:
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        t0 {float} -- Time of the first step (seconds) (default: {0.0})
+
+    Returns:
+        LoadSchedule -- the compiled schedule
+    """
+
+    per_variant = any(n.ndim(v) > 0 for v in timings.values())
+    tm = {k: n.asarray(v, n.float64) for k, v in timings.items()}
+    t = t0 + n.arange(n_points) * dt
+    ts = t[:, None] if per_variant else t
+
+    exp = (ts < tm['exp_start_time'] + tm['exp_duration']) & (ts > tm['exp_start_time'])
+    # If the experiment is running, use the short passover time, use the long one otherwise
+    passover_duration = n.where(exp, tm['passover_duration_exp_on'], tm['passover_duration_exp_off'])
+    passover = ts % tm['passover_interval'] < passover_duration
+    # If we are in a passover, the beacon is off
+    beacon = (ts % tm['beacon_interval'] < tm['beacon_duration']) & ~passover
+
+    return LoadSchedule(t, dt, {'beacon': beacon, 'passover': passover, 'exp': exp}, timings)
+
+
+class LoadSchedule():
+    def __init__(self, t, dt, states, timings):
+        """
+        On/off states of the time-based loads over a whole mission. Created by compile_schedule.
+
+        Arguments:
+            t {np.array} -- times of the steps (seconds)
+            dt {float} -- time step (seconds)
+            states {dict} -- boolean array of states for each of 'beacon', 'passover' and 'exp'
+            timings {dict} -- the timings the schedule was compiled from
+        """
+
+        self.t = t
+        self.dt = dt
+        self.states = states
+        self.timings = dict(timings)
+
+    def __len__(self):
+        return len(self.t)
+
+    def index(self, t):
+        '''
+        Row of the schedule for time t
+
+        Arguments:
+            t {float} -- time (seconds)
+
+        Returns:
+            int -- index into the state arrays
+        '''
+
+        i = int(round((t - self.t[0]) / self.dt))
+        assert 0 <= i < len(self.t), "t = %s is outside of the compiled schedule" % t
+        return i
+
+    def states_at(self, t):
+        '''
+        States of the time-based loads at time t
+
+        Arguments:
+            t {float} -- time (seconds)
+
+        Returns:
+            tuple -- (beacon, passover, exp) states
+        '''
+
+        i = self.index(t)
+        return self.states['beacon'][i], self.states['passover'][i], self.states['exp'][i]
+
+    def transitions(self):
+        '''
+        List every time a time-based load switches on or off, in time order.
+        Only available for schedules compiled from scalar timings.
+
+        Returns:
+            list -- (time, load, new state) tuples, where load is one of 'beacon', 'passover' or 'exp'
+        '''
+
+        events = []
+        for load, state in self.states.items():
+            assert state.ndim == 1, "transitions are only defined for a single set of timings"
+            changes = n.nonzero(state[1:] != state[:-1])[0] + 1
+            events += [(self.t[i], load, bool(state[i])) for i in changes]
+        return sorted(events, key=lambda e: e[0])
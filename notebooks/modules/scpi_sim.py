@@ -0,0 +1,291 @@
+import re
+import time
+import threading
+import socketserver
+import numpy as n
+# latencies are in seconds, powers in W and currents in A, like the instruments
+
+
+class SimulatedInstrument():
+    def __init__(self, idn, latency=0.0, jitter=0.0, command_latency=None, seed=None, clock=time.monotonic):
+        """
+        Stand-in for a pyvisa resource of an SCPI instrument, to run the hardware-in-the-loop code without hardware.
+        Understands a few commands (see handle in the subclasses), several per message separated by ';' like SCPI.
+        As on the instruments, a header after ';' is relative to the path of the header before it, so
+        'FETC:POW?;FETC:VOLT?' asks for FETC:FETC:VOLT?, and the second query has to be written ':FETC:VOLT?'.
+        Unknown commands are put in the error queue, read with SYST:ERR?, as the instruments do.
+
+        Every message takes latency (plus a random 0 to jitter, plus command_latency of each command in it)
+        seconds, like a bus round-trip. The power the instrument is asked to handle is integrated over time.
+
+        Arguments:
+            idn {string} -- answer to *IDN?
+
+        Keyword Arguments:
+            latency {float} -- time taken by every write or query (seconds) (default: {0.0})
+            jitter {float} -- largest random time added to latency (seconds) (default: {0.0})
+            command_latency {dict} -- extra time taken by some commands, e.g. {'APPL': 0.01} (seconds) (default: {None})
+            seed {int} -- seed of the jitter (default: {None})
+            clock {function} -- clock used to integrate the energy (default: {time.monotonic})
+        """
+
+        self.idn = idn
+        self.latency = latency
+        self.jitter = jitter
+        self.command_latency = {} if command_latency is None else dict(command_latency)
+        self.random = n.random.RandomState(seed)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.errors = []
+        self.n_writes = 0
+        self.n_queries = 0
+        self.n_commands = 0
+        self.energy_J = 0.0
+        self.last_update = clock()
+
+    def power(self):
+        # power (W) the instrument is handling with its current settings
+        return 0.0
+
+    def _integrate(self):
+        now = self.clock()
+        self.energy_J += self.power() * (now - self.last_update)
+        self.last_update = now
+
+    def _resolve(self, commands):
+        # SCPI compound commands: a header that does not start with ':' or '*' is relative to the path of the
+        # header before it (up to its last ':'), common commands (*IDN?, ...) do not change the path
+        resolved = []
+        path = ''
+        for command in commands:
+            header, _, rest = command.partition(' ')
+            if not header.startswith('*'):
+                header = header[1:] if header.startswith(':') else path + header
+                path = header[:header.rfind(':') + 1]
+            resolved.append(header + (' ' + rest.strip() if rest.strip() else ''))
+        return resolved
+
+    def _message(self, message):
+        commands = self._resolve([c.strip() for c in message.strip().split(';') if c.strip()])
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+        delay += sum(self.command_latency.get(c.split()[0].upper().rstrip('?'), 0.0) for c in commands)
+        if delay > 0:
+            time.sleep(delay)
+        answers = []
+        with self.lock:
+            for command in commands:
+                self.n_commands += 1
+                self._integrate()
+                upper = command.upper()
+                if upper == '*IDN?':
+                    answers.append(self.idn)
+                elif upper in ('SYST:ERR?', 'SYSTEM:ERROR?'):
+                    answers.append(self.errors.pop(0) if self.errors else '0,"No error"')
+                else:
+                    answer = self.handle(upper)
+                    if answer is False:
+                        self.errors.append('-113,"Undefined header;%s"' % command)
+                    elif answer is not None:
+                        answers.append(answer)
+        return answers
+
+    def handle(self, command):
+        # returns the answer of a query, None for a command, False if the command is not understood
+        return False
+
+    def write(self, message, termination=None):
+        '''
+        Send a message, like pyvisa's write
+
+        Arguments:
+            message {string} -- one or more commands, separated by ';'
+
+        Keyword Arguments:
+            termination {string} -- ignored, for compatibility with pyvisa (default: {None})
+
+        Returns:
+            int -- number of bytes written
+        '''
+
+        self.n_writes += 1
+        self._message(message)
+        return len(message) + 1
+
+    def query(self, message):
+        '''
+        Send a message and read back the answers, like pyvisa's query
+
+        Arguments:
+            message {string} -- one or more commands, separated by ';'
+
+        Returns:
+            string -- answers separated by ';'
+        '''
+
+        self.n_queries += 1
+        return ';'.join(self._message(message))
+
+    def query_ascii_values(self, message, separator=','):
+        '''
+        Send a message and read back the answer as numbers, like pyvisa's query_ascii_values
+
+        Arguments:
+            message {string} -- one or more commands, separated by ';'
+
+        Keyword Arguments:
+            separator {string} -- separator of the values, the answers of a compound query are separated by ';' (default: {','})
+
+        Returns:
+            list -- the values
+        '''
+
+        return [float(v) for v in self.query(message).split(separator)]
+
+    def close(self):
+        pass
+
+
+class SimulatedELoad(SimulatedInstrument):
+    def __init__(self, input_voltage=5.0, noise=0.0, **kwargs):
+        """
+        Keithley 2380 electronic load. Understands POW <W> (constant power), CURR <A> (constant current)
+        and FETC:POW?, FETC:CURR?, FETC:VOLT?
+
+        Keyword Arguments:
+            input_voltage {float} -- voltage at the input of the load (V) (default: {5.0})
+            noise {float} -- standard deviation of the readings, as a fraction of the value (default: {0.0})
+            **kwargs -- see SimulatedInstrument
+        """
+
+        kwargs.setdefault('idn', 'KEITHLEY INSTRUMENTS,2380-120-60,802436012717810052,SIMULATED')
+        super().__init__(**kwargs)
+        self.input_voltage = input_voltage
+        self.noise = noise
+        self.mode = 'CURR'
+        self.setpoint = 0.0
+
+    def power(self):
+        if self.mode == 'POW':
+            return self.setpoint
+        return self.setpoint * self.input_voltage
+
+    def _reading(self, value):
+        return value * (1.0 + self.noise * self.random.randn()) if self.noise > 0 else value
+
+    def handle(self, command):
+        name, _, value = command.partition(' ')
+        if name in ('POW', 'POWER', 'CURR', 'CURRENT') and value:
+            self.mode = 'POW' if name.startswith('POW') else 'CURR'
+            self.setpoint = float(value)
+        elif name == 'FETC:POW?':
+            return '%.6f' % self._reading(self.power())
+        elif name == 'FETC:CURR?':
+            return '%.6f' % self._reading(self.power() / self.input_voltage)
+        elif name == 'FETC:VOLT?':
+            return '%.6f' % self._reading(self.input_voltage)
+        else:
+            return False
+
+
+class SimulatedSupply(SimulatedInstrument):
+    def __init__(self, channels=3, noise=0.0, **kwargs):
+        """
+        Keithley 2230 DC supply. Understands APPL CH<n>, <V>, <A>, which sets the voltage and the current of a
+        channel, and MEAS:VOLT? CH<n>, MEAS:CURR? CH<n>, MEAS:POW? CH<n>. The model is a supply in constant current
+        into a battery: each channel gives its set current, at its set voltage.
+
+        Keyword Arguments:
+            channels {int} -- number of channels (default: {3})
+            noise {float} -- standard deviation of the readings, as a fraction of the value (default: {0.0})
+            **kwargs -- see SimulatedInstrument
+        """
+
+        kwargs.setdefault('idn', 'Keithley instruments, 2230-30-1, 9104291, SIMULATED')
+        super().__init__(**kwargs)
+        self.noise = noise
+        self.voltage = n.zeros(channels)
+        self.current = n.zeros(channels)
+
+    def power(self):
+        return float(n.dot(self.voltage, self.current))
+
+    def _reading(self, value):
+        return value * (1.0 + self.noise * self.random.randn()) if self.noise > 0 else value
+
+    def handle(self, command):
+        match = re.match(r'MEAS(?:URE)?:(VOLT|CURR|POW)\S*\?\s*CH(\d+)$', command)
+        if match is not None:
+            channel = int(match.group(2)) - 1
+            if not 0 <= channel < len(self.voltage):
+                return False
+            value = {'VOLT': self.voltage[channel], 'CURR': self.current[channel],
+                     'POW': self.voltage[channel] * self.current[channel]}[match.group(1)]
+            return '%.6f' % self._reading(value)
+        match = re.match(r'APPL(?:Y)?\s+CH(\d+)\s*,\s*([-+.\deE]+)\s*,\s*([-+.\deE]+)$', command)
+        if match is None:
+            return False
+        channel = int(match.group(1)) - 1
+        if not 0 <= channel < len(self.voltage):
+            return False
+        self.voltage[channel] = float(match.group(2))
+        self.current[channel] = float(match.group(3))
+
+
+class ResourceManager():
+    def __init__(self, **kwargs):
+        """
+        Drop-in for visa.ResourceManager() that opens simulated instruments. The model is picked from the
+        USB product id in the address: 0x2380 is the e-load, 0x2230 the DC supply.
+
+        Keyword Arguments:
+            **kwargs -- passed to every instrument, e.g. latency=0.01 (see SimulatedInstrument)
+        """
+
+        self.kwargs = kwargs
+        self.resources = {}
+
+    def open_resource(self, address):
+        if address not in self.resources:
+            if '0x2380' in address:
+                self.resources[address] = SimulatedELoad(**self.kwargs)
+            elif '0x2230' in address:
+                self.resources[address] = SimulatedSupply(**self.kwargs)
+            else:
+                raise ValueError("No simulated instrument for %s" % address)
+        return self.resources[address]
+
+    def list_resources(self):
+        return tuple(self.resources.keys())
+
+
+def serve(instrument, host='127.0.0.1', port=5025):
+    """
+    Serve a simulated instrument over TCP, one SCPI message per line, the answers of queries are sent back as a line.
+    Port 5025 is the usual SCPI socket port, so a pyvisa TCPIP::<host>::5025::SOCKET resource can talk to it.
+    Blocks until interrupted.
+
+    Arguments:
+        instrument {SimulatedInstrument} -- the instrument
+
+    Keyword Arguments:
+        host {string} -- address to listen on (default: {'127.0.0.1'})
+        port {int} -- port to listen on (default: {5025})
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                message = line.decode().strip()
+                if not message:
+                    continue
+                if '?' in message:
+                    self.wfile.write((instrument.query(message) + '\n').encode())
+                else:
+                    instrument.write(message)
+
+    class Server(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    with Server((host, port), Handler) as server:
+        server.serve_forever()
@@ -0,0 +1,190 @@
+import numpy as n
+from modules import orbit, sweep
+# dt is always in seconds
+
+# parameters perturbed by default: the thermal constants and the power system
+default_parameters = ['structure_constants.area_t', 'structure_constants.r_batt', 'structure_constants.R_str_pay',
+                      'structure_constants.R_str_batt', 'structure_constants.c_str', 'structure_constants.c_batt',
+                      'structure_constants.c_pay', 'structure_constants.e', 'structure_constants.a',
+                      'eps.battery_capacity_mAh', 'eps.converter_efficiency', 'eps.starting_charge_frac']
+# the payload sits at its heater setpoint once it has warmed up, so its heater duty is what changes, not its temperature
+default_metrics = ['min_batt_temp', 'max_batt_temp', 'pay_heater_duty', 'final_soc']
+# parameters that cannot go past these values, the difference is one-sided at the bounds
+bounds = {'structure_constants.e': (0.0, 1.0), 'structure_constants.a': (0.0, 1.0),
+          'eps.converter_efficiency': (0.0, 1.0), 'eps.starting_charge_frac': (0.0, 1.0)}
+
+
+def perturbed_values(base, parameters, rel_step=0.05):
+    """
+    Values of each parameter below and above its base value, kept inside bounds
+
+    Arguments:
+        base {dict} -- base configuration, one dictionary per section of sweep.config_sections
+        parameters {list} -- 'section.key' of the parameters
+
+    Keyword Arguments:
+        rel_step {float} -- step, as a fraction of the base value (default: {0.05})
+
+    Returns:
+        dict -- 'section.key' -> (base value, low value, high value)
+    """
+
+    values = {}
+    for name in parameters:
+        section, key = name.split('.', 1)
+        p = float(base[section][key])
+        h = rel_step * abs(p) if p != 0 else rel_step
+        lo, hi = bounds.get(name, (-n.inf, n.inf))
+        values[name] = (p, max(p - h, lo), min(p + h, hi))
+    return values
+
+
+def sensitivity_variants(values):
+    """
+    Variants of a sensitivity run: the base, then the low and high value of every parameter
+
+    Arguments:
+        values {dict} -- from perturbed_values
+
+    Returns:
+        list -- overrides ('section.key' -> value) of each variant
+    """
+
+    variants = [{}]
+    for name, (p, low, high) in values.items():
+        variants += [{name: low}, {name: high}]
+    return variants
+
+
+def run_sensitivity(base, profile, parameters=None, metrics=None, rel_step=0.05, n_orbits=6, dt=1.0, max_workers=None,
+                    t_orbit=92 * 60, settle_orbits=3):
+    """
+    Sensitivity of mission metrics to every parameter, from central differences. All of the perturbed variants are
+    simulated at once, as one SatelliteBatch sharing the schedule and the area profile (sweep.run_chunk), so it
+    takes about as long as a single run. With max_workers, the variants are split over a pool of processes instead
+    (sweep.run_sweep).
+
+    The heaters switch at setpoints, so the metrics are not smooth in the parameters: a step that is too small
+    gives differences dominated by when a heater happened to switch. A few percent averages over that.
+
+    The metrics are taken after settle_orbits: over the first orbits the battery is still warming up from its
+    initial temperature, so its minimum would just be the initial condition, the same for every variant.
+
+    Arguments:
+        base {dict} -- base configuration, one dictionary per section of sweep.config_sections
+        profile {orbit.OrbitProfile} -- areas over one orbit, or the path of the STK area export
+
+    Keyword Arguments:
+        parameters {list} -- 'section.key' of the parameters to perturb (default: {default_parameters})
+        metrics {list} -- metrics of sweep.summarize to differentiate (default: {default_metrics})
+        rel_step {float} -- step, as a fraction of the base value of each parameter (default: {0.05})
+        n_orbits {float} -- number of orbits to simulate (default: {6})
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        max_workers {int} -- number of processes, None to simulate everything in this process (default: {None})
+        t_orbit {float} -- length of the orbit (seconds), if profile is a path (default: {92*60})
+        settle_orbits {float} -- number of orbits at the start left out of the metrics (default: {3})
+
+    Returns:
+        list -- one row per parameter and metric, see sensitivity_rows
+    """
+
+    parameters = default_parameters if parameters is None else parameters
+    metrics = default_metrics if metrics is None else metrics
+    values = perturbed_values(base, parameters, rel_step)
+    variants = sensitivity_variants(values)
+
+    if max_workers is None:
+        if not isinstance(profile, orbit.OrbitProfile):
+            profile = orbit.OrbitProfile.from_file(profile, dt, t_orbit)
+        results = sweep.run_chunk(base, variants, n_orbits, dt, profile, settle_orbits)
+    else:
+        assert not isinstance(profile, orbit.OrbitProfile), "The processes read the profile from its file"
+        chunk_size = int(n.ceil(len(variants) / float(max_workers)))
+        results = [None] * len(variants)
+        for row in sweep.run_sweep(base, variants, profile, n_orbits, dt, t_orbit, chunk_size, max_workers,
+                                   settle_orbits):
+            results[row['variant']] = row
+    return sensitivity_rows(values, results, metrics)
+
+
+def metric_scale(metric, base_metrics):
+    """
+    Size of the changes of a metric that the normalized coefficients are relative to. For the temperatures,
+    it is the range of that temperature over the base run (max - min, after the settling orbits), since a change
+    of a temperature relative to its absolute value (~300 K) means nothing. For the other metrics, it is their
+    base value.
+
+    Arguments:
+        metric {string} -- name of the metric, e.g. 'min_batt_temp'
+        base_metrics {dict} -- metrics of the base run (see sweep.summarize)
+
+    Returns:
+        float -- the scale, in the units of the metric
+    """
+
+    if metric.endswith('_temp'):
+        node = metric.split('_', 1)[1]
+        return base_metrics['max_' + node] - base_metrics['min_' + node]
+    return abs(base_metrics[metric])
+
+
+def sensitivity_rows(values, results, metrics):
+    """
+    Sensitivity coefficients from the metrics of the variants of sensitivity_variants, ranked for each metric
+    by the size of the normalized coefficient. Coefficients whose scale is 0 (e.g. a temperature that stays
+    flat) are NaN, ranked last and by per_percent.
+
+    Arguments:
+        values {dict} -- from perturbed_values
+        results {list} -- metrics of every variant, in the order of sensitivity_variants
+        metrics {list} -- names of the metrics
+
+    Returns:
+        list -- rows with 'metric', 'rank', 'parameter', 'value', 'base_metric', 'scale' (see metric_scale),
+                'derivative' (metric units per parameter unit), 'per_percent' (change of the metric for +1% of the
+                parameter) and 'normalized' (change of the metric over its scale, per relative change of the parameter)
+    """
+
+    rows = []
+    for metric in metrics:
+        m0 = results[0][metric]
+        scale = metric_scale(metric, results[0])
+        metric_rows = []
+        for j, (name, (p, low, high)) in enumerate(values.items()):
+            m_low, m_high = results[1 + 2 * j][metric], results[2 + 2 * j][metric]
+            derivative = (m_high - m_low) / (high - low) if high != low else 0.0
+            metric_rows.append({'metric': metric, 'parameter': name, 'value': p, 'base_metric': m0, 'scale': scale,
+                                'derivative': derivative, 'per_percent': derivative * p * 0.01,
+                                'normalized': derivative * p / scale if scale != 0 else n.nan})
+        metric_rows.sort(key=lambda r: (True, -abs(r['per_percent'])) if n.isnan(r['normalized'])
+                         else (False, -abs(r['normalized'])))
+        for rank, row in enumerate(metric_rows, 1):
+            row['rank'] = rank
+            rows.append(row)
+    return [{k: row[k] for k in ('metric', 'rank', 'parameter', 'value', 'base_metric', 'scale', 'derivative',
+                                  'per_percent', 'normalized')} for row in rows]
+
+
+def report(rows, top=None):
+    """
+    Sensitivity table as text, for printing
+
+    Arguments:
+        rows {list} -- rows of sensitivity_rows
+
+    Keyword Arguments:
+        top {int} -- only show the first top parameters of each metric (default: {None})
+
+    Returns:
+        string -- the table
+    """
+
+    lines = []
+    for row in rows:
+        if row['rank'] == 1:
+            lines.append("%s (base %.4g, normalized by %.4g)" % (row['metric'], row['base_metric'], row['scale']))
+            lines.append("  %4s  %-32s %12s %12s %12s" % ('rank', 'parameter', 'normalized', 'per +1%', 'derivative'))
+        if top is None or row['rank'] <= top:
+            lines.append("  %4d  %-32s %12.4g %12.4g %12.4g" % (row['rank'], row['parameter'], row['normalized'],
+                                                                row['per_percent'], row['derivative']))
+    return '\n'.join(lines)
@@ -0,0 +1,213 @@
+import copy
+import csv
+import itertools
+import os
+import numpy as n
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from modules import batch, orbit, schedule
+# dt is always in seconds
+
+config_sections = ['timings', 'eps', 'temperatures', 'setpoints', 'structure_constants']
+
+# area profile of the worker process, loaded once by init_worker
+_worker_profile = None
+
+
+def grid_variants(axes):
+    """
+    Every combination of the values of the axes.
+
+    Arguments:
+        axes {dict} -- 'section.key' -> list of values, e.g. {'structure_constants.c_str': [700, 900]}
+
+    Returns:
+        list -- one dictionary of 'section.key' -> value per variant
+    """
+
+    keys = list(axes.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[axes[k] for k in keys])]
+
+
+def random_variants(axes, n_samples, seed=None):
+    """
+    Variants with each parameter drawn uniformly between two bounds.
+
+    Arguments:
+        axes {dict} -- 'section.key' -> (low, high)
+        n_samples {int} -- number of variants to draw
+
+    Keyword Arguments:
+        seed {int} -- seed of the random generator (default: {None})
+
+    Returns:
+        list -- one dictionary of 'section.key' -> value per variant
+    """
+
+    rng = n.random.RandomState(seed)
+    draws = {k: rng.uniform(lo, hi, n_samples) for k, (lo, hi) in axes.items()}
+    return [{k: float(draws[k][i]) for k in axes} for i in range(n_samples)]
+
+
+def apply_overrides(base, overrides):
+    """
+    Copy a configuration and replace some of its values.
+
+    Arguments:
+        base {dict} -- configuration with one dictionary per section of config_sections
+        overrides {dict} -- 'section.key' -> value
+
+    Returns:
+        dict -- the new configuration
+    """
+
+    config = copy.deepcopy(base)
+    for name, value in overrides.items():
+        section, key = name.split('.', 1)
+        assert section in config_sections, "Unknown configuration section " + section
+        config[section][key] = value
+    return config
+
+
+def init_worker(path, dt, t_orbit):
+    global _worker_profile
+    _worker_profile = orbit.OrbitProfile.from_file(path, dt, t_orbit)
+
+
+def summarize(sat, dt=1.0, start=0):
+    """
+    Reduce the trackers of a SatelliteBatch to a few metrics per variant
+
+    Arguments:
+        sat {batch.SatelliteBatch} -- the simulated batch
+
+    Keyword Arguments:
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        start {int} -- first step the metrics are taken over, to leave out the warm-up from the initial
+                       temperatures and charge. The final values are always at the last step (default: {0})
+
+    Returns:
+        list -- one dictionary of metrics per variant
+    """
+
+    tr = sat.trackers
+    rows = slice(start, None)
+    temps = tr['temperatures']
+    loads = tr['loads']
+    metrics = {
+        'min_batt_temp': temps['battery'][rows].min(axis=0),
+        'max_batt_temp': temps['battery'][rows].max(axis=0),
+        'min_pay_temp': temps['payload'][rows].min(axis=0),
+        'max_pay_temp': temps['payload'][rows].max(axis=0),
+        'min_str_temp': temps['structure'][rows].min(axis=0),
+        'max_str_temp': temps['structure'][rows].max(axis=0),
+        'min_charge_mAh': tr['batt_charge'][rows].min(axis=0),
+        'final_charge_mAh': tr['batt_charge'][-1],
+        'final_soc': tr['batt_charge'][-1] / sat.battery_capacity_mAh,
+        'energy_in_Wh': tr['power_in'][rows].sum(axis=0) * dt / 3600.0 / 1000.0,
+        'energy_out_Wh': tr['power_out'][rows].sum(axis=0) * dt / 3600.0 / 1000.0,
+        'batt_heater_duty': loads['Battery Heater'][0][rows].mean(axis=0),
+        'pay_heater_duty': loads['Payload Heater'][0][rows].mean(axis=0),
+        'solar_shunts': tr['solar_shunts'][-1],
+    }
+    return [{k: v[i].item() for k, v in metrics.items()} for i in range(sat.n_variants)]
+
+
+def run_chunk(base, variants, n_orbits=3, dt=1.0, profile=None, settle_orbits=0):
+    """
+    Simulate a list of variants together as one SatelliteBatch
+
+    Arguments:
+        base {dict} -- base configuration, one dictionary per section of config_sections
+        variants {list} -- overrides ('section.key' -> value) of each variant
+
+    Keyword Arguments:
+        n_orbits {int} -- number of orbits to simulate (default: {3})
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        profile {orbit.OrbitProfile} -- areas over one orbit, the worker's profile if None (default: {None})
+        settle_orbits {float} -- number of orbits at the start left out of the metrics (default: {0})
+
+    Returns:
+        list -- the metrics of each variant (see summarize)
+    """
+
+    profile = _worker_profile if profile is None else profile
+    # every overridden key becomes an array with one value per variant
+    keys = sorted(set(k for v in variants for k in v))
+    overrides = {}
+    for k in keys:
+        section, key = k.split('.', 1)
+        overrides[k] = [v.get(k, base[section][key]) for v in variants]
+    config = apply_overrides(base, overrides)
+
+    sat = batch.SatelliteBatch(*[config[s] for s in config_sections])
+    n_points = int(n_orbits * len(profile))
+    sched = schedule.compile_schedule(config['timings'], n_points, dt)
+    for i in range(n_points):
+        total, paycap, panel = profile.areas_at(i * dt)
+        sat.set_state(i * dt, sched)
+        sat.draw_powers(dt)
+        sat.update_thermal(total, paycap, sat.batt_current_net, dt)
+        sat.charge_from_solar_panel(panel / (0.03 * 0.01), dt)
+        sat.update_state_tracker(i * dt)
+    return summarize(sat, dt, int(settle_orbits * len(profile)))
+
+
+def run_sweep(base, variants, area_path, n_orbits=3, dt=1.0, t_orbit=92 * 60, chunk_size=16, max_workers=None,
+              settle_orbits=0):
+    """
+    Run every variant over a pool of processes, and yield the metrics of each one as soon as its chunk finishes.
+    Workers read the area file once, and only send back the metrics, not the trackers.
+
+    Arguments:
+        base {dict} -- base configuration, one dictionary per section of config_sections
+        variants {list} -- overrides ('section.key' -> value) of each variant, from grid_variants or random_variants
+        area_path {string} -- path to the STK area export
+
+    Keyword Arguments:
+        n_orbits {int} -- number of orbits to simulate (default: {3})
+        dt {float} -- Time step of the simulation (seconds) (default: {1.0})
+        t_orbit {float} -- length of the orbit (seconds) (default: {92*60})
+        chunk_size {int} -- number of variants simulated together by each task (default: {16})
+        max_workers {int} -- number of processes, all cores if None (default: {None})
+        settle_orbits {float} -- number of orbits at the start left out of the metrics (default: {0})
+
+    Yields:
+        dict -- row with the variant index, its overrides and its metrics
+    """
+
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+    chunks = [list(range(i, min(i + chunk_size, len(variants)))) for i in range(0, len(variants), chunk_size)]
+    with ProcessPoolExecutor(max_workers, initializer=init_worker, initargs=(area_path, dt, t_orbit)) as pool:
+        futures = {pool.submit(run_chunk, base, [variants[i] for i in chunk], n_orbits, dt, None, settle_orbits): chunk
+                   for chunk in chunks}
+        for future in as_completed(futures):
+            for i, metrics in zip(futures[future], future.result()):
+                row = {'variant': i}
+                row.update(variants[i])
+                row.update(metrics)
+                yield row
+
+
+def write_table(rows, path):
+    """
+    Write sweep results to a csv file, one row per variant, as they arrive.
+
+    Arguments:
+        rows {iterable} -- rows yielded by run_sweep
+        path {string} -- csv file to write
+
+    Returns:
+        list -- the rows written
+    """
+
+    written = []
+    with open(path, 'w') as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row.keys()), lineterminator='\n')
+                writer.writeheader()
+            writer.writerow(row)
+            f.flush()
+            written.append(row)
+    return written
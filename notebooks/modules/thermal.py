@@ -4,6 +4,8 @@ import csv
 
 boltzman = 5.67*np.power(10.0, -8.0)  # watt m^-2 K^-1
 solar_flux = 1361  # watt m^-2
+batt_heater_power = 1.28  # watts, value from Eric
+pay_heater_power = 2.5  # watts
 
 # Primary Structure heat calculations
 # Q_str_batt means heat IN to the structure
@@ -43,10 +45,8 @@ def Q_batt_self(I_t,structure_constants):
   return Q_batt_self
 
 def Q_batt_heaters(batt_heat,structure_constants):
-  if batt_heat == True:
-    return 1.28; #value from Eric in watts
-  if batt_heat == False:
-    return 0.00;
+  # batt_heat can be a bool, an array of states (one per variant) or a duty cycle between 0 and 1
+  return batt_heater_power * np.asarray(batt_heat, dtype=np.float64)
 
 def Q_batt_str(T_str, T_batt,structure_constants):
   R = 1/(structure_constants['R_str_batt'])
@@ -65,10 +65,7 @@ def T_batt_dt(Q_batt, T_str, T_batt, dt,structure_constants):
 
 #Payload calculations
 def Q_pay_heaters(pay_heat):
-  if pay_heat == True:
-    return 2.5 #watts
-  else:
-    return 0.0;
+  return pay_heater_power * np.asarray(pay_heat, dtype=np.float64)
 
 def Q_pay_str(T_str, T_pay,structure_constants):
   R = 1/(structure_constants['R_str_batt'])
@@ -93,3 +90,52 @@ def T_pay_dt(Q_pay, T_str, T_pay, dt,structure_constants):
   Q = Q_pay
   T_pay = T_pay + (1/structure_constants['c_pay'])*dt*Q;
   return T_pay
+
+
+
+# Rates of change (K/s) of [T_str, T_pay, T_batt], with the sun areas, heaters and battery current held constant
+def T_rates(T, area_s, A_paycap, batt_heat, pay_heat, I_t, structure_constants):
+  T_str, T_pay, T_batt = T
+  dT_str = Q_str_net(area_s, T_str, T_pay, T_batt, structure_constants) / structure_constants['c_str']
+  dT_pay = Q_pay_net(T_str, T_pay, pay_heat, A_paycap, structure_constants) / structure_constants['c_pay']
+  dT_batt = Q_batt_net(T_str, T_batt, batt_heat, I_t, structure_constants) / structure_constants['c_batt']
+  return np.array([dT_str, dT_pay, dT_batt])
+
+# Adaptive Bogacki-Shampine (RK23) integration over one step of length dt.
+# rates(T, t) gets the time t since the start of the step.
+# Sub-steps are sized so that the local error estimate of every node stays under tol (K), which can also
+# be one tolerance per row of T. The fastest time constant of the network is over an hour, so sub-steps
+# of several minutes are accepted in most of the orbit. h is the first sub-step to try, returned for the next call.
+# If dense is a list, (start, length, T at start, T at end, rates at start, rates at end) of every accepted
+# sub-step is appended to it, for dense_output.
+def T_adaptive(T, dt, rates, tol=0.01, h=None, dense=None):
+  T = np.asarray(T, dtype=np.float64)
+  tol = np.reshape(tol, np.shape(tol) + (1,) * (T.ndim - np.ndim(tol)))
+  t = 0.0
+  h = dt if h is None else min(h, dt)
+  k1 = rates(T, t)
+  while dt - t > 1e-9 * dt:
+    h = min(h, dt - t)
+    k2 = rates(T + 0.5*h*k1, t + 0.5*h)
+    k3 = rates(T + 0.75*h*k2, t + 0.75*h)
+    T_new = T + h*(2*k1 + 3*k2 + 4*k3)/9.0
+    k4 = rates(T_new, t + h)
+    err = np.max(np.abs(h*(-5*k1/72.0 + k2/12.0 + k3/9.0 - k4/8.0)) / tol)
+    assert np.isfinite(err), "Temperatures are not finite, check the inputs to the thermal model"
+    if err <= 1.0:
+      if dense is not None:
+        dense.append((t, h, T, T_new, k1, k4))
+      t += h
+      T = T_new
+      k1 = k4
+    h = h * (5.0 if err == 0 else min(5.0, max(0.2, 0.9*(1.0/err)**(1/3.0))))
+  return T, h
+
+# State at time t (since the start of the T_adaptive call) inside one of its sub-steps, from the cubic Hermite
+# interpolant of the values and rates at both ends, which is as accurate as the RK23 step itself.
+# For many times at once, t is an array and every entry of step has a matching last axis (one sub-step per time)
+def dense_output(step, t):
+  start, h, T0, T1, k0, k1 = step
+  x = (t - start) / h
+  return ((2*x**3 - 3*x**2 + 1)*T0 + (x**3 - 2*x**2 + x)*h*k0 +
+          (-2*x**3 + 3*x**2)*T1 + (x**3 - x**2)*h*k1)
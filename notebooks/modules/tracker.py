@@ -0,0 +1,478 @@
+import json
+import zipfile
+import numpy as n
+
+
+def flatten_state(state, prefix=''):
+    """
+    List the leaves of a (possibly nested) state dictionary, as returned by Satellite.get_state.
+    Dictionaries are walked by key and tuples by position, and every leaf becomes one column.
+
+    Arguments:
+        state {dict} -- state to flatten
+
+    Keyword Arguments:
+        prefix {string} -- name of the column holding state, used when recursing (default: {''})
+
+    Returns:
+        list -- (column name, path, value) for every leaf, where path is the sequence of keys leading to the value
+    """
+
+    if isinstance(state, dict):
+        items = state.items()
+    elif isinstance(state, tuple):
+        items = enumerate(state)
+    else:
+        return [(prefix, (), state)]
+
+    leaves = []
+    for k, v in items:
+        name = str(k) if prefix == '' else prefix + '/' + str(k)
+        leaves += [(leaf_name, (k,) + path, leaf) for leaf_name, path, leaf in flatten_state(v, name)]
+    return leaves
+
+
+def column_dtype(value):
+    """
+    Choose the dtype of a column from its first value. Flags stay boolean, every number is stored as a float
+    so that a state variable starting as the integer 0 does not truncate later values.
+
+    Arguments:
+        value {object} -- first value of the column
+
+    Returns:
+        np.dtype -- dtype of the column
+    """
+
+    return n.dtype(bool) if n.asarray(value).dtype == bool else n.dtype(n.float64)
+
+
+class TrackerView():
+    """
+    Read side shared by the trackers: the columns are looked up by the subclass's column(name, rows) and
+    put back into the nesting of the state with layout.
+    """
+
+    def _build(self, layout, index, rows=None):
+        if isinstance(layout, dict):
+            return {k: self._build(v, index, rows) for k, v in layout.items()}
+        if isinstance(layout, tuple):
+            return tuple(self._build(v, index, rows) for v in layout)
+        return self.column(layout, rows)[index]
+
+    def __getitem__(self, key):
+        # arrays returned by a StateTracker are views (unless rows are tiled), and stop being updated when the columns grow
+        return self._build(self.layout[key], slice(None))
+
+    def __contains__(self, key):
+        return key in self.layout
+
+    def keys(self):
+        return self.layout.keys()
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def as_dict(self, variant=None, rows=None):
+        '''
+        Gather all of the recorded data in a dictionary of arrays (views into the columns when possible).
+
+        Keyword Arguments:
+            variant {int} -- for trackers of a batch, only return the data of this variant (default: {None})
+            rows {slice} -- only return these rows, e.g. to read a window of a long tiled run (default: {None})
+
+        Returns:
+            dict -- same keys and nesting as the tracker
+        '''
+
+        index = (slice(None),) if variant is None else (slice(None), variant)
+        data = {}
+        for k, layout in self.layout.items():
+            # time has no variant axis
+            data[k] = self._build(layout, (slice(None),) if k == 'time' else index, rows)
+        return data
+
+
+class StateTracker(TrackerView):
+    def __init__(self, state, chunk_size=3600, expected_length=None):
+        """
+        Record the state of a satellite over time in preallocated numpy columns, one per scalar of the state.
+        Every load state/current and every thermal node gets its own column, so nothing is copied as a dict.
+        The columns grow by chunk_size rows when they run out of space.
+
+        Reading a key gives back the same structure as get_state()[key], with an array in place of every scalar.
+        For example trackers['temperatures']['battery'] is the array of battery temperatures, and
+        trackers['loads']['Beacon'][0] the array of beacon on/off states.
+
+        Rows that repeat (a steady periodic cycle) can be recorded with tile instead of being written out.
+        They are only built when the columns are read.
+
+        Arguments:
+            state {dict} -- an example state (usually the initial state), which sets the layout of the columns
+
+        Keyword Arguments:
+            chunk_size {int} -- number of rows added every time the columns are full (default: {3600})
+            expected_length {int} -- number of rows to preallocate, if the length of the run is known (default: {None})
+        """
+
+        self.chunk_size = int(chunk_size)
+        self.length = 0
+        # (stored rows before the tile, first row of the cycle, rows in the cycle, repeats, time of one cycle)
+        self.tiles = []
+        self.layout = {k: self._layout(v, k) for k, v in state.items()}
+        self.layout['time'] = 'time'
+
+        self.leaves = [('time', ('time',), n.dtype(n.float64), ())]
+        for name, path, value in flatten_state(state):
+            self.leaves.append((name, path, column_dtype(value), n.shape(value)))
+
+        capacity = self.chunk_size if expected_length is None else int(expected_length)
+        self.columns = {name: n.zeros((capacity,) + shape, dtype) for name, _, dtype, shape in self.leaves}
+
+    def _layout(self, value, name):
+        # same nesting as the state, with the column names at the leaves
+        if isinstance(value, dict):
+            return {k: self._layout(v, name + '/' + str(k)) for k, v in value.items()}
+        if isinstance(value, tuple):
+            return tuple(self._layout(v, name + '/' + str(i)) for i, v in enumerate(value))
+        return name
+
+    def column(self, name, rows=None):
+        '''
+        Read one column, building the tiled rows that fall in rows
+
+        Arguments:
+            name {string} -- name of the column, e.g. 'temperatures/battery'
+
+        Keyword Arguments:
+            rows {slice} -- rows to read, all of them if None (default: {None})
+
+        Returns:
+            np.array -- the values, a view into the column if nothing is tiled
+        '''
+
+        start, stop, _ = (slice(None) if rows is None else rows).indices(len(self))
+        col = self.columns[name]
+        if not self.tiles:
+            return col[start:stop]
+
+        # walk the stored and tiled segments in order, keeping the parts that overlap [start, stop)
+        pieces = []
+        row = 0
+        stored = 0
+        for before, first, cycle, count, period in self.tiles + [(self.length, 0, 0, 0, 0.0)]:
+            # stored rows up to the tile
+            lo, hi = max(start, row), min(stop, row + before - stored)
+            if lo < hi:
+                pieces.append(col[stored + lo - row:stored + hi - row])
+            row += before - stored
+            stored = before
+            # repeats of the cycle
+            lo, hi = max(start, row), min(stop, row + cycle * count)
+            if lo < hi:
+                k = n.arange(lo - row, hi - row)
+                values = col[first + k % cycle]
+                if name == 'time':
+                    values = values + (k // cycle + 1) * period
+                pieces.append(values)
+            row += cycle * count
+        if not pieces:
+            return col[:0]
+        return n.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+
+    @property
+    def capacity(self):
+        return self.columns['time'].shape[0]
+
+    def grow(self, rows=None):
+        '''
+        Add rows to the end of every column.
+
+        Keyword Arguments:
+            rows {int} -- number of rows to add (default: {chunk_size})
+        '''
+
+        rows = self.chunk_size if rows is None else rows
+        for name, col in self.columns.items():
+            new_col = n.zeros((col.shape[0] + rows,) + col.shape[1:], col.dtype)
+            new_col[:self.length] = col[:self.length]
+            self.columns[name] = new_col
+
+    def append(self, t, state):
+        '''
+        Write one state to the next row of the columns
+
+        Arguments:
+            t {float} -- time of the state
+            state {dict} -- state, with the same layout as the one the tracker was created with
+        '''
+
+        if self.length == self.capacity:
+            self.grow()
+        row = self.length
+        self.columns['time'][row] = t
+        for name, path, _, _ in self.leaves[1:]:
+            value = state
+            for k in path:
+                value = value[k]
+            self.columns[name][row] = value
+        self.length += 1
+
+    def extend(self, columns):
+        '''
+        Write many rows at once, e.g. the output of a compiled simulation loop
+
+        Arguments:
+            columns {dict} -- column name -> array of values, one entry for every column of the tracker
+        '''
+
+        rows = len(columns['time'])
+        if self.length + rows > self.capacity:
+            # at least doubled, so that extending a little at a time does not copy the columns every time
+            self.grow(max(self.chunk_size, self.capacity, self.length + rows - self.capacity))
+        for name, _, _, _ in self.leaves:
+            self.columns[name][self.length:self.length + rows] = columns[name]
+        self.length += rows
+
+    def tile(self, rows, count, period):
+        '''
+        Record the last rows again count times, without writing them to the columns.
+        The time of every repeat is shifted by one more period.
+
+        Arguments:
+            rows {int} -- number of rows of the cycle, the last ones written
+            count {int} -- number of repeats
+            period {float} -- time of one cycle (seconds)
+        '''
+
+        assert 0 < rows <= self.length, "The cycle has to be rows that were written"
+        if count > 0:
+            self.tiles.append((self.length, self.length - rows, rows, int(count), float(period)))
+
+    def trim(self):
+        '''
+        Release the unused preallocated rows at the end of the columns
+        '''
+
+        for name, col in self.columns.items():
+            self.columns[name] = col[:self.length].copy()
+
+    def __len__(self):
+        return self.length + sum(cycle * count for _, _, cycle, count, _ in self.tiles)
+
+
+def _layout_to_json(layout):
+    # tuples become lists, which json keeps apart from the dicts
+    if isinstance(layout, dict):
+        return {k: _layout_to_json(v) for k, v in layout.items()}
+    if isinstance(layout, tuple):
+        return [_layout_to_json(v) for v in layout]
+    return layout
+
+
+def _layout_from_json(layout):
+    if isinstance(layout, dict):
+        return {k: _layout_from_json(v) for k, v in layout.items()}
+    if isinstance(layout, list):
+        return tuple(_layout_from_json(v) for v in layout)
+    return layout
+
+
+class DiskTracker(StateTracker):
+    def __init__(self, state, path, chunk_size=86400):
+        """
+        StateTracker that keeps at most chunk_size rows in memory. Every time its buffer is full, the rows are
+        written to the end of a zip file of compressed .npy columns (a chunked .npz) and the buffer is reused,
+        so a run of any length uses the same memory. Read the file back with TrackerFile.
+
+        Replace the trackers of a satellite with one before running it:
+            sat.trackers = tracker.DiskTracker(sat.get_state(), 'run.npz')
+        and call flush at the end of the run to write the last rows.
+
+        Reading a DiskTracker like a StateTracker works, but loads the whole run from the file.
+
+        Arguments:
+            state {dict} -- an example state (usually the initial state), which sets the layout of the columns
+            path {string} -- file to write to, replaced if it exists
+
+        Keyword Arguments:
+            chunk_size {int} -- number of rows in the buffer, and in every chunk of the file (default: {86400})
+        """
+
+        super().__init__(state, chunk_size, chunk_size)
+        self.path = path
+        self.flushed = 0
+        self.n_chunks = 0
+        self.reader = None
+        meta = {'layout': _layout_to_json(self.layout),
+                'leaves': [(name, dtype.str, shape) for name, _, dtype, shape in self.leaves]}
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('layout.json', json.dumps(meta))
+
+    def grow(self, rows=None):
+        # the buffer never grows: it is written out and emptied instead
+        self.flush()
+
+    def extend(self, columns):
+        '''
+        Write many rows at once, e.g. the output of a compiled simulation loop, flushing as the buffer fills up
+
+        Arguments:
+            columns {dict} -- column name -> array of values, one entry for every column of the tracker
+        '''
+
+        rows = len(columns['time'])
+        done = 0
+        while done < rows:
+            if self.length == self.capacity:
+                self.flush()
+            step = min(rows - done, self.capacity - self.length)
+            for name, _, _, _ in self.leaves:
+                self.columns[name][self.length:self.length + step] = columns[name][done:done + step]
+            self.length += step
+            done += step
+
+    def flush(self):
+        '''
+        Write the rows in the buffer to a new chunk of the file, and empty the buffer
+        '''
+
+        if self.length == 0:
+            return
+        prefix = 'chunk_%06d/' % self.n_chunks
+        times = self.columns['time'][:self.length]
+        with zipfile.ZipFile(self.path, 'a', zipfile.ZIP_DEFLATED) as zf:
+            for name, col in self.columns.items():
+                with zf.open(prefix + name + '.npy', 'w', force_zip64=True) as f:
+                    n.lib.format.write_array(f, n.ascontiguousarray(col[:self.length]))
+            with zf.open(prefix + 'index.npy', 'w') as f:
+                n.lib.format.write_array(f, n.array([self.length, times[0], times[-1]], n.float64))
+        self.n_chunks += 1
+        self.flushed += self.length
+        self.length = 0
+        self.reader = None
+
+    def tile(self, rows, count, period):
+        '''
+        Record the last rows again count times, with the time of every repeat shifted by one more period.
+        Unlike StateTracker.tile, the repeats are written out through extend, so the file reads back like
+        any other and the memory used stays the same.
+
+        Arguments:
+            rows {int} -- number of rows of the cycle, the last ones written
+            count {int} -- number of repeats
+            period {float} -- time of one cycle (seconds)
+        '''
+
+        assert 0 < rows <= len(self), "The cycle has to be rows that were written"
+        # copied, extend reuses the buffer the last rows may be in
+        cycle = {name: n.array(self.column(name, slice(len(self) - rows, len(self)))) for name, _, _, _ in self.leaves}
+        times = cycle['time']
+        for k in range(1, int(count) + 1):
+            cycle['time'] = times + k * period
+            self.extend(cycle)
+
+    def column(self, name, rows=None):
+        start, stop, _ = (slice(None) if rows is None else rows).indices(len(self))
+        if start >= stop:
+            return self.columns[name][:0]
+        pieces = []
+        if start < self.flushed:
+            if self.reader is None:
+                self.reader = TrackerFile(self.path)
+            pieces.append(self.reader.column(name, slice(start, min(stop, self.flushed))))
+        if stop > self.flushed:
+            pieces.append(self.columns[name][max(start - self.flushed, 0):stop - self.flushed])
+        return n.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+
+    def __len__(self):
+        return self.flushed + self.length
+
+
+class TrackerFile(TrackerView):
+    def __init__(self, path, rows=None):
+        """
+        Read a file written by DiskTracker. Reads like a StateTracker (trackers['temperatures']['battery'],
+        as_dict, ...) and can be plotted with vis, but only loads the chunks of the rows that are asked for.
+        Use window to work on a time range of a long run.
+
+        Arguments:
+            path {string} -- file written by a DiskTracker
+
+        Keyword Arguments:
+            rows {slice} -- only show these rows of the file (default: {None})
+        """
+
+        self.path = path
+        with zipfile.ZipFile(path, 'r') as zf:
+            meta = json.loads(zf.read('layout.json').decode())
+            self.chunks = sorted(set(name.split('/')[0] for name in zf.namelist() if name.startswith('chunk_')))
+            index = n.array([self._chunk(zf, k, 'index') for k in range(len(self.chunks))]).reshape(-1, 3)
+        self.layout = _layout_from_json(meta['layout'])
+        self.leaves = {name: (n.dtype(dtype), tuple(shape)) for name, dtype, shape in meta['leaves']}
+        # first row, and first and last time of every chunk
+        self.offsets = n.concatenate([[0], n.cumsum(index[:, 0]).astype(int)])
+        self.chunk_times = index[:, 1:]
+        self.start, self.stop, _ = (slice(None) if rows is None else rows).indices(int(self.offsets[-1]))
+
+    def __len__(self):
+        return max(self.stop - self.start, 0)
+
+    def _chunk(self, zf, k, name):
+        with zf.open(self.chunks[k] + '/' + name + '.npy') as f:
+            return n.lib.format.read_array(f)
+
+    def column(self, name, rows=None):
+        '''
+        Read one column, loading only the chunks that overlap rows
+
+        Arguments:
+            name {string} -- name of the column, e.g. 'temperatures/battery'
+
+        Keyword Arguments:
+            rows {slice} -- rows to read, relative to the rows of this TrackerFile, all of them if None (default: {None})
+
+        Returns:
+            np.array -- the values
+        '''
+
+        start, stop, _ = (slice(None) if rows is None else rows).indices(len(self))
+        start, stop = start + self.start, stop + self.start
+        pieces = []
+        with zipfile.ZipFile(self.path, 'r') as zf:
+            for k in range(len(self.chunks)):
+                lo, hi = max(start, self.offsets[k]), min(stop, self.offsets[k + 1])
+                if lo < hi:
+                    values = self._chunk(zf, k, name)
+                    pieces.append(values[lo - self.offsets[k]:hi - self.offsets[k]])
+        if not pieces:
+            dtype, shape = self.leaves[name]
+            return n.zeros((0,) + shape, dtype)
+        return n.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+
+    def window(self, t_start, t_stop):
+        '''
+        Rows of the file with t_start <= time < t_stop
+
+        Arguments:
+            t_start {float} -- start of the window (seconds)
+            t_stop {float} -- end of the window (seconds)
+
+        Returns:
+            TrackerFile -- reader of only these rows
+        '''
+
+        # only the chunks at the edges of the window have to be searched
+        rows = []
+        with zipfile.ZipFile(self.path, 'r') as zf:
+            for t in (t_start, t_stop):
+                k = int(n.searchsorted(self.chunk_times[:, 1], t))
+                if k == len(self.chunks):
+                    rows.append(int(self.offsets[-1]))
+                else:
+                    rows.append(int(self.offsets[k] + n.searchsorted(self._chunk(zf, k, 'time'), t)))
+        start, stop = max(rows[0], self.start), min(rows[1], self.stop)
+        view = TrackerFile.__new__(TrackerFile)
+        view.__dict__.update(self.__dict__)
+        view.start, view.stop = start, max(start, stop)
+        return view
@@ -9,25 +9,28 @@ def timeTicks(x, pos):
 
 
 def plot_trackers(sat, smoothing_window=50.0, clip_ends=True):
+    # sat can also be trackers on their own, e.g. a window of a tracker.TrackerFile
+    trackers = getattr(sat, 'trackers', sat)
 
     formatter = matplotlib.ticker.FuncFormatter(timeTicks)
 
     # need this so the plots make sense
     smoothing_kernel = n.ones(int(smoothing_window))/smoothing_window
 
-    times = sat.trackers['time']
+    times = trackers['time']
     start = int(smoothing_window) if clip_ends else 0
     end = len(times) - int(smoothing_window) if clip_ends else len(times)
 
     fig = figure(figsize=(12, 30))
     ax1 = subplot(5, 1, 1)
-    n_loads = len(sat.trackers['loads'][0].keys())
+    loads = trackers['loads']
+    n_loads = len(loads.keys())
     added_height = 2 * n_loads - 2
     locs = []
     labels = []
-    for load in sat.trackers['loads'][0].keys():
-        plot(times[start:end], n.convolve([added_height + int(l[load][0])
-                                for l in sat.trackers['loads']], smoothing_kernel, mode='same')[start:end], label=load)
+    for load in loads.keys():
+        plot(times[start:end], n.convolve(added_height + loads[load][0].astype(int),
+                                          smoothing_kernel, mode='same')[start:end], label=load)
         locs.append(added_height+0.5)
         labels.append(load)
         added_height -= 2
@@ -40,25 +43,23 @@ def plot_trackers(sat, smoothing_window=50.0, clip_ends=True):
 
     ax1.xaxis.set_major_formatter(formatter)
 
+    temperatures = trackers['temperatures']
     ax1 = subplot(5, 1, 2)
-    ax1.plot(times[start:end], [s['structure']
-                                for s in sat.trackers['temperatures']][start:end], label='Structure Temp (K)')
-    ax1.plot(times[start:end], [s['payload']
-                                for s in sat.trackers['temperatures']][start:end], label='Payload Temp (K)')
-    ax1.plot(times[start:end], [s['battery']
-                                for s in sat.trackers['temperatures']][start:end], label='Battery Temp (K)')
+    ax1.plot(times[start:end], temperatures['structure'][start:end], label='Structure Temp (K)')
+    ax1.plot(times[start:end], temperatures['payload'][start:end], label='Payload Temp (K)')
+    ax1.plot(times[start:end], temperatures['battery'][start:end], label='Battery Temp (K)')
     legend()
     title('Temperatures')
     xlabel("Time from launch (hh:mm:ss)")
     ylabel('Temperature (K)')
     ax1.xaxis.set_major_formatter(formatter)
 
+    qdots = trackers['qdots']
     ax2 = subplot(5, 1, 3)
-    ax2.plot(times[start:end], [s['structure']
-                                for s in sat.trackers['qdots']][start:end], label='Structure Qdot (K)')
-    ax2.plot(times[start:end], n.convolve([s['payload'] for s in sat.trackers['qdots']],
+    ax2.plot(times[start:end], qdots['structure'][start:end], label='Structure Qdot (K)')
+    ax2.plot(times[start:end], n.convolve(qdots['payload'],
                                           smoothing_kernel, mode='same')[start:end], label='Payload Qdot (K)')
-    ax2.plot(times[start:end], n.convolve([s['battery'] for s in sat.trackers['qdots']],
+    ax2.plot(times[start:end], n.convolve(qdots['battery'],
                                           smoothing_kernel, mode='same')[start:end], label='Battery Qdot (K)')
     legend()
     title('Instantenous Heat Transfer')
@@ -67,9 +68,9 @@ def plot_trackers(sat, smoothing_window=50.0, clip_ends=True):
     ax2.xaxis.set_major_formatter(formatter)
 
     ax1 = subplot(5,1,4)
-    ax1.plot(times[start:end], n.convolve(sat.trackers['power_in'], smoothing_kernel, mode='same')[start:end], label='Power Generated', color='g')
-    ax1.plot(times[start:end], n.convolve(sat.trackers['power_out'], smoothing_kernel, mode='same')[start:end], label='Power Consumed', color='r')
-    ax1.plot(times[start:end], n.convolve(sat.trackers['power_net'], smoothing_kernel, mode='same')[start:end], label='Net Power', color='b')
+    ax1.plot(times[start:end], n.convolve(trackers['power_in'], smoothing_kernel, mode='same')[start:end], label='Power Generated', color='g')
+    ax1.plot(times[start:end], n.convolve(trackers['power_out'], smoothing_kernel, mode='same')[start:end], label='Power Consumed', color='r')
+    ax1.plot(times[start:end], n.convolve(trackers['power_net'], smoothing_kernel, mode='same')[start:end], label='Net Power', color='b')
     ax1.xaxis.set_major_formatter(formatter)
     xlabel("Time from launch (hh:mm:ss)")
     ax1.set_ylabel("Power (mW)")
@@ -78,12 +79,12 @@ def plot_trackers(sat, smoothing_window=50.0, clip_ends=True):
 
     ax1 = subplot(5, 1, 5)
     ax2 = ax1.twinx()
-    l1 = ax1.plot(times[start:end], sat.trackers['batt_v'][start:end],
+    l1 = ax1.plot(times[start:end], trackers['batt_v'][start:end],
                   label='Battery Voltage', color='b')
     # l2 = ax2.plot(times[start:end], n.convolve(
-    #     sat.trackers['batt_current_out'], smoothing_kernel, mode='same')[start:end], label='Battery Current (out)', color='r')
+    #     trackers['batt_current_out'], smoothing_kernel, mode='same')[start:end], label='Battery Current (out)', color='r')
     # l3 = ax2.plot(times[start:end], n.convolve(
-    #     sat.trackers['batt_current_in'], smoothing_kernel, mode='same')[start:end], label='Battery Current (in)', color='g')
+    #     trackers['batt_current_in'], smoothing_kernel, mode='same')[start:end], label='Battery Current (in)', color='g')
     ax1.xaxis.set_major_formatter(formatter)
     # ax2.xaxis.set_major_formatter(formatter)
     xlabel("Time from launch (hh:mm:ss)")
@@ -94,3 +95,133 @@ def plot_trackers(sat, smoothing_window=50.0, clip_ends=True):
     legend(lines, [l.get_label() for l in lines])
     title('Battery Status')
     return fig
+
+
+def bucket_size(length, n_buckets):
+    # number of points per bucket, so that length points fit in at most n_buckets buckets
+    return max(1, int(n.ceil(length / float(n_buckets))))
+
+
+def minmax_decimate(x, y, n_buckets):
+    '''
+    Keep only the smallest and largest point of each of n_buckets buckets of a series, in time order.
+    Drawn as a line, it looks the same as the full series at a width of n_buckets pixels: peaks and
+    short pulses (a 1 s beacon in a week) are kept, which averaging or taking every k-th point would lose.
+
+    Arguments:
+        x {np.array} -- times
+        y {np.array} -- values
+        n_buckets {int} -- number of buckets, about the width of the plot in pixels
+
+    Returns:
+        tuple -- (x, y) of the kept points, at most 2 * n_buckets of them
+    '''
+
+    x, y = n.asarray(x), n.asarray(y)
+    if len(y) <= 2 * n_buckets:
+        return x, y
+    size = bucket_size(len(y), n_buckets)
+    buckets = int(n.ceil(len(y) / float(size)))
+    # pad the last bucket with its last value, which does not change its min or max
+    padded = n.concatenate([y, n.repeat(y[-1:], buckets * size - len(y))]).reshape(buckets, size)
+    offsets = n.arange(buckets) * size
+    keep = n.concatenate([padded.argmin(axis=1) + offsets, padded.argmax(axis=1) + offsets])
+    keep = n.unique(n.minimum(keep, len(y) - 1))
+    return x[keep], y[keep]
+
+
+def envelope(x, y, n_buckets):
+    '''
+    Min, mean and max of a series over each of n_buckets buckets
+
+    Arguments:
+        x {np.array} -- times
+        y {np.array} -- values
+        n_buckets {int} -- number of buckets
+
+    Returns:
+        tuple -- (time of the start of each bucket, min, mean, max)
+    '''
+
+    x, y = n.asarray(x), n.asarray(y, n.float64)
+    starts = n.arange(0, len(y), bucket_size(len(y), n_buckets))
+    counts = n.diff(n.append(starts, len(y)))
+    return (x[starts], n.minimum.reduceat(y, starts), n.add.reduceat(y, starts) / counts,
+            n.maximum.reduceat(y, starts))
+
+
+def plot_envelope(ax, x, y, n_buckets, **kwargs):
+    # mean of every bucket as a line, with the min to max range shaded behind it
+    xs, lo, mean, hi = envelope(x, y, n_buckets)
+    line, = ax.plot(xs, mean, **kwargs)
+    ax.fill_between(xs, lo, hi, color=line.get_color(), alpha=0.25, linewidth=0)
+    return line
+
+
+def plot_trackers_decimated(sat, width=1200, figsize=(12, 15)):
+    '''
+    Same panels as plot_trackers, for long runs. Every series is cut down to about width points before
+    plotting: slow ones (temperatures, battery voltage) with minmax_decimate, noisy ones (load states, heat
+    flows, power) as the mean and min/max envelope over each bucket in place of the smoothing.
+    A week at 1 s renders in well under a second.
+
+    Arguments:
+        sat {satellite.Satellite} -- satellite with its trackers, or trackers on their own (e.g. a window of a tracker.TrackerFile)
+
+    Keyword Arguments:
+        width {int} -- number of buckets, about the width of the plots in pixels (default: {1200})
+        figsize {tuple} -- size of the figure (inches) (default: {(12, 15)})
+
+    Returns:
+        matplotlib.figure.Figure -- the figure
+    '''
+
+    trackers = getattr(sat, 'trackers', sat)
+    formatter = matplotlib.ticker.FuncFormatter(timeTicks)
+    times = trackers['time']
+
+    fig, axes = subplots(5, 1, figsize=figsize)
+    loads = trackers['loads']
+    added_height = 2 * len(loads) - 2
+    locs = []
+    for load in loads.keys():
+        plot_envelope(axes[0], times, added_height + loads[load][0], width, label=load)
+        locs.append(added_height + 0.5)
+        added_height -= 2
+    axes[0].set_yticks(locs)
+    axes[0].set_yticklabels(list(loads.keys()))
+    axes[0].set_ylim(-0.2, 0.2 + 2 * len(loads))
+    axes[0].set_title('ON/OFF State of Loads')
+
+    temperatures = trackers['temperatures']
+    for node, label in (('structure', 'Structure Temp (K)'), ('payload', 'Payload Temp (K)'),
+                        ('battery', 'Battery Temp (K)')):
+        axes[1].plot(*minmax_decimate(times, temperatures[node], width), label=label)
+    axes[1].set_title('Temperatures')
+    axes[1].set_ylabel('Temperature (K)')
+
+    qdots = trackers['qdots']
+    for node, label in (('structure', 'Structure Qdot (K)'), ('payload', 'Payload Qdot (K)'),
+                        ('battery', 'Battery Qdot (K)')):
+        plot_envelope(axes[2], times, qdots[node], width, label=label)
+    axes[2].set_title('Instantenous Heat Transfer')
+    axes[2].set_ylabel('Qdot (W)')
+
+    for key, label, color in (('power_in', 'Power Generated', 'g'), ('power_out', 'Power Consumed', 'r'),
+                              ('power_net', 'Net Power', 'b')):
+        plot_envelope(axes[3], times, trackers[key], width, label=label, color=color)
+    axes[3].set_title('Power Consumed and Generated')
+    axes[3].set_ylabel("Power (mW)")
+
+    axes[4].plot(*minmax_decimate(times, trackers['batt_v'], width), label='Battery Voltage', color='b')
+    axes[4].set_title('Battery Status')
+    axes[4].set_ylabel("Voltage (V)")
+
+    for ax in axes:
+        ax.xaxis.set_major_formatter(formatter)
+        ax.set_xlabel("Time from launch (hh:mm:ss)")
+        if ax is not axes[0]:
+            ax.legend()
+    # fixed spacing, tight_layout would draw the whole figure an extra time
+    fig.subplots_adjust(hspace=0.6, top=0.97, bottom=0.04)
+    return fig
@@ -1,5 +1,6 @@
 import numpy as n
 from geometry import *
+from modules import generation
 from vpython import canvas, sphere, box, local_light, color, rate
 
 def make_orbit_scene(solar_sys, satellite):
@@ -71,20 +72,13 @@ def animate(solar_sys, satellite, t, dt, curves, point):
     satellite.sat_v3d.up = vecflip(new_up, flip=solar_sys['flip_v'], signs=(-1,1,1))
 
     # https://ocw.mit.edu/courses/aeronautics-and-astronautics/16-851-satellite-engineering-fall-2003/projects/portfolio_nadir1.pdf
-    eclipse_frac = 0.5
+    eclipse_frac = satellite.eclipse_frac
 
-    total_power_gen = 0
+    # the powers are computed beforehand by generation.generate_powers, here they are only drawn
     for i in range(satellite.starting_orientation.shape[0]):
-        satellite.current_orientation[i] = rotate_vector(satellite.starting_orientation[i],orbit['theta'],orbit['phi'], new_psi )
-        satellite.area_ratio[i], satellite.normal_angles[i] = dot_and_angle(solar_sys['sun_vector'], satellite.current_orientation[i])
-        
-        power_gen = -1.0 * solar_sys['solar_flux'] * (1/10000.0) * satellite.cell_areas[i] * 0.3 * satellite.area_ratio[i]
-        if power_gen < 0 or t < eclipse_frac: power_gen = 0
-        total_power_gen += power_gen
-        curves[i].plot([point*dt, power_gen])
-        satellite.gen_powers_per_face[i, point] = power_gen
+        curves[i].plot([point*dt, satellite.gen_powers_per_face[i, point]])
             
-    curves[6].plot(point*dt, total_power_gen)
+    curves[6].plot(point*dt, satellite.gen_powers_per_face[6, point])
     
     
     # print(new_up)
@@ -120,14 +114,19 @@ def simulate(sim_props, satellite, solar_system, area_curves, graph):
         print("Changing total time simulated to %.2f" % total_time)
 
     n_pts = n_pts_per_orbit * n_orbits + 1
-    satellite.gen_powers_per_face = n.zeros((7, n_pts),n.float32)
-    satellite.ts = n.zeros(n_pts, n.float32)
     # at this point, n_pts_per_orbit and n_pts are integers
 
+    # generate all of the powers first, the animation only plays them back
+    satellite.eclipse_frac = sim_props.get('eclipse_frac', 0.5)
+    gen = generation.generate_powers(orbit, solar_system, satellite.cell_areas, dt, n_orbits,
+                                     satellite.eclipse_frac, satellite.starting_orientation)
+    satellite.gen_powers_per_face = n.vstack([gen['per_face'], gen['total']])
+    satellite.ts = n.zeros(n_pts, n.float32)
+
     for i in range(n_pts):
         
         t = i * dt
-        fraction_orbit = (t % orbit['period'])/orbit['periokeybd']
+        fraction_orbit = (t % orbit['period'])/orbit['period']
         satellite.ts[i] = i
         animate(solar_system, satellite, fraction_orbit,
                 dt, area_curves, i)
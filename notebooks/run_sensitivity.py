@@ -0,0 +1,49 @@
+import json
+import time
+import argparse
+from modules import sensitivity, sweep
+
+# Rank the parameters by their effect on the mission metrics, for example:
+#   python run_sensitivity.py -c sweep_config.json
+#   python run_sensitivity.py -c sweep_config.json -p structure_constants.e -p structure_constants.a -m min_batt_temp --step 0.1
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=("Finite-difference sensitivity of the mission metrics to the parameters, "
+                                                  "with all of the perturbed variants simulated as one batch"))
+    parser.add_argument('-c', '--config_file', required = True,
+                        metavar=('config_file'),
+                        help='.json file with the base timings, eps, temperatures, setpoints and structure_constants')
+    parser.add_argument('-a', '--area_file', required = False, default='../sources/heron_area.csv',
+                        metavar=('area_file'),
+                        help='STK area export (default: ../sources/heron_area.csv)')
+    parser.add_argument('-p', '--parameter', action='append', default=None,
+                        metavar=('section.key'),
+                        help='parameter to perturb (default: the structure constants and eps)')
+    parser.add_argument('-m', '--metric', action='append', default=None,
+                        help='metric of the sweep to differentiate (default: min_batt_temp, max_batt_temp, pay_heater_duty, final_soc)')
+    parser.add_argument('--step', type=float, default=0.05,
+                        help='perturbation, as a fraction of each parameter (default: 0.05)')
+    parser.add_argument('-n', '--orbits', type=float, default=6,
+                        help='number of orbits to simulate (default: 6)')
+    parser.add_argument('-s', '--settle', type=float, default=3,
+                        help='number of orbits left out of the metrics while the temperatures settle (default: 3)')
+    parser.add_argument('--dt', type=float, default=1.0,
+                        help='time step in seconds (default: 1)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='split the variants over this many processes (default: one batch in this process)')
+    parser.add_argument('-o', '--output', default='sensitivity_results.csv',
+                        help='.csv file for the ranked table (default: sensitivity_results.csv)')
+
+    args = parser.parse_args()
+
+    with open(args.config_file, 'r') as config_file:
+        base = json.load(config_file)
+
+    start = time.time()
+    rows = sensitivity.run_sensitivity(base, args.area_file, args.parameter, args.metric, args.step, args.orbits, args.dt,
+                                       args.workers, settle_orbits=args.settle)
+    print(sensitivity.report(rows))
+    sweep.write_table(rows, args.output)
+    print("Wrote %s in %.1f s" % (args.output, time.time() - start))
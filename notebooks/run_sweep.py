@@ -0,0 +1,72 @@
+import json
+import time
+import argparse
+from modules import sweep
+
+# Run a parameter sweep over all cores, for example:
+#   python run_sweep.py -c sweep_config.json -g structure_constants.c_str=700,900,1100 -g eps.starting_charge_frac=0.5,1
+#   python run_sweep.py -c sweep_config.json -r structure_constants.a=0.6:0.9 -r structure_constants.e=0.4:0.8 -s 500
+
+
+def parse_axis(text, separator):
+    # 'section.key=values' -> ('section.key', [floats])
+    name, values = text.split('=', 1)
+    return name, [float(v) for v in values.split(separator)]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=("Run a parameter sweep of the satellite simulation over a process pool"))
+    parser.add_argument('-c', '--config_file', required = True,
+                        metavar=('config_file'),
+                        help='.json file with the base timings, eps, temperatures, setpoints and structure_constants')
+    parser.add_argument('-a', '--area_file', required = False, default='../sources/heron_area.csv',
+                        metavar=('area_file'),
+                        help='STK area export (default: ../sources/heron_area.csv)')
+    parser.add_argument('-g', '--grid', action='append', default=[],
+                        metavar=('section.key=v1,v2,...'),
+                        help='grid axis, every combination of the grid axes is run')
+    parser.add_argument('-r', '--random', action='append', default=[],
+                        metavar=('section.key=low:high'),
+                        help='random axis, drawn uniformly between low and high')
+    parser.add_argument('-s', '--samples', type=int, default=100,
+                        help='number of random variants (default: 100)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the random variants')
+    parser.add_argument('-n', '--orbits', type=float, default=3,
+                        help='number of orbits to simulate (default: 3)')
+    parser.add_argument('--dt', type=float, default=1.0,
+                        help='time step in seconds (default: 1)')
+    parser.add_argument('--chunk_size', type=int, default=16,
+                        help='number of variants simulated together by each task (default: 16)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of processes (default: all cores)')
+    parser.add_argument('-o', '--output', default='sweep_results.csv',
+                        help='.csv file for the results (default: sweep_results.csv)')
+
+    args = parser.parse_args()
+
+    with open(args.config_file, 'r') as config_file:
+        base = json.load(config_file)
+
+    assert not (args.grid and args.random), "Use either grid or random axes, not both"
+    if args.random:
+        axes = dict(parse_axis(a, ':') for a in args.random)
+        variants = sweep.random_variants(axes, args.samples, args.seed)
+    else:
+        axes = dict(parse_axis(a, ',') for a in args.grid)
+        variants = sweep.grid_variants(axes)
+    print("Running %d variants over %g orbits" % (len(variants), args.orbits))
+
+    start = time.time()
+
+    def progress(rows):
+        for done, row in enumerate(rows, 1):
+            print("%d/%d  variant %d  min battery temp %.2f K  final SOC %.3f" %
+                  (done, len(variants), row['variant'], row['min_batt_temp'], row['final_soc']))
+            yield row
+
+    rows = sweep.run_sweep(base, variants, args.area_file, args.orbits, args.dt,
+                           chunk_size=args.chunk_size, max_workers=args.workers)
+    sweep.write_table(progress(rows), args.output)
+    print("Wrote %s in %.1f s" % (args.output, time.time() - start))
@@ -0,0 +1,12 @@
+from modules import hilfile
+import argparse
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=("Convert the -config pickles and -data csv logs of integrated_test.py "
+                                                  "to HIL data files (-profile.hil and -data.hil). The old files are kept."))
+    parser.add_argument('-d', '--directory', default='logs', required=False,
+                        help='folder of the logs (default: logs)')
+    args = parser.parse_args()
+
+    written = hilfile.upgrade_logs(args.directory)
+    print("Converted %d files" % len(written))